@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""download_movie 端到端性能测试
+
+启动本地 HLS 模拟站点，在不同并发数和下载引擎下测量下载吞吐、合并耗时、CPU 时间和内存占用。
+
+示例:
+    python benchmarks/bench_download.py --concurrency 8,16,32 --segments 200 --latency 0.01
+    python benchmarks/bench_download.py --bandwidth 2000000 --error-rate 0.02 --json results.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import concurrent.futures
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rich.console import Console
+from rich.table import Table
+
+from hls_server import FakeSiteServer, add_site_arguments, config_from_args
+from jianpian_downloader import metrics, tracing
+from jianpian_downloader.downloader import MovieDownloader
+from jianpian_downloader.segment_cache import SegmentCache
+from jianpian_downloader.workers import ProcessBackend
+
+
+def current_rss():
+    """当前进程的常驻内存（字节）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # 非 Linux 系统退化为峰值内存
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def _run_episodes(download, episodes, parallel):
+    """以 parallel 集并行执行 download(集数)，返回成功的集数"""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=parallel) as executor:
+        return sum(1 for ok in executor.map(download, range(1, episodes + 1)) if ok)
+
+
+def run_thread_engine(server, concurrency, save_dir, episodes, options):
+    """线程池引擎：在当前进程中调用 download_movie"""
+    downloader = MovieDownloader(max_workers=concurrency, console=Console(quiet=True),
+                                 base_url=server.base_url, segment_cache=options.get('segment_cache'))
+
+    def download(ep):
+        return downloader.download_movie(server.play_url(1, ep), os.path.join(save_dir, f'{ep:03d}.mp4'))
+    return _run_episodes(download, episodes, options.get('parallel', 1))
+
+
+def run_process_engine(server, concurrency, save_dir, episodes, options):
+    """多进程引擎：每集在独立的工作进程中调用 download_movie"""
+    downloader = MovieDownloader(max_workers=concurrency, console=Console(quiet=True),
+                                 base_url=server.base_url, segment_cache=options.get('segment_cache'))
+    backend = ProcessBackend()
+
+    def download(ep):
+        return backend.download(downloader, server.play_url(1, ep), os.path.join(save_dir, f'{ep:03d}.mp4'),
+                                None, lambda progress, speed: None)
+    return _run_episodes(download, episodes, options.get('parallel', 1))
+
+
+# 下载引擎，名称 -> 执行函数
+ENGINES = {
+    'thread': run_thread_engine,
+    'process': run_process_engine,
+}
+
+
+def cpu_time():
+    """本进程及已退出的工作进程消耗的 CPU 时间（秒）"""
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def run_case(server, engine, concurrency, episodes, options):
+    """执行一组测试，返回结果字典"""
+    save_dir = tempfile.mkdtemp(prefix='jianpian-bench-')
+    merge_before = metrics.MERGE_SECONDS.get()[0]
+    cpu_before = cpu_time()
+    rss_before = current_rss()
+    start = time.monotonic()
+    try:
+        ok = ENGINES[engine](server, concurrency, save_dir, episodes, options)
+        elapsed = time.monotonic() - start
+        cpu = cpu_time() - cpu_before
+        total_bytes = sum(
+            os.path.getsize(os.path.join(save_dir, name))
+            for name in os.listdir(save_dir) if name.endswith('.mp4')
+        )
+    finally:
+        shutil.rmtree(save_dir, ignore_errors=True)
+
+    merge_after = metrics.MERGE_SECONDS.get()[0]
+    return {
+        'engine': engine,
+        'concurrency': concurrency,
+        'episodes': episodes,
+        'completed': ok,
+        'seconds': round(elapsed, 3),
+        'bytes': total_bytes,
+        'throughput_mb_s': round(total_bytes / elapsed / (1024 * 1024), 2) if elapsed else 0,
+        'merge_seconds': round(merge_after - merge_before, 3),
+        'cpu_seconds': round(cpu, 3),
+        'cpu_percent': round(cpu / elapsed * 100, 1) if elapsed else 0,
+        'rss_mb': round(current_rss() / (1024 * 1024), 1),
+        'rss_delta_mb': round((current_rss() - rss_before) / (1024 * 1024), 1),
+    }
+
+
+def print_results(results, console):
+    table = Table(title='download_movie 性能测试')
+    for column in ('引擎', '并发', '完成', '耗时(s)', '吞吐(MB/s)', '合并(s)', 'CPU(s)', 'CPU%', 'RSS(MB)'):
+        table.add_column(column, justify='right')
+    for r in results:
+        table.add_row(
+            r['engine'], str(r['concurrency']), f"{r['completed']}/{r['episodes']}",
+            f"{r['seconds']:.2f}", f"{r['throughput_mb_s']:.2f}", f"{r['merge_seconds']:.3f}",
+            f"{r['cpu_seconds']:.2f}", f"{r['cpu_percent']:.0f}", f"{r['rss_mb']:.1f}",
+        )
+    console.print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='download_movie 端到端性能测试')
+    add_site_arguments(parser)
+    parser.add_argument('--concurrency', default='8,16,32', help='逗号分隔的分片并发数列表')
+    parser.add_argument('--engine', default='thread', help=f"逗号分隔的引擎列表，可选: {','.join(ENGINES)}")
+    parser.add_argument('--bench-episodes', type=int, default=1, help='每组测试下载的集数')
+    parser.add_argument('--parallel', type=int, default=1, help='同时下载的集数')
+    parser.add_argument('--repeat', type=int, default=1, help='每组测试重复次数')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    parser.add_argument('--trace', help='把各阶段耗时导出为 Chrome trace JSON 文件')
+    parser.add_argument('--segment-cache', help='使用该目录作为分片缓存（重复测试时命中缓存）')
+    args = parser.parse_args()
+
+    engines = [e.strip() for e in args.engine.split(',') if e.strip()]
+    unknown = [e for e in engines if e not in ENGINES]
+    if unknown:
+        parser.error(f"未知引擎: {', '.join(unknown)}")
+    concurrency_list = [int(c) for c in args.concurrency.split(',') if c.strip()]
+    episodes = min(args.bench_episodes, args.episodes)
+
+    console = Console(stderr=True)
+    if args.trace:
+        tracing.TRACER.enable()
+    options = {'parallel': max(1, args.parallel)}
+    if args.segment_cache:
+        options['segment_cache'] = SegmentCache(args.segment_cache)
+    server = FakeSiteServer(config_from_args(args)).start()
+    results = []
+    try:
+        for engine in engines:
+            for concurrency in concurrency_list:
+                for _ in range(args.repeat):
+                    result = run_case(server, engine, concurrency, episodes, options)
+                    results.append(result)
+                    console.print(json.dumps(result, ensure_ascii=False))
+    finally:
+        server.stop()
+
+    print_results(results, console)
+    console.print(f"模拟站点统计: {server.site.stats}")
+    if args.trace:
+        tracing.TRACER.export_chrome_trace(args.trace)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'site': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
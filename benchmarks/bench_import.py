@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""启动耗时测试
+
+在全新的解释器中反复执行常见的启动场景（导入包、jianpian-dl --help、导入下载器等），
+统计耗时的最小值和中位数；--importtime 会列出指定场景中累计耗时最多的模块。
+
+示例:
+    python benchmarks/bench_import.py --repeat 20
+    python benchmarks/bench_import.py --importtime help --top 15
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 场景名称 -> 在子进程中执行的代码
+SCENARIOS = {
+    'python': 'pass',
+    'import': 'import jianpian_downloader',
+    'help': "from jianpian_downloader import main\ntry:\n    main(['--help'])\nexcept SystemExit:\n    pass",
+    'headless': 'import jianpian_downloader.headless',
+    'library': 'from jianpian_downloader import MovieDownloader',
+    'interactive': 'import jianpian_downloader.cli, jianpian_downloader.downloader, rich.table',
+}
+
+
+def run_once(code):
+    """在新解释器中执行代码，返回耗时（秒）"""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def import_times(code, top):
+    """用 -X importtime 统计累计耗时最多的模块，返回 [(模块, 毫秒)]"""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(cumulative) / 1000))
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动耗时测试')
+    parser.add_argument('--scenario', default=','.join(SCENARIOS),
+                        help=f"逗号分隔的场景列表，可选: {','.join(SCENARIOS)}")
+    parser.add_argument('--repeat', type=int, default=10, help='每个场景执行的次数')
+    parser.add_argument('--importtime', help='列出该场景中导入耗时最多的模块')
+    parser.add_argument('--top', type=int, default=10, help='--importtime 列出的模块数')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    from rich.console import Console
+    from rich.table import Table
+
+    console = Console(stderr=True)
+    names = [name.strip() for name in args.scenario.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+
+    results = []
+    for name in names:
+        run_once(SCENARIOS[name])  # 预热文件系统缓存和 .pyc
+        samples = [run_once(SCENARIOS[name]) for _ in range(args.repeat)]
+        results.append({
+            'scenario': name,
+            'min_ms': round(min(samples) * 1000, 1),
+            'median_ms': round(statistics.median(samples) * 1000, 1),
+        })
+
+    table = Table(title='启动耗时')
+    for column in ('场景', '最小(ms)', '中位数(ms)'):
+        table.add_column(column, justify='right')
+    for r in results:
+        table.add_row(r['scenario'], f"{r['min_ms']:.1f}", f"{r['median_ms']:.1f}")
+    console.print(table)
+
+    if args.importtime:
+        table = Table(title=f'{args.importtime} 场景导入耗时（累计）')
+        table.add_column('模块')
+        table.add_column('耗时(ms)', justify='right')
+        for module, ms in import_times(SCENARIOS[args.importtime], args.top):
+            table.add_row(module, f"{ms:.1f}")
+        console.print(table)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version, 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""长队列常驻内存测试
+
+启动本地 HLS 模拟站点，把一部剧的全部剧集（默认 1000 集，每集很小）加入 DownloadManager，
+按完成进度记录常驻内存，检查低内存模式下常驻内存在队列下载过程中保持平稳。
+
+示例:
+    python benchmarks/bench_memory.py --episodes 1000 --memory-limit 128M
+    python benchmarks/bench_memory.py --mode normal --episodes 1000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rich.console import Console
+from rich.table import Table
+
+from hls_server import FakeSiteServer, add_site_arguments, config_from_args
+from jianpian_downloader.downloader import MovieDownloader
+from jianpian_downloader.lowmem import MemoryBudget, current_rss
+from jianpian_downloader.manager import DownloadManager
+from jianpian_downloader.segment_cache import parse_size
+from jianpian_downloader.video import Video
+
+MB = 1024 * 1024
+
+
+def run(server, args, save_dir):
+    """下载整个队列，返回 [(已完成集数, 经过秒数, 常驻内存)]"""
+    console = Console(quiet=True)
+    downloader = MovieDownloader(max_workers=args.workers, console=console, base_url=server.base_url)
+    budget = None
+    if args.mode == 'lowmem':
+        budget = MemoryBudget(parse_size(args.memory_limit))
+        budget.apply(downloader, args.parallel)
+    manager = DownloadManager(store_path=os.path.join(save_dir, 'tasks.json'), max_active_tasks=args.parallel,
+                              console=console, memory_budget=budget)
+    downloader.set_download_manager(manager)
+
+    video = Video('测试剧集1', f'{server.base_url}/detail/1.html')
+    if not video.get_episodes(downloader):
+        raise RuntimeError('无法获取剧集列表')
+    start = time.monotonic()
+    for index in range(len(video.episodes)):
+        manager.add_download(video, index, save_dir, downloader)
+
+    samples = [(0, 0.0, current_rss())]
+    step = max(1, len(video.episodes) // args.samples)
+    next_sample = step
+    while True:
+        statuses = manager.get_status().values()
+        finished = sum(1 for info in statuses if info['status'] in ('completed', 'failed', 'cancelled'))
+        if finished >= next_sample or finished == len(video.episodes):
+            samples.append((finished, time.monotonic() - start, current_rss()))
+            next_sample = finished + step
+        if finished == len(video.episodes):
+            break
+        time.sleep(0.2)
+
+    completed = sum(1 for info in manager.get_status().values() if info['status'] == 'completed')
+    manager.stop()
+    if budget is not None:
+        budget.stop()
+    return completed, samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='长队列常驻内存测试')
+    add_site_arguments(parser)
+    parser.set_defaults(series=1, episodes=1000, segments=4, segment_size=32 * 1024)
+    parser.add_argument('--mode', choices=('lowmem', 'normal'), default='lowmem', help='是否启用低内存模式')
+    parser.add_argument('--memory-limit', default='128M', help='低内存模式的常驻内存预算（默认 128M）')
+    parser.add_argument('--workers', type=int, default=8, help='每集的分片并发数')
+    parser.add_argument('--parallel', type=int, default=2, help='同时下载的集数')
+    parser.add_argument('--samples', type=int, default=10, help='记录常驻内存的次数')
+    parser.add_argument('--max-growth', default='8M',
+                        help='队列前 20%% 完成后常驻内存允许的最大增长，超出时退出码为 1（默认 8M）')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    console = Console(stderr=True)
+    save_dir = tempfile.mkdtemp(prefix='jianpian-bench-memory-')
+    server = FakeSiteServer(config_from_args(args)).start()
+    try:
+        completed, samples = run(server, args, save_dir)
+    finally:
+        server.stop()
+        shutil.rmtree(save_dir, ignore_errors=True)
+
+    table = Table(title=f'常驻内存（{args.mode}，{args.episodes} 集）')
+    for column in ('已完成', '耗时(s)', 'RSS(MB)'):
+        table.add_column(column, justify='right')
+    for finished, elapsed, rss in samples:
+        table.add_row(str(finished), f"{elapsed:.1f}", f"{rss / MB:.1f}")
+    console.print(table)
+
+    # 线程、连接池和缓冲区在开始阶段建立，从队列完成 20% 之后开始比较
+    warm = [rss for finished, _, rss in samples if finished >= args.episodes * 0.2]
+    growth = max(warm) - warm[0] if warm else 0
+    ok = completed == args.episodes and growth <= parse_size(args.max_growth)
+    console.print(f"完成 {completed}/{args.episodes} 集，预热后常驻内存增长 {growth / MB:.1f} MB，"
+                  f"{'[green]通过[/green]' if ok else '[red]未通过[/red]'}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'site': vars(args), 'completed': completed, 'growth': growth,
+                       'samples': samples}, f, ensure_ascii=False, indent=2)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""本地 HLS 模拟站点
+
+提供与真实站点结构一致的搜索页、详情页、播放页，以及主/子 m3u8 播放列表和 .ts 分片，
+支持配置请求延迟、单连接带宽、错误注入和分片数量，用于离线、可复现的性能测试。
+
+单独运行时启动服务并保持前台:
+    python benchmarks/hls_server.py --port 8000 --segments 200 --latency 0.02
+"""
+import re
+import sys
+import gzip
+import hashlib
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+TS_PACKET_SIZE = 188
+
+
+class SiteConfig:
+    """模拟站点的参数"""
+    def __init__(self, series=3, episodes=10, segments=100, segment_size=256 * 1024,
+                 latency=0.0, bandwidth=0, error_rate=0.0, truncate_rate=0.0,
+                 target_duration=4, live=False, live_window=6, seed=0):
+        self.series = series  # 每次搜索返回的剧集数
+        self.episodes = episodes  # 每部剧的集数
+        self.segments = segments  # 每集的分片数
+        self.segment_size = segment_size  # 每个分片的字节数（按 188 字节对齐）
+        self.latency = latency  # 每个请求的额外延迟（秒）
+        self.bandwidth = bandwidth  # 单连接带宽（字节/秒），0 表示不限制
+        self.error_rate = error_rate  # 分片请求返回 500 的概率
+        self.truncate_rate = truncate_rate  # 分片响应中途断开的概率
+        self.target_duration = target_duration  # 分片时长（秒）
+        self.live = live  # 模拟直播：播放列表为随时间滑动的窗口，没有结束标记
+        self.live_window = live_window  # 直播播放列表保留的分片数
+        self.seed = seed
+
+
+class FakeSite:
+    """按配置生成页面和分片内容"""
+    def __init__(self, config):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.random_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'bytes': 0, 'errors': 0, 'truncated': 0, 'not_modified': 0}
+        packets = max(1, config.segment_size // TS_PACKET_SIZE)
+        payload = bytes(random.Random(config.seed).getrandbits(8) for _ in range(TS_PACKET_SIZE - 4))
+        # 每个分片都是合法的 TS 包序列（同步字节 0x47）
+        self.segment_template = (b'\x47\x01\x00\x10' + payload) * packets
+        self.started = time.monotonic()
+
+    def roll(self, probability):
+        """按概率返回 True，结果可复现"""
+        if probability <= 0:
+            return False
+        with self.random_lock:
+            return self.random.random() < probability
+
+    def count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def search_page(self, keyword, page):
+        items = []
+        if page == 1:
+            for sid in range(1, self.config.series + 1):
+                items.append(
+                    f'<li class="stui-vodlist__item">'
+                    f'<a class="stui-vodlist__thumb" href="/detail/{sid}.html" '
+                    f'title="{keyword}{sid}" data-original="/posters/{sid}.jpg"></a></li>'
+                )
+        return f'<html><body><ul class="stui-vodlist">{"".join(items)}</ul></body></html>'
+
+    def detail_page(self, sid):
+        episodes = ''.join(
+            f'<li><a href="/play/{sid}-{ep}.html">第{ep:02d}集</a></li>'
+            for ep in range(1, self.config.episodes + 1)
+        )
+        return (
+            f'<html><body>'
+            f'<h3 class="title">测试剧集{sid}<span class="score">9.0</span></h3>'
+            f'<p class="data">类型：剧情地区：大陆年份：2024</p>'
+            f'<p class="data">导演：测试</p><p class="data">主演：测试</p>'
+            f'<div class="stui-content__desc">离线性能测试用的模拟剧集</div>'
+            f'<ul class="stui-content__playlist">{episodes}</ul>'
+            f'</body></html>'
+        )
+
+    def play_page(self, host, sid, ep):
+        url = f'http://{host}/hls/{sid}/{ep}/index.m3u8'.replace('/', '\\/')
+        return (
+            f'<html><body><script type="text/javascript">'
+            f'var player_aaaa={{"flag":"play","url":"{url}","from":"bench"}}'
+            f'</script></body></html>'
+        )
+
+    def master_playlist(self):
+        return (
+            '#EXTM3U\n'
+            '#EXT-X-STREAM-INF:PROGRAM-ID=1,BANDWIDTH=2000000,RESOLUTION=1280x720\n'
+            '720p/index.m3u8\n'
+        )
+
+    def live_head(self):
+        """直播当前最新分片的序号"""
+        return int((time.monotonic() - self.started) / self.config.target_duration)
+
+    def media_playlist(self):
+        if self.config.live:
+            last = self.live_head()
+            first = max(0, last - self.config.live_window + 1)
+        else:
+            first, last = 0, self.config.segments - 1
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{self.config.target_duration}',
+            f'#EXT-X-MEDIA-SEQUENCE:{first}',
+        ]
+        for index in range(first, last + 1):
+            lines.append(f'#EXTINF:{self.config.target_duration}.0,')
+            lines.append(f'seg{index:05d}.ts')
+        if not self.config.live:
+            lines.append('#EXT-X-ENDLIST')
+        return '\n'.join(lines) + '\n'
+
+    def has_segment(self, index):
+        if self.config.live:
+            return index <= self.live_head()
+        return index < self.config.segments
+
+    def segment(self, sid, ep, index):
+        # 在首个包中写入分片编号，使每个分片内容不同
+        header = b'\x47\x01\x00\x10' + f'{sid}-{ep}-{index}'.encode().ljust(TS_PACKET_SIZE - 4, b'\x00')
+        return header + self.segment_template[TS_PACKET_SIZE:]
+
+
+ROUTES = [
+    ('search', re.compile(r'^/jpsearch/(.+?)----------(\d+)---\.html$')),
+    ('detail', re.compile(r'^/detail/(\d+)\.html$')),
+    ('play', re.compile(r'^/play/(\d+)-(\d+)\.html$')),
+    ('master', re.compile(r'^/hls/(\d+)/(\d+)/index\.m3u8$')),
+    ('media', re.compile(r'^/hls/(\d+)/(\d+)/720p/index\.m3u8$')),
+    ('segment', re.compile(r'^/hls/(\d+)/(\d+)/720p/seg(\d+)\.ts$')),
+]
+
+
+class FakeSiteHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        site = self.server.site
+        site.count('requests')
+        if site.config.latency:
+            time.sleep(site.config.latency)
+
+        path = unquote(self.path.split('?', 1)[0])
+        for name, pattern in ROUTES:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            self._send(404, b'not found', 'text/plain')
+            return
+
+        groups = match.groups()
+        if name == 'search':
+            body = site.search_page(groups[0], int(groups[1])).encode('utf-8')
+            self._send_text(body, 'text/html; charset=utf-8')
+        elif name == 'detail':
+            self._send_text(site.detail_page(int(groups[0])).encode('utf-8'), 'text/html; charset=utf-8')
+        elif name == 'play':
+            host = self.headers.get('Host', f'127.0.0.1:{self.server.server_port}')
+            body = site.play_page(host, int(groups[0]), int(groups[1])).encode('utf-8')
+            self._send_text(body, 'text/html; charset=utf-8')
+        elif name == 'master':
+            self._send_text(site.master_playlist().encode(), 'application/vnd.apple.mpegurl')
+        elif name == 'media':
+            self._send_text(site.media_playlist().encode(), 'application/vnd.apple.mpegurl')
+        else:
+            sid, ep, index = (int(g) for g in groups)
+            if not site.has_segment(index):
+                self._send(404, b'not found', 'text/plain')
+            elif site.roll(site.config.error_rate):
+                site.count('errors')
+                self._send(500, b'injected error', 'text/plain')
+            else:
+                body = site.segment(sid, ep, index)
+                truncate = site.roll(site.config.truncate_rate)
+                self._send(200, body, 'video/mp2t', truncate=truncate)
+
+    def _send_text(self, body, content_type):
+        """发送页面或播放列表：带 ETag，支持 If-None-Match 和 gzip"""
+        site = self.server.site
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            site.count('not_modified')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        headers = {'ETag': etag}
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        self._send(200, body, content_type, headers=headers)
+
+    def _send(self, status, body, content_type, truncate=False, headers=None):
+        site = self.server.site
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+
+        if truncate:
+            # 只发送一半数据后断开连接
+            site.count('truncated')
+            body = body[:len(body) // 2]
+            self.close_connection = True
+
+        bandwidth = site.config.bandwidth
+        chunk_size = 64 * 1024
+        for offset in range(0, len(body), chunk_size):
+            chunk = body[offset:offset + chunk_size]
+            self.wfile.write(chunk)
+            site.count('bytes', len(chunk))
+            if bandwidth:
+                time.sleep(len(chunk) / bandwidth)
+
+
+class FakeSiteServer(ThreadingHTTPServer):
+    """在后台线程运行的模拟站点"""
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, config, host='127.0.0.1', port=0):
+        self.site = FakeSite(config)
+        super().__init__((host, port), FakeSiteHandler)
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def play_url(self, sid=1, ep=1):
+        return f'{self.base_url}/play/{sid}-{ep}.html'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def add_site_arguments(parser):
+    """添加模拟站点参数"""
+    parser.add_argument('--series', type=int, default=3, help='搜索结果数量')
+    parser.add_argument('--episodes', type=int, default=10, help='每部剧的集数')
+    parser.add_argument('--segments', type=int, default=100, help='每集的分片数')
+    parser.add_argument('--segment-size', type=int, default=256 * 1024, help='分片大小（字节）')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的额外延迟（秒）')
+    parser.add_argument('--bandwidth', type=int, default=0, help='单连接带宽（字节/秒），0 为不限')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='分片请求返回 500 的概率')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='分片响应中途断开的概率')
+    parser.add_argument('--target-duration', type=int, default=4, help='分片时长（秒）')
+    parser.add_argument('--live', action='store_true', help='模拟直播：播放列表为滑动窗口，没有结束标记')
+    parser.add_argument('--live-window', type=int, default=6, help='直播播放列表保留的分片数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+
+
+def config_from_args(args):
+    return SiteConfig(
+        series=args.series, episodes=args.episodes, segments=args.segments,
+        segment_size=args.segment_size, latency=args.latency, bandwidth=args.bandwidth,
+        error_rate=args.error_rate, truncate_rate=args.truncate_rate,
+        target_duration=args.target_duration, live=args.live, live_window=args.live_window, seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 HLS 模拟站点')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    add_site_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeSiteServer(config_from_args(args), args.host, args.port)
+    print(f'模拟站点已启动: {server.base_url}  示例播放页: {server.play_url()}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
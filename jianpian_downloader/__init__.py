@@ -1,4 +1,27 @@
-from .movie_downloader import main
-
+# 子模块在第一次访问时才导入，import jianpian_downloader 不会加载 requests、bs4、rich 等依赖
 __version__ = "1.0.3"
-__all__ = ['main']
+__all__ = ['main', 'Client', 'AsyncClient', 'MovieDownloader', 'DownloadManager', 'Video']
+
+_LAZY_ATTRS = {
+    'Client': 'api',
+    'AsyncClient': 'api',
+    'MovieDownloader': 'downloader',
+    'DownloadManager': 'manager',
+    'Video': 'video',
+}
+
+
+def main(argv=None):
+    """命令行入口"""
+    from .cli import main as cli_main
+    return cli_main(argv)
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
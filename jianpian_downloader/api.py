@@ -0,0 +1,330 @@
+"""程序化接口
+
+Client 把搜索、解析剧集、加入下载队列和等待完成封装成普通的函数调用，不向终端输出任何内容，
+适合在其他程序中嵌入使用。进度通过回调（on_event）或事件迭代器（events）获取；
+AsyncClient 提供相同功能的 asyncio 版本。
+
+事件为字典，字段与 DownloadManager.get_status 一致，另有 event（progress 或 finished）和 task_id::
+
+    with Client(output='downloads') as client:
+        video = client.resolve(client.search('流浪地球')[0])
+        task_ids = client.enqueue(video, '1-3')
+        for event in client.events(task_ids):
+            print(event['task_id'], event['status'], event['progress'])
+"""
+import queue
+import asyncio
+import threading
+
+from .video import Video, parse_episode_ranges
+
+# 不会再变化的任务状态
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class Client:
+    """同步的下载客户端"""
+    def __init__(self, output='downloads', workers=48, parallel=2, base_url="https://vodjp.com",
+                 task_store=None, segment_cache=None, backend=None, on_event=None, poll_interval=0.5):
+        from rich.console import Console
+        from .downloader import MovieDownloader
+        from .manager import DownloadManager
+
+        console = Console(quiet=True)
+        self.output = output  # 默认保存目录
+        self.poll_interval = poll_interval  # 检查任务状态变化的间隔（秒）
+        self.downloader = MovieDownloader(max_workers=workers, console=console, base_url=base_url,
+                                          segment_cache=segment_cache)
+        # task_store 为 None 时任务只保存在内存中
+        self.manager = DownloadManager(store_path=task_store, max_active_tasks=parallel,
+                                       console=console, backend=backend)
+        self.downloader.set_download_manager(self.manager)
+        self.callbacks = [on_event] if on_event else []
+        self.subscribers = []  # 事件迭代器的队列
+        self.snapshot = {}  # 上次检查时的任务状态
+        self.condition = threading.Condition()
+        self.closed = False
+        self.watch_thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def search(self, keyword):
+        """按关键字搜索，返回 Video 列表"""
+        return self.downloader.search_cached(keyword)
+
+    def movie_info(self, url):
+        """获取详情页中的影片信息"""
+        return self.downloader.get_movie_info(url)
+
+    def resolve(self, target):
+        """获取剧集列表，target 为 Video 或详情页地址，返回 Video，失败时抛出 LookupError"""
+        if isinstance(target, Video):
+            video = target
+        else:
+            info = self.downloader.get_movie_info(target)
+            video = Video(info.get('title') or target.rstrip('/').rsplit('/', 1)[-1], target)
+        if not video.get_episodes(self.downloader):
+            raise LookupError(f"获取剧集列表失败: {video.title}")
+        return video
+
+    def enqueue(self, video, episodes=None, output=None):
+        """把剧集加入下载队列，返回任务 ID 列表
+
+        episodes 为 None 或 'all' 时下载全部剧集；为字符串时按命令行的范围格式解析（如 '1-3,5'，
+        从 1 开始）；也可以直接给出从 0 开始的剧集索引列表。已在队列中的剧集返回原有的任务 ID；
+        任务 ID 被其他剧集占用（剧集列表中间插入了新剧集）而无法加入的剧集不在返回值中。
+        """
+        if not video.episodes:
+            video = self.resolve(video)
+        if episodes is None or (isinstance(episodes, str) and episodes.strip().lower() in ('', 'all')):
+            indexes = list(range(len(video.episodes)))
+        elif isinstance(episodes, str):
+            indexes = parse_episode_ranges(episodes, len(video.episodes))
+        else:
+            indexes = list(episodes)
+            for index in indexes:
+                if not 0 <= index < len(video.episodes):
+                    raise ValueError(f"剧集索引超出范围: {index}")
+
+        added = set(self.manager.add_downloads(video, indexes, output or self.output, self.downloader))
+        statuses = self.manager.get_status()
+        task_ids = []
+        for index in dict.fromkeys(indexes):
+            task_id = self.manager.task_id(video, index)
+            existing = statuses.get(task_id)
+            if task_id in added or (existing and existing['episode'] == video.episodes[index]['title']):
+                task_ids.append(task_id)
+        self._start_watch()
+        return task_ids
+
+    def status(self, task_id=None):
+        """返回所有任务（或指定任务）的状态"""
+        statuses = self.manager.get_status()
+        if task_id is None:
+            return statuses
+        return statuses.get(task_id)
+
+    def pause(self, task_id):
+        return self.manager.pause_task(task_id)
+
+    def resume(self, task_id):
+        return self.manager.resume_task(task_id, self.downloader)
+
+    def cancel(self, task_id):
+        return self.manager.cancel_task(task_id)
+
+    def retry_failed(self, task_ids=None):
+        """重新开始失败的任务，返回重新加入队列的任务 ID 列表"""
+        return self.manager.retry_failed(self.downloader, task_ids)
+
+    def prioritize(self, task_ids):
+        """把等待中的任务移到队列最前面"""
+        return self.manager.prioritize(task_ids)
+
+    def subscribe(self, callback):
+        """注册事件回调，回调在后台线程中执行"""
+        self.callbacks.append(callback)
+        self._start_watch()
+
+    def wait(self, task_ids=None, timeout=None):
+        """等待任务全部结束（完成、失败或取消），返回 {任务 ID: 状态}
+
+        timeout 秒后仍有任务未结束时抛出 TimeoutError。
+        """
+        self._start_watch()
+        if task_ids is not None:
+            unknown = [task_id for task_id in task_ids if task_id not in self.snapshot]
+            if unknown:
+                raise KeyError(f"未知的任务: {', '.join(unknown)}")
+        with self.condition:
+            finished = self.condition.wait_for(lambda: self._all_finished(task_ids), timeout)
+        if not finished:
+            raise TimeoutError("等待下载任务超时")
+        statuses = self.status()
+        return {task_id: statuses[task_id] for task_id in self._targets(task_ids, statuses)}
+
+    def events(self, task_ids=None, timeout=None):
+        """迭代进度事件，直到任务全部结束；timeout 秒内没有新事件时抛出 TimeoutError"""
+        yield from self._events(self._subscribe(), task_ids, timeout)
+
+    def _subscribe(self):
+        """注册事件队列，向队列放入 None 时对应的事件迭代结束"""
+        events = queue.Queue()
+        with self.condition:
+            self.subscribers.append(events)
+        self._start_watch()
+        return events
+
+    def _events(self, events, task_ids, timeout):
+        try:
+            while True:
+                with self.condition:
+                    if events.empty() and self._all_finished(task_ids):
+                        return
+                try:
+                    event = events.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError("等待下载事件超时")
+                if event is None:
+                    return
+                if task_ids is None or event['task_id'] in task_ids:
+                    yield event
+        finally:
+            with self.condition:
+                self.subscribers.remove(events)
+
+    def close(self):
+        """停止所有下载并释放连接"""
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            for events in self.subscribers:
+                events.put(None)
+            self.condition.notify_all()
+        self.downloader.stop_flag = True
+        for task_id in list(self.status()):
+            self.manager.pause_task(task_id)
+        self.manager.stop()
+        if self.watch_thread is not None:
+            self.watch_thread.join(timeout=5)
+        self.downloader.session.close()
+
+    def _targets(self, task_ids, statuses):
+        return list(statuses) if task_ids is None else [t for t in task_ids if t in statuses]
+
+    def _all_finished(self, task_ids):
+        """调用时需持有 condition"""
+        if self.closed:
+            return True
+        targets = self.snapshot if task_ids is None else task_ids
+        return all(self.snapshot.get(task_id, {}).get('status') in FINAL_STATUSES for task_id in targets)
+
+    def _start_watch(self):
+        """立即刷新一次任务状态，并在需要时启动后台检查线程"""
+        with self.condition:
+            if self.closed:
+                return
+            events = self._check()
+            if self.watch_thread is None:
+                self.watch_thread = threading.Thread(target=self._watch, name='api-watch', daemon=True)
+                self.watch_thread.start()
+        self._dispatch(events)
+
+    def _watch(self):
+        while True:
+            with self.condition:
+                if self.closed:
+                    return
+                self.condition.wait(self.poll_interval)
+                if self.closed:
+                    return
+                events = self._check()
+            self._dispatch(events)
+
+    def _dispatch(self, events):
+        """在持有锁之外调用回调，回调中的异常不影响下载"""
+        for event in events:
+            for callback in list(self.callbacks):
+                try:
+                    callback(event)
+                except Exception:
+                    pass
+
+    def _check(self):
+        """对比任务状态，生成事件并通知等待者；调用时需持有 condition"""
+        events = []
+        for task_id, info in self.manager.get_status().items():
+            previous = self.snapshot.get(task_id)
+            if previous == info:
+                continue
+            self.snapshot[task_id] = info
+            finished = info['status'] in FINAL_STATUSES
+            event = dict(info, task_id=task_id, event='finished' if finished else 'progress')
+            events.append(event)
+            for subscriber in self.subscribers:
+                subscriber.put(event)
+        if events:
+            self.condition.notify_all()
+        return events
+
+
+class AsyncClient:
+    """asyncio 版本的下载客户端，阻塞操作在线程池中执行"""
+    def __init__(self, **kwargs):
+        self.client = Client(**kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def search(self, keyword):
+        return await self._call(self.client.search, keyword)
+
+    async def movie_info(self, url):
+        return await self._call(self.client.movie_info, url)
+
+    async def resolve(self, target):
+        return await self._call(self.client.resolve, target)
+
+    async def enqueue(self, video, episodes=None, output=None):
+        return await self._call(self.client.enqueue, video, episodes, output)
+
+    def status(self, task_id=None):
+        return self.client.status(task_id)
+
+    async def pause(self, task_id):
+        return await self._call(self.client.pause, task_id)
+
+    async def resume(self, task_id):
+        return await self._call(self.client.resume, task_id)
+
+    async def cancel(self, task_id):
+        return await self._call(self.client.cancel, task_id)
+
+    async def retry_failed(self, task_ids=None):
+        return await self._call(self.client.retry_failed, task_ids)
+
+    async def prioritize(self, task_ids):
+        return await self._call(self.client.prioritize, task_ids)
+
+    async def wait(self, task_ids=None, timeout=None):
+        return await self._call(self.client.wait, task_ids, timeout)
+
+    async def events(self, task_ids=None):
+        """异步迭代进度事件，直到任务全部结束"""
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        done = object()
+        subscription = self.client._subscribe()
+
+        def pump():
+            try:
+                for event in self.client._events(subscription, task_ids, None):
+                    loop.call_soon_threadsafe(events.put_nowait, event)
+            finally:
+                loop.call_soon_threadsafe(events.put_nowait, done)
+
+        future = loop.run_in_executor(None, pump)
+        try:
+            while True:
+                event = await events.get()
+                if event is done:
+                    break
+                yield event
+        finally:
+            # 调用方提前退出迭代或被取消时结束后台线程，并移除事件队列
+            subscription.put(None)
+            await future
+
+    async def close(self):
+        await self._call(self.client.close)
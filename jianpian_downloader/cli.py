@@ -0,0 +1,289 @@
+"""命令行入口
+
+不带参数运行时进入交互界面，带参数时交给 headless 以无界面模式运行。
+界面用到的 rich 组件和下载器都在进入对应模式后才导入，jianpian-dl --help 等命令不需要加载它们。
+"""
+import os
+import sys
+import signal
+
+
+def raise_open_file_limit():
+    """把打开文件数的软限制提高到硬限制，并发下载分片时需要同时打开大量文件"""
+    try:
+        import resource
+    except ImportError:
+        # Windows 没有 resource 模块
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    raise_open_file_limit()
+    # 带参数启动时进入无界面批处理模式
+    if argv:
+        from .headless import run_headless
+        sys.exit(run_headless(argv))
+    interactive_main()
+
+
+def interactive_main():
+    """交互界面"""
+    from datetime import datetime
+    from rich import box
+    from rich.table import Table
+    from .console import get_console
+    from .downloader import MovieDownloader
+    from .manager import DownloadManager
+    from .video import parse_episode_ranges
+
+    console = get_console()
+    try:
+        # 设置默认下载路径
+        default_path = "downloads"
+        default_save_dir = os.path.abspath(default_path)
+        
+        # 创建下载管理器
+        download_manager = DownloadManager()
+        # 使用默认的并行下载数
+        downloader = MovieDownloader(max_workers=48)
+        downloader.set_download_manager(download_manager)
+        
+        # 恢复未完成的下载任务
+        restored_count = download_manager.restore_tasks(downloader)
+        if restored_count > 0:
+            console.print(f"\n[green]已恢复 {restored_count} 个未完成的下载任务[/green]")
+            
+        # 启动自动保存线程
+        download_manager.start_auto_save()
+        
+        # 注册信号处理
+        signal.signal(signal.SIGINT, downloader.stop_download)
+        signal.signal(signal.SIGTERM, downloader.stop_download)
+
+        # 添加状态监控函数
+        def monitor_status():
+            from .dashboard import StatusDashboard
+            
+            console.print("\n[bold blue]下载任务状态[/bold blue] "
+                          "[cyan](n/p 翻页，a 只看进行中，f 只看失败，* 显示全部，直接回车返回)[/cyan]")
+            StatusDashboard(download_manager, console).run()
+            console.print("\n[cyan]返回主界面[/cyan]")
+
+        while True:  # 主搜索循环
+            # 显示当前下载状态
+            if download_manager.get_active_count() > 0:
+                download_manager.print_status()
+                
+            # 修改提示文本
+            keyword = input("\n[主界面] 请输入要搜索的视频名称（直接回车查看下载状态，输入 q 退出，输入 t 查看所有任务）: ")
+            if not keyword:
+                monitor_status()
+                continue
+            if keyword.lower() == 'q':
+                if download_manager.get_active_count() > 0:
+                    confirm = input("\n当前有正在下载的任务，确定要退出吗？(y/N): ")
+                    if confirm.lower() != 'y':
+                        continue
+                # 停止下载管理器并保存最后的状态
+                download_manager.stop()
+                console.print("\n[green]程序已退出，未完成的下载将在下次运行时继续[/green]")
+                os._exit(0)
+            if keyword.lower() == 't':
+                # 显示所有任务历史
+                console.print("\n[bold green]所有下载任务:[/bold green]")
+                table = Table(show_header=True, header_style="bold magenta", box=box.ROUNDED)
+                table.add_column("序号", style="cyan", width=6)
+                table.add_column("视频", style="white")
+                table.add_column("剧集", style="white")
+                table.add_column("状态", style="white")
+                table.add_column("进度", style="white")
+                table.add_column("创建时间", style="white")
+                
+                for i, (task_id, info) in enumerate(sorted(download_manager.downloads.items(), 
+                    key=lambda x: x[1]['created_at'], reverse=True), 1):
+                    status_style = {
+                        'pending': '[yellow]等待中[/yellow]',
+                        'downloading': '[blue]下载中[/blue]',
+                        'completed': '[green]已完成[/green]',
+                        'failed': '[red]失败[/red]',
+                        'paused': '[magenta]已暂停[/magenta]',
+                        'cancelled': '[dim]已取消[/dim]'
+                    }.get(info['status'], info['status'])
+                    
+                    created_time = datetime.fromisoformat(info['created_at']).strftime('%Y-%m-%d %H:%M:%S')
+                    
+                    table.add_row(
+                        str(i),
+                        info['video'].title,
+                        info['episode']['title'],
+                        status_style,
+                        f"{info['progress']:.1f}%",
+                        created_time
+                    )
+                
+                console.print(table)
+                input("\n按回车继续...")
+                continue
+                
+            # 搜索视频，之前见过的视频直接从本地索引返回
+            videos = downloader.search_cached(keyword)
+            if not videos:
+                console.print("[red]未找到相关视频，请尝试其他关键词[/red]")
+                continue
+
+            while True:  # 视频选择循环
+                # 显示搜索结果
+                console.print("\n[bold green]搜索结果:[/bold green]")
+                table = Table(show_header=True, header_style="bold magenta")
+                table.add_column("序号", style="cyan", width=6)
+                table.add_column("片名", style="white")
+                table.add_column("海报", style="blue")
+                
+                for i, video in enumerate(videos, 1):
+                    poster_info = "[blue]📷[/blue] " + (video.poster if video.poster else "无海报")
+                    table.add_row(str(i), video.title, poster_info)
+                console.print(table)
+
+                choice = input("\n[视频选择] 请输入要下载的视频编号（直接回车查看下载状态，输入b返回搜索）: ")
+                if not choice:
+                    monitor_status()
+                    continue
+                if choice.lower() == 'b':
+                    break  # 返回搜索界面
+
+                try:
+                    choice = int(choice) - 1
+                    if 0 <= choice < len(videos):
+                        video = videos[choice]
+                        video_info = downloader.get_movie_info(video.detail_url)
+                        
+                        if not video.get_episodes(downloader):
+                            console.print("[red]获取剧集列表失败，请重试[/red]")
+                            continue
+
+                        while True:  # 剧集选择循环
+                            # 显示影片信息
+                            if video_info:
+                                console.print("\n[bold yellow]影片信息:[/bold yellow]")
+                                for key, label in [
+                                    ('title', '片名'),
+                                    ('score', '评分'),
+                                    ('type', '类型'),
+                                    ('area', '地区'),
+                                    ('year', '年份'),
+                                    ('director', '导演'),
+                                    ('actors', '主演')
+                                ]:
+                                    if key in video_info:
+                                        console.print(f"[bold]{label}:[/bold] {video_info[key]}")
+                                if 'description' in video_info:
+                                    console.print(f"\n[bold]剧情简介:[/bold]\n{video_info['description']}")
+
+                            # 显示剧集列表
+                            console.print(f"\n[bold green]剧集列表[/bold green] [blue](共{len(video.episodes)}集)[/blue]")
+                            table = Table(box=box.ROUNDED)
+                            
+                            # 添加表头
+                            table.add_column("序号", style="cyan", justify="center")
+                            table.add_column("剧集", style="white", justify="left")
+                            table.add_column("序号", style="cyan", justify="center")
+                            table.add_column("剧集", style="white", justify="left")
+                            table.add_column("序号", style="cyan", justify="center")
+                            table.add_column("剧集", style="white", justify="left")
+                            table.add_column("序号", style="cyan", justify="center")
+                            table.add_column("剧集", style="white", justify="left")
+                            
+                            COLUMNS = 4  # 每行显示的剧集数
+                            rows = []
+                            current_row = []
+                            
+                            for i, ep in enumerate(video.episodes, 1):
+                                current_row.extend([str(i), ep['title']])
+                                if len(current_row) == COLUMNS * 2:
+                                    rows.append(current_row)
+                                    current_row = []
+                            
+                            if current_row:
+                                while len(current_row) < COLUMNS * 2:
+                                    current_row.extend(['', ''])
+                                rows.append(current_row)
+                            
+                            for row in rows:
+                                table.add_row(*row)
+                            
+                            console.print(table)
+                            console.print("\n[cyan]提示: 支持范围选择，例如: 1-3,5,7-9[/cyan]")
+
+                            ep_choice = input("\n[剧集选择] 请输入要下载的剧集编号（直接回车查看下载状态，输入b返回视频选择）: ")
+                            if not ep_choice:
+                                monitor_status()
+                                continue
+                            if ep_choice.lower() == 'b':
+                                break  # 返回视频选择
+
+                            try:
+                                ep_choices = parse_episode_ranges(ep_choice, len(video.episodes))
+                                save_dir = default_save_dir
+                                
+                                # 添加下载任务
+                                download_success = False
+                                added_tasks = []  # 记录添加的任务
+                                
+                                # 先检查所有任务是否已存在
+                                existing_tasks = []
+                                for ep_idx in ep_choices:
+                                    task_id = download_manager.task_id(video, ep_idx)
+                                    if task_id in download_manager.downloads:
+                                        existing_tasks.append(video.episodes[ep_idx]['title'])
+                                
+                                # 显示已存在的任务
+                                if existing_tasks:
+                                    console.print("\n[yellow]以下任务已存在:[/yellow]")
+                                    for task in existing_tasks:
+                                        console.print(f"[yellow]- {task}[/yellow]")
+                                
+                                # 一次添加所有新任务
+                                for task_id in download_manager.add_downloads(video, ep_choices, save_dir, downloader):
+                                    ep_idx = int(task_id.rsplit('_', 1)[1])
+                                    added_tasks.append(video.episodes[ep_idx]['title'])
+                                    download_success = True
+                                
+                                if download_success:
+                                    # 批量显示添加的任务
+                                    if added_tasks:
+                                        console.print("\n[green]已添加以下下载任务:[/green]")
+                                        for task in added_tasks:
+                                            console.print(f"[green]- {task}[/green]")
+                                    
+                                    # 不等待，直接显示状态并返回
+                                    monitor_status()
+                                    break  # 返回到搜索界面
+                                
+                            except ValueError as e:
+                                console.print(f"[red]错误: {str(e)}[/red]")
+                                continue
+                            
+                    else:
+                        console.print("[red]无效的选择，请输入正确的编号[/red]")
+                        
+                except ValueError:
+                    console.print("[red]请输入有效的数字[/red]")
+                    continue
+
+    except KeyboardInterrupt:
+        console.print("\n[yellow]接收到退出信号[/yellow]")
+        # 停止下载管理器并保存最后的状态
+        download_manager.stop()
+        console.print("\n[green]程序已退出，未完成的下载将在下次运行时继续[/green]")
+        os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
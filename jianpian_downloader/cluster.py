@@ -0,0 +1,386 @@
+"""多节点协同下载
+
+多台机器共享同一个作业队列，并把同一集的分片分给不同节点下载，突破单机网卡和 CDN 按 IP 限速的上限。
+节点之间通过协调后端交换状态：提交剧集、登记分片列表、按租约认领一批分片、完成后标记，
+所有分片完成后由第一个认领合并的节点合并输出。分片写到共享存储上与单机下载相同的临时目录
+（<输出文件>.downloading/NNNNN.ts），合并和清单沿用单机下载的实现。
+
+SQLiteCoordinator 是基于 SQLite 文件的协调后端，适合单机多进程测试或放在可靠的共享存储上；
+其他后端（例如 Redis、数据库服务）实现 Coordinator 的方法即可替换。节点异常退出时，
+其认领的分片和正在进行的合并在租约到期后重新分配给其他节点；合并期间节点定期续租。
+"""
+import os
+import abc
+import time
+import socket
+import shutil
+import sqlite3
+import threading
+import concurrent.futures
+
+from . import metrics, integrity
+from .streaming import MergeAborted
+from .tracing import TRACER
+
+CLUSTER_SEGMENTS = metrics.REGISTRY.counter(
+    'jianpian_cluster_segments_total', '本节点为协同下载完成的分片数')
+CLUSTER_MERGES = metrics.REGISTRY.counter(
+    'jianpian_cluster_merges_total', '本节点合并的剧集数', ['result'])
+
+
+def default_node_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Coordinator(abc.ABC):
+    """协调后端接口
+
+    剧集状态与 DownloadManager 的任务状态一致：pending（分片列表尚未登记）、downloading、
+    merging、completed、failed；分片状态为 pending、claimed、done、failed。
+    """
+    @abc.abstractmethod
+    def submit(self, episode_id, play_url, save_path):
+        """提交剧集，已存在时返回 False"""
+
+    @abc.abstractmethod
+    def next_episode(self):
+        """返回一个还有工作可做的剧集（字典），没有时返回 None"""
+
+    @abc.abstractmethod
+    def register_segments(self, episode_id, playlist_url, urls):
+        """登记剧集的分片地址列表，多个节点重复登记时以第一次为准"""
+
+    @abc.abstractmethod
+    def claim_segments(self, episode_id, node_id, limit, lease):
+        """认领最多 limit 个分片，返回 [(序号, 地址)]，租约 lease 秒后未完成的分片会重新分配"""
+
+    @abc.abstractmethod
+    def complete_segment(self, episode_id, index, node_id):
+        """标记分片下载完成"""
+
+    @abc.abstractmethod
+    def release_segment(self, episode_id, index, node_id, max_attempts):
+        """归还下载失败的分片，失败次数达到 max_attempts 时标记为失败"""
+
+    @abc.abstractmethod
+    def segment_urls(self, episode_id):
+        """按序号排列的分片地址"""
+
+    @abc.abstractmethod
+    def claim_merge(self, episode_id, node_id, lease):
+        """所有分片都已结束时认领合并，只有一个节点会得到 True；租约 lease 秒后未续租的合并会重新分配"""
+
+    @abc.abstractmethod
+    def renew_merge(self, episode_id, node_id, lease):
+        """延长本节点的合并租约，合并已被其他节点接手时返回 False"""
+
+    @abc.abstractmethod
+    def finish_episode(self, episode_id, ok, error=None):
+        """标记剧集完成或失败"""
+
+    @abc.abstractmethod
+    def episodes(self):
+        """所有剧集及其分片进度"""
+
+    @abc.abstractmethod
+    def has_unfinished(self):
+        """是否还有未完成（未成功也未失败）的剧集"""
+
+
+class SQLiteCoordinator(Coordinator):
+    """基于 SQLite 文件的协调后端"""
+    def __init__(self, path):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+        with self.lock:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS episodes ('
+                            'id TEXT PRIMARY KEY, play_url TEXT NOT NULL, save_path TEXT NOT NULL, '
+                            'playlist_url TEXT, segment_count INTEGER, status TEXT NOT NULL, '
+                            'merged_by TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, '
+                            'lease_until REAL)')
+            columns = [row[1] for row in self.db.execute('PRAGMA table_info(episodes)')]
+            if 'lease_until' not in columns:
+                # 早期版本创建的协调文件没有合并租约
+                self.db.execute('ALTER TABLE episodes ADD COLUMN lease_until REAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS segments ('
+                            'episode_id TEXT NOT NULL, idx INTEGER NOT NULL, url TEXT NOT NULL, '
+                            'status TEXT NOT NULL, node TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, '
+                            'PRIMARY KEY (episode_id, idx))')
+            self.db.execute('CREATE INDEX IF NOT EXISTS segments_status ON segments(episode_id, status)')
+
+    def _transaction(self):
+        """在锁内开启写事务（BEGIN IMMEDIATE），避免多个节点同时认领同一批分片"""
+        return _Transaction(self)
+
+    def submit(self, episode_id, play_url, save_path):
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                'INSERT OR IGNORE INTO episodes (id, play_url, save_path, status, created_at, updated_at) '
+                "VALUES (?, ?, ?, 'pending', ?, ?)", (episode_id, play_url, save_path, now, now))
+            return cursor.rowcount == 1
+
+    def next_episode(self):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT id, play_url, save_path, playlist_url, segment_count, status FROM episodes e "
+                "WHERE status = 'pending' OR (status = 'downloading' AND EXISTS ("
+                "  SELECT 1 FROM segments s WHERE s.episode_id = e.id AND "
+                "  (s.status = 'pending' OR (s.status = 'claimed' AND s.lease_until < ?)))) "
+                "ORDER BY created_at LIMIT 1", (now,)).fetchone()
+            if row is None:
+                # 没有可认领的分片时，检查是否有等待合并或合并租约已过期的剧集
+                row = self.db.execute(
+                    "SELECT id, play_url, save_path, playlist_url, segment_count, status FROM episodes e "
+                    "WHERE (status = 'downloading' AND NOT EXISTS ("
+                    "  SELECT 1 FROM segments s WHERE s.episode_id = e.id AND s.status IN ('pending', 'claimed'))) "
+                    "OR (status = 'merging' AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1", (now,)).fetchone()
+        if row is None:
+            return None
+        keys = ('id', 'play_url', 'save_path', 'playlist_url', 'segment_count', 'status')
+        return dict(zip(keys, row))
+
+    def register_segments(self, episode_id, playlist_url, urls):
+        with self._transaction() as db:
+            row = db.execute('SELECT segment_count FROM episodes WHERE id = ?', (episode_id,)).fetchone()
+            if row is None or row[0] is not None:
+                return
+            db.executemany("INSERT INTO segments (episode_id, idx, url, status) VALUES (?, ?, ?, 'pending')",
+                           [(episode_id, i, url) for i, url in enumerate(urls)])
+            db.execute("UPDATE episodes SET playlist_url = ?, segment_count = ?, status = 'downloading', "
+                       "updated_at = ? WHERE id = ?", (playlist_url, len(urls), time.time(), episode_id))
+
+    def segment_urls(self, episode_id):
+        with self.lock:
+            rows = self.db.execute('SELECT url FROM segments WHERE episode_id = ? ORDER BY idx',
+                                   (episode_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def claim_segments(self, episode_id, node_id, limit, lease):
+        now = time.time()
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT idx, url FROM segments WHERE episode_id = ? AND "
+                "(status = 'pending' OR (status = 'claimed' AND lease_until < ?)) ORDER BY idx LIMIT ?",
+                (episode_id, now, limit)).fetchall()
+            db.executemany(
+                "UPDATE segments SET status = 'claimed', node = ?, lease_until = ? WHERE episode_id = ? AND idx = ?",
+                [(node_id, now + lease, episode_id, idx) for idx, _ in rows])
+        return rows
+
+    def complete_segment(self, episode_id, index, node_id):
+        with self._transaction() as db:
+            db.execute("UPDATE segments SET status = 'done', node = ?, lease_until = NULL "
+                       "WHERE episode_id = ? AND idx = ?", (node_id, episode_id, index))
+
+    def release_segment(self, episode_id, index, node_id, max_attempts):
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE segments SET attempts = attempts + 1, lease_until = NULL, "
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END "
+                "WHERE episode_id = ? AND idx = ? AND node = ?", (max_attempts, episode_id, index, node_id))
+
+    def claim_merge(self, episode_id, node_id, lease):
+        now = time.time()
+        with self._transaction() as db:
+            unfinished = db.execute(
+                "SELECT COUNT(*) FROM segments WHERE episode_id = ? AND status IN ('pending', 'claimed')",
+                (episode_id,)).fetchone()[0]
+            if unfinished:
+                return False
+            cursor = db.execute(
+                "UPDATE episodes SET status = 'merging', merged_by = ?, lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND (status = 'downloading' OR (status = 'merging' AND lease_until < ?))",
+                (node_id, now + lease, now, episode_id, now))
+            return cursor.rowcount == 1
+
+    def renew_merge(self, episode_id, node_id, lease):
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE episodes SET lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'merging' AND merged_by = ?", (now + lease, now, episode_id, node_id))
+            return cursor.rowcount == 1
+
+    def finish_episode(self, episode_id, ok, error=None):
+        with self._transaction() as db:
+            db.execute('UPDATE episodes SET status = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ?',
+                       ('completed' if ok else 'failed', error, time.time(), episode_id))
+
+    def episodes(self):
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT e.id, e.save_path, e.status, e.segment_count, e.merged_by, e.error, "
+                "(SELECT COUNT(*) FROM segments s WHERE s.episode_id = e.id AND s.status = 'done') "
+                "FROM episodes e ORDER BY e.created_at").fetchall()
+        keys = ('id', 'save_path', 'status', 'segment_count', 'merged_by', 'error', 'done')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def has_unfinished(self):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT COUNT(*) FROM episodes WHERE status NOT IN ('completed', 'failed')").fetchone()
+        return row[0] > 0
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class _Transaction:
+    def __init__(self, coordinator):
+        self.coordinator = coordinator
+
+    def __enter__(self):
+        self.coordinator.lock.acquire()
+        try:
+            self.coordinator.db.execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.coordinator.lock.release()
+            raise
+        return self.coordinator.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.coordinator.db.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.coordinator.lock.release()
+        return False
+
+
+class ClusterNode:
+    """从协调后端认领分片并下载的节点"""
+    def __init__(self, downloader, coordinator, node_id=None, batch_size=None, lease=300, max_attempts=5):
+        self.downloader = downloader
+        self.console = downloader.console
+        self.coordinator = coordinator
+        self.node_id = node_id or default_node_id()
+        self.batch_size = batch_size or downloader.max_workers  # 每次认领的分片数
+        self.lease = lease  # 分片租约（秒）
+        self.max_attempts = max_attempts  # 单个分片在所有节点上的最大失败次数
+
+    def run(self, stop_event, wait=False, idle_interval=2):
+        """处理队列直到没有未完成的剧集；wait 为 True 时持续等待新剧集"""
+        while not stop_event.is_set():
+            episode = self.coordinator.next_episode()
+            if episode is not None:
+                self.work_episode(episode, stop_event)
+                continue
+            if not wait and not self.coordinator.has_unfinished():
+                break
+            # 其他节点仍在下载或合并，稍后再检查
+            stop_event.wait(idle_interval)
+
+    def work_episode(self, episode, stop_event):
+        """为一集下载认领到的分片，所有分片结束后尝试合并"""
+        from .downloader import SpeedMonitor
+
+        episode_id = episode['id']
+        if episode['segment_count'] is None:
+            if not self._register(episode):
+                return
+
+        save_path = episode['save_path']
+        temp_dir = f"{save_path}.downloading"
+        os.makedirs(temp_dir, exist_ok=True)
+        speed_monitor = SpeedMonitor()
+
+        def download(item):
+            index, url = item
+            ts_path = os.path.join(temp_dir, f"{index:05d}.ts")
+            size = self.downloader._fetch_segment_file(url, ts_path, stop_event.is_set, speed_monitor.add_bytes)
+            if size:
+                # 分片 fsync 之后才标记完成，合并节点不会读到还在页面缓存中的分片
+                self.downloader.disk_writer.after_sync(lambda: self._complete_segment(episode_id, index))
+                CLUSTER_SEGMENTS.inc()
+            elif size == 0:
+                self.coordinator.release_segment(episode_id, index, self.node_id, self.max_attempts)
+            # 被停止时不归还，租约到期后由其他节点接手
+
+        with TRACER.span('cluster_episode', episode=episode_id, node=self.node_id):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.downloader.max_workers) as executor:
+                while not stop_event.is_set():
+                    claimed = self.coordinator.claim_segments(episode_id, self.node_id, self.batch_size, self.lease)
+                    if not claimed:
+                        break
+                    list(executor.map(download, claimed))
+            # 等待已下载的分片 fsync 并标记完成
+            self.downloader.disk_writer.flush()
+
+            if not stop_event.is_set() and self.coordinator.claim_merge(episode_id, self.node_id, self.lease):
+                self._merge(episode)
+
+    def _complete_segment(self, episode_id, index):
+        """标记分片完成（在 fsync 线程中调用），失败时分片在租约到期后重新下载"""
+        try:
+            self.coordinator.complete_segment(episode_id, index, self.node_id)
+        except Exception as e:
+            self.console.print(f"[yellow]标记分片完成失败: {str(e)}[/yellow]")
+
+    def _register(self, episode):
+        """解析播放列表并登记分片地址"""
+        from urllib.parse import urljoin
+
+        try:
+            playlist, playlist_url, _ = self.downloader._resolve_playlist(episode['play_url'])
+        except Exception as e:
+            playlist, playlist_url = None, str(e)
+        if playlist is None or not playlist.segments:
+            self.coordinator.finish_episode(episode['id'], False, error='解析播放列表失败')
+            self.console.print(f"[yellow]解析播放列表失败: {episode['play_url']}[/yellow]")
+            return False
+        urls = [urljoin(playlist_url, segment.uri) for segment in playlist.segments]
+        self.coordinator.register_segments(episode['id'], playlist_url, urls)
+        episode['playlist_url'] = playlist_url
+        return True
+
+    def _merge(self, episode):
+        """合并共享存储上的分片，写入清单并清理临时目录"""
+        save_path = episode['save_path']
+        temp_dir = f"{save_path}.downloading"
+        urls = self.coordinator.segment_urls(episode['id'])
+        playlist_url = episode['playlist_url'] or episode['play_url']
+        # 合并期间定期续租，节点异常退出时其他节点在租约到期后重新合并；
+        # 续租失败说明合并已被其他节点接手，停止写入，不改名也不标记结果
+        merged = threading.Event()
+        lost = threading.Event()
+
+        def renew():
+            while not merged.wait(self.lease / 3):
+                try:
+                    renewed = self.coordinator.renew_merge(episode['id'], self.node_id, self.lease)
+                except Exception:
+                    continue  # 数据库暂时不可用时下次再续
+                if not renewed:
+                    lost.set()
+                    return
+        threading.Thread(target=renew, name='merge-lease', daemon=True).start()
+        try:
+            manifest = self.downloader._merge_segments(temp_dir, save_path, urls, playlist_url,
+                                                       should_stop=lost.is_set)
+        except MergeAborted:
+            CLUSTER_MERGES.inc('lost')
+            self.console.print(f"[yellow]{os.path.basename(save_path)} 的合并租约已失效，交给其他节点[/yellow]")
+            return
+        except Exception as e:
+            self.coordinator.finish_episode(episode['id'], False, error=f"合并失败: {e}")
+            CLUSTER_MERGES.inc('failed')
+            return
+        finally:
+            merged.set()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        missing = integrity.missing_segments(manifest) if manifest else None
+        if manifest is None or missing:
+            error = f"缺少 {len(missing)} 个分片" if missing else '合并结果为空'
+            self.coordinator.finish_episode(episode['id'], False, error=error)
+            CLUSTER_MERGES.inc('failed')
+            self.console.print(f"[yellow]{os.path.basename(save_path)} 合并失败: {error}[/yellow]")
+            return
+        self.coordinator.finish_episode(episode['id'], True)
+        CLUSTER_MERGES.inc('completed')
+        self.console.print(f"[green]已合并: {os.path.basename(save_path)}[/green]")
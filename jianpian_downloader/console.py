@@ -0,0 +1,14 @@
+"""共享的 rich 控制台
+
+控制台在第一次使用时才创建，导入包时不会加载 rich。
+"""
+_console = None
+
+
+def get_console():
+    """返回进程内共享的控制台"""
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console()
+    return _console
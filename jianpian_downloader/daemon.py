@@ -0,0 +1,453 @@
+"""常驻下载服务
+
+在一个长期运行的进程中持有 DownloadManager 和 MovieDownloader，
+复用连接池和元数据缓存，通过本地 HTTP/JSON 接口接收多个客户端提交的任务。
+仅监听本机地址或 Unix 套接字。网页中的脚本也能向本机地址发请求，所以 TCP 服务只接受 Host 为本机地址、
+没有 Origin 或 Origin 同样为本机地址的请求（防止 DNS 重绑定和跨站请求），POST 请求必须使用
+Content-Type: application/json（浏览器不经预检无法发送这种请求）。
+
+接口:
+    GET  /health                  健康检查
+    GET  /search?q=关键词          搜索视频
+    GET  /tasks                   列出所有任务
+    POST /tasks                   添加任务 {"url"|"keyword", "episodes", "pick", "output", "front"}
+    POST /tasks/<id>/pause        暂停任务
+    POST /tasks/<id>/resume       继续任务
+    POST /tasks/<id>/cancel       取消任务
+    POST /tasks/batch             批量操作 {"action": pause|resume|cancel|retry|prioritize, "task_ids"}
+    GET  /stats                   统计信息
+    GET  /events                  以 SSE 推送任务进度
+    GET  /metrics                 Prometheus 指标
+"""
+import os
+import re
+import json
+import time
+import socket
+import signal
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlsplit, parse_qs, unquote
+
+from rich.console import Console
+
+from . import metrics
+from .headless import build_backend, build_downloader, build_memory_budget
+from .manager import DownloadManager
+from .video import Video, parse_episode_ranges
+
+
+LOCAL_HOST = re.compile(r'^(localhost|127\.0\.0\.1|\[::1\])(:\d+)?$', re.I)
+
+
+class MetadataCache:
+    """剧集列表和影片信息的内存缓存（搜索结果由下载器的本地搜索索引缓存）"""
+    def __init__(self, downloader, ttl=600):
+        self.downloader = downloader
+        self.ttl = ttl  # 缓存有效期（秒）
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key, loader):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = loader()
+        # 空结果不缓存，下次重新获取
+        if value:
+            with self.lock:
+                self.entries[key] = (now, value)
+        return value
+
+    def movie_info(self, detail_url):
+        """获取影片信息"""
+        return self._get(('info', detail_url), lambda: self.downloader.get_movie_info(detail_url))
+
+    def video(self, title, detail_url):
+        """获取带剧集列表的 Video 对象，同一详情页共享同一个对象"""
+        def load():
+            video = Video(title, detail_url)
+            return video if video.get_episodes(self.downloader) else None
+        return self._get(('video', detail_url), load)
+
+    def stats(self):
+        """缓存统计"""
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class DownloadService:
+    """把下载管理器包装成可供 HTTP 接口调用的服务"""
+    def __init__(self, downloader, download_manager, default_output='downloads', cache_ttl=600):
+        self.downloader = downloader
+        self.download_manager = download_manager
+        self.default_output = default_output
+        self.cache = MetadataCache(downloader, ttl=cache_ttl)
+        self.started_at = time.time()
+
+    def warm_up(self):
+        """预先建立到站点的连接"""
+        try:
+            self.downloader.session.head(self.downloader.base_url, headers=self.downloader.headers, timeout=10)
+        except Exception:
+            pass
+
+    def search(self, keyword):
+        """搜索视频，已缓存的海报附带本地路径"""
+        posters = self.downloader.poster_cache
+        results = []
+        for v in self.downloader.search_cached(keyword):
+            result = {'title': v.title, 'detail_url': v.detail_url, 'poster': v.poster}
+            if posters is not None and v.poster:
+                result['poster_file'] = posters.path(urljoin(self.downloader.base_url + '/', v.poster))
+            results.append(result)
+        return results
+
+    def enqueue(self, spec):
+        """根据作业描述添加下载任务，返回 (结果, 错误信息)"""
+        url = spec.get('url')
+        keyword = spec.get('keyword')
+        if not url and not keyword:
+            return None, "缺少 url 或 keyword"
+
+        if url:
+            title = spec.get('title') or self.cache.movie_info(url).get('title') \
+                or url.rstrip('/').rsplit('/', 1)[-1]
+        else:
+            videos = self.downloader.search_cached(keyword, exact=True)
+            if not videos:
+                return None, f"未找到相关视频: {keyword}"
+            exact = [v for v in videos if v.title == keyword]
+            pick = int(spec.get('pick', 1))
+            if exact:
+                found = exact[0]
+            elif 1 <= pick <= len(videos):
+                found = videos[pick - 1]
+            else:
+                return None, f"搜索结果只有 {len(videos)} 个，无法选择第 {pick} 个"
+            title, url = found.title, found.detail_url
+
+        video = self.cache.video(title, url)
+        if not video:
+            return None, f"获取剧集列表失败: {title}"
+
+        episodes = str(spec.get('episodes', 'all')).strip().lower()
+        try:
+            if episodes in ('', 'all'):
+                indexes = list(range(len(video.episodes)))
+            else:
+                indexes = parse_episode_ranges(episodes, len(video.episodes))
+        except ValueError as e:
+            return None, str(e)
+
+        save_dir = os.path.abspath(os.path.expanduser(spec.get('output') or self.default_output))
+        added = self.download_manager.add_downloads(video, indexes, save_dir, self.downloader,
+                                                    front=bool(spec.get('front')))
+        new = set(added)
+        existing = [task_id for task_id in (self.download_manager.task_id(video, i) for i in dict.fromkeys(indexes))
+                    if task_id not in new]
+        return {'video': video.title, 'added': added, 'existing': existing}, None
+
+    def tasks(self):
+        """所有任务状态"""
+        return self.download_manager.get_status()
+
+    def control(self, task_id, action):
+        """暂停、继续或取消任务"""
+        if action == 'pause':
+            return self.download_manager.pause_task(task_id)
+        if action == 'resume':
+            return self.download_manager.resume_task(task_id, self.downloader)
+        if action == 'cancel':
+            return self.download_manager.cancel_task(task_id)
+        raise ValueError(f"未知操作: {action}")
+
+    def batch(self, spec):
+        """批量暂停、继续、取消、重试失败或提前任务，返回受影响的任务 ID 列表"""
+        action = spec.get('action')
+        task_ids = spec.get('task_ids')
+        if task_ids is not None and not isinstance(task_ids, list):
+            raise ValueError("task_ids 必须是列表")
+        if action == 'retry':
+            return self.download_manager.retry_failed(self.downloader, task_ids)
+        if task_ids is None:
+            raise ValueError("缺少 task_ids")
+        if action == 'pause':
+            return self.download_manager.pause_tasks(task_ids)
+        if action == 'resume':
+            return self.download_manager.resume_tasks(task_ids, self.downloader)
+        if action == 'cancel':
+            return self.download_manager.cancel_tasks(task_ids)
+        if action == 'prioritize':
+            return self.download_manager.prioritize(task_ids)
+        raise ValueError(f"未知操作: {action}")
+
+    def stats(self):
+        """统计信息"""
+        counts = {}
+        for info in self.download_manager.get_status().values():
+            counts[info['status']] = counts.get(info['status'], 0) + 1
+        stats = {
+            'uptime': round(time.time() - self.started_at, 1),
+            'tasks': counts,
+            'active': self.download_manager.get_active_count(),
+            'cache': self.cache.stats(),
+        }
+        if self.downloader.segment_cache is not None:
+            stats['segment_cache'] = self.downloader.segment_cache.stats()
+        stats['http_cache'] = self.downloader.http_cache.stats()
+        stats['hosts'] = self.downloader.host_health.stats()
+        stats['search_index'] = self.downloader.search_index.stats()
+        if self.downloader.poster_cache is not None:
+            stats['posters'] = self.downloader.poster_cache.stats()
+        if self.download_manager.memory_budget is not None:
+            stats['memory'] = self.download_manager.memory_budget.stats()
+        return stats
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """HTTP 请求处理"""
+    server_version = 'jianpian-dl'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def address_string(self):
+        # Unix 套接字没有客户端地址
+        if isinstance(self.client_address, tuple) and self.client_address:
+            return str(self.client_address[0])
+        return 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        data = json.loads(self.rfile.read(length).decode('utf-8'))
+        if not isinstance(data, dict):
+            raise ValueError("请求体必须是 JSON 对象")
+        return data
+
+    def _foreign_request(self):
+        """Host 或 Origin 不是本机地址时返回拒绝原因（Unix 套接字不检查）"""
+        if not self.server.check_host:
+            return None
+        if not LOCAL_HOST.match(self.headers.get('Host', '')):
+            return "Host 不是本机地址"
+        origin = self.headers.get('Origin')
+        if origin is not None:
+            parts = urlsplit(origin)
+            if parts.scheme not in ('http', 'https') or not LOCAL_HOST.match(parts.netloc):
+                return "不接受来自其他网站的请求"
+        return None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        reason = self._foreign_request()
+        if reason:
+            self._send_json({'error': reason}, 403)
+            return
+        try:
+            if url.path == '/health':
+                self._send_json({'status': 'ok'})
+            elif url.path == '/search':
+                keyword = query.get('q', [''])[0].strip()
+                if not keyword:
+                    self._send_json({'error': '缺少参数 q'}, 400)
+                    return
+                self._send_json({'results': self.service.search(keyword)})
+            elif url.path == '/tasks':
+                self._send_json({'tasks': self.service.tasks()})
+            elif url.path == '/stats':
+                self._send_json(self.service.stats())
+            elif url.path == '/metrics':
+                body = metrics.REGISTRY.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif url.path == '/events':
+                interval = float(query.get('interval', ['1'])[0])
+                self._stream_events(max(interval, 0.2))
+            else:
+                self._send_json({'error': '未找到'}, 404)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            self._send_json({'error': str(e)}, 500)
+
+    def do_POST(self):
+        parts = [unquote(p) for p in urlsplit(self.path).path.strip('/').split('/')]
+        reason = self._foreign_request()
+        if reason:
+            self._send_json({'error': reason}, 403)
+            return
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type != 'application/json':
+            self._send_json({'error': "请求必须使用 Content-Type: application/json"}, 415)
+            return
+        try:
+            if parts == ['tasks']:
+                result, error = self.service.enqueue(self._read_json())
+                if error:
+                    self._send_json({'error': error}, 400)
+                else:
+                    self._send_json(result, 201)
+            elif parts == ['tasks', 'batch']:
+                spec = self._read_json()
+                self._send_json({'action': spec.get('action'), 'task_ids': self.service.batch(spec)})
+            elif len(parts) == 3 and parts[0] == 'tasks' and parts[2] in ('pause', 'resume', 'cancel'):
+                if self.service.control(parts[1], parts[2]):
+                    self._send_json({'task_id': parts[1], 'action': parts[2], 'ok': True})
+                else:
+                    self._send_json({'task_id': parts[1], 'action': parts[2], 'ok': False}, 409)
+            else:
+                self._send_json({'error': '未找到'}, 404)
+        except ValueError as e:
+            self._send_json({'error': str(e)}, 400)
+        except Exception as e:
+            self._send_json({'error': str(e)}, 500)
+
+    def _stream_events(self, interval):
+        """以 Server-Sent Events 推送发生变化的任务状态"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        last_reported = {}
+        last_write = time.time()
+        while not self.server.stopping.is_set():
+            statuses = self.service.tasks()
+            for task_id, info in statuses.items():
+                snapshot = (info['status'], round(info['progress'], 1), info['speed'])
+                if last_reported.get(task_id) == snapshot:
+                    continue
+                last_reported[task_id] = snapshot
+                data = dict(info, task_id=task_id)
+                self.wfile.write(f"event: progress\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+                last_write = time.time()
+            # 定期发送注释行保持连接
+            if time.time() - last_write > 15:
+                self.wfile.write(b": keep-alive\n\n")
+                last_write = time.time()
+            self.wfile.flush()
+            self.server.stopping.wait(interval)
+
+
+class DaemonHTTPServer(ThreadingHTTPServer):
+    """监听 TCP 端口的服务"""
+    daemon_threads = True
+    check_host = True  # 只接受 Host 和 Origin 为本机地址的请求
+
+    def __init__(self, address, service, verbose=False):
+        if ':' in address[0]:
+            self.address_family = socket.AF_INET6
+        self.service = service
+        self.verbose = verbose
+        self.stopping = threading.Event()
+        super().__init__(address, DaemonRequestHandler)
+
+
+class DaemonUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """监听 Unix 套接字的服务"""
+    daemon_threads = True
+    check_host = False  # 浏览器无法访问 Unix 套接字，由文件权限限制访问
+
+    def __init__(self, path, service, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        self.stopping = threading.Event()
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, DaemonRequestHandler)
+        os.chmod(path, 0o600)
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        # BaseHTTPRequestHandler 需要这两个属性
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def parse_listen(listen):
+    """解析 host:port，只允许本机地址"""
+    host, _, port = listen.rpartition(':')
+    host = host.strip('[]') or '127.0.0.1'
+    if host not in ('127.0.0.1', 'localhost', '::1'):
+        raise ValueError(f"只允许监听本机地址: {host}")
+    return host, int(port)
+
+
+def run_daemon(args, console=None):
+    """启动常驻服务，直到收到退出信号"""
+    console = console or Console(stderr=True)
+
+    downloader = build_downloader(args, console)
+    memory_budget = build_memory_budget(args, downloader)
+    download_manager = DownloadManager(
+        store_path=args.task_store,
+        max_active_tasks=args.parallel,
+        console=console,
+        backend=build_backend(args),
+        memory_budget=memory_budget
+    )
+    downloader.set_download_manager(download_manager)
+
+    service = DownloadService(downloader, download_manager, default_output=args.output)
+    service.warm_up()
+
+    restored_count = download_manager.restore_tasks(downloader)
+    if restored_count > 0:
+        console.print(f"[green]已恢复 {restored_count} 个未完成的下载任务[/green]")
+    download_manager.start_auto_save()
+
+    if args.unix_socket:
+        server = DaemonUnixServer(args.unix_socket, service, verbose=args.verbose)
+        where = args.unix_socket
+    else:
+        host, port = parse_listen(args.listen)
+        server = DaemonHTTPServer((host, port), service, verbose=args.verbose)
+        where = f"http://{args.listen}"
+
+    def handle_signal(signum, frame):
+        server.stopping.set()
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    console.print(f"[green]下载服务已启动: {where}[/green]")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+        download_manager.stop()
+        console.print("[green]下载服务已停止，未完成的下载将在下次启动时继续[/green]")
+    return 0
@@ -0,0 +1,208 @@
+"""下载状态面板
+
+StatusDashboard 用 rich.live.Live 原地刷新任务状态表，数据来自 DownloadManager.snapshot()，
+渲染时不获取管理器的锁。只构建当前页的行，内容没有变化时不重绘；刷新间隔随任务数增加而变长，
+连续没有变化时逐步放慢，有变化时恢复。
+
+面板运行时可以输入命令后回车：n 下一页、p 上一页、a 只看进行中、f 只看失败、* 显示全部，
+直接回车退出。
+"""
+import threading
+import time
+from collections import deque
+
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+HISTORY_LENGTH = 30  # 速度曲线保留的采样数
+SAMPLE_INTERVAL = 1.0  # 速度采样间隔（秒）
+MIN_INTERVAL = 0.25  # 最短刷新间隔（秒）
+MAX_INTERVAL = 2.0  # 最长刷新间隔（秒）
+
+STATUS_LABELS = {
+    'pending': '[yellow]等待中[/yellow]',
+    'downloading': '[blue]下载中[/blue]',
+    'completed': '[green]已完成[/green]',
+    'failed': '[red]失败[/red]',
+    'paused': '[magenta]已暂停[/magenta]',
+    'cancelled': '[dim]已取消[/dim]',
+}
+
+FILTERS = {
+    'all': ('全部', lambda status: True),
+    'active': ('进行中', lambda status: status in ('pending', 'downloading')),
+    'failed': ('失败', lambda status: status == 'failed'),
+}
+
+COMMANDS = {'a': 'active', 'f': 'failed', '*': 'all'}
+
+
+def parse_speed(text):
+    """把 SpeedMonitor.format_speed 的文本转换为字节/秒，无法解析时返回 0"""
+    try:
+        for unit, scale in (('MB/s', 1024 * 1024), ('KB/s', 1024), ('B/s', 1)):
+            if text.endswith(unit):
+                return float(text[:-len(unit)]) * scale
+    except (ValueError, AttributeError):
+        pass
+    return 0.0
+
+
+def format_speed(speed):
+    if speed > 1024 * 1024:
+        return f"{speed / (1024 * 1024):.2f} MB/s"
+    if speed > 1024:
+        return f"{speed / 1024:.2f} KB/s"
+    return f"{speed:.2f} B/s"
+
+
+def sparkline(values):
+    """用方块字符画出数值变化趋势"""
+    if not values:
+        return ''
+    peak = max(values)
+    if peak <= 0:
+        return SPARK_CHARS[0] * len(values)
+    top = len(SPARK_CHARS) - 1
+    return ''.join(SPARK_CHARS[int(value / peak * top)] for value in values)
+
+
+class StatusDashboard:
+    """分页、可过滤的下载状态面板"""
+    def __init__(self, manager, console=None, page_size=20, task_filter='all'):
+        self.manager = manager
+        self.console = console or manager.console
+        self.page_size = page_size  # 每页显示的任务数
+        self.page = 0
+        self.task_filter = task_filter  # FILTERS 中的键
+        self.history = {}  # 任务 ID -> 最近的速度采样
+        self.total_history = deque(maxlen=HISTORY_LENGTH)
+        self.last_sample = 0
+
+    def sample(self, tasks):
+        """按采样间隔记录每个下载中任务和总的速度"""
+        now = time.monotonic()
+        if now - self.last_sample < SAMPLE_INTERVAL:
+            return
+        self.last_sample = now
+        total = 0.0
+        downloading = set()
+        for task_id, info in tasks:
+            if info['status'] != 'downloading':
+                continue
+            speed = parse_speed(info['speed'])
+            total += speed
+            downloading.add(task_id)
+            self.history.setdefault(task_id, deque(maxlen=HISTORY_LENGTH)).append(speed)
+        for task_id in [task_id for task_id in self.history if task_id not in downloading]:
+            del self.history[task_id]
+        self.total_history.append(total)
+
+    def visible(self, tasks):
+        """返回 (过滤后的任务数, 当前页的任务)，页码超出范围时调整到最后一页"""
+        accept = FILTERS[self.task_filter][1]
+        matched = [(task_id, info) for task_id, info in tasks if accept(info['status'])]
+        pages = max(1, (len(matched) + self.page_size - 1) // self.page_size)
+        self.page = min(max(self.page, 0), pages - 1)
+        start = self.page * self.page_size
+        return len(matched), matched[start:start + self.page_size]
+
+    def signature(self, tasks):
+        """当前页的显示内容摘要，没有变化时不需要重绘"""
+        count, rows = self.visible(tasks)
+        return (self.page, self.task_filter, count, len(tasks), tuple(self.total_history)[-1:],
+                tuple((task_id, info['status'], round(info['progress'], 1), info['speed'])
+                      for task_id, info in rows))
+
+    def render(self, tasks=None):
+        """构建当前页的面板"""
+        from rich import box
+        from rich.console import Group
+        from rich.table import Table
+
+        if tasks is None:
+            tasks = self.manager.snapshot()
+        count, rows = self.visible(tasks)
+        pages = max(1, (count + self.page_size - 1) // self.page_size)
+
+        table = Table(show_header=True, header_style="bold magenta", box=box.ROUNDED)
+        table.add_column("序号", style="cyan", width=6)
+        table.add_column("视频", style="white")
+        table.add_column("剧集", style="white")
+        table.add_column("状态", style="white")
+        table.add_column("进度", style="white")
+        table.add_column("速度", style="white")
+        table.add_column("趋势", style="blue", no_wrap=True)
+
+        offset = self.page * self.page_size
+        for i, (task_id, info) in enumerate(rows, offset + 1):
+            status = info['status']
+            progress = "100%" if status == 'completed' else \
+                       "0%" if status in ('pending', 'failed') else f"{info['progress']:.1f}%"
+            table.add_row(str(i), info['video'], info['episode'], STATUS_LABELS.get(status, status),
+                          progress, info['speed'], sparkline(self.history.get(task_id, ())))
+
+        counts = {}
+        for _, info in tasks:
+            counts[info['status']] = counts.get(info['status'], 0) + 1
+        summary = '  '.join(f"{STATUS_LABELS.get(status, status)} {n}" for status, n in counts.items())
+        total = self.total_history[-1] if self.total_history else 0.0
+        title = (f"[bold blue]下载任务状态[/bold blue]  筛选: {FILTERS[self.task_filter][0]}  "
+                 f"第 {self.page + 1}/{pages} 页  共 {count} 个")
+        footer = (f"{summary or '[yellow]暂无下载任务[/yellow]'}\n"
+                  f"[bold blue]当前下载速度: {format_speed(total)}[/bold blue] {sparkline(list(self.total_history))}")
+        return Group(title, table, footer)
+
+    def handle_command(self, command):
+        """处理翻页和过滤命令，无法识别时返回 False"""
+        command = command.strip().lower()
+        if command == 'n':
+            self.page += 1
+        elif command == 'p':
+            self.page -= 1
+        elif command in COMMANDS:
+            self.task_filter = COMMANDS[command]
+            self.page = 0
+        else:
+            return False
+        return True
+
+    def refresh_interval(self, task_count):
+        """任务越多，基础刷新间隔越长"""
+        return min(MAX_INTERVAL, MIN_INTERVAL * (1 + task_count / 200))
+
+    def run(self):
+        """显示面板直到用户直接回车"""
+        from rich.live import Live
+
+        stop = threading.Event()
+        wake = threading.Event()
+
+        with Live(self.render(), console=self.console, auto_refresh=False, transient=True) as live:
+            def refresh_loop():
+                last = None
+                interval = MIN_INTERVAL
+                while not stop.is_set():
+                    tasks = self.manager.snapshot()
+                    self.sample(tasks)
+                    current = self.signature(tasks)
+                    if current != last:
+                        live.update(self.render(tasks), refresh=True)
+                        last = current
+                        interval = self.refresh_interval(len(tasks))
+                    else:
+                        interval = min(interval * 2, MAX_INTERVAL)
+                    wake.wait(interval)
+                    wake.clear()
+
+            thread = threading.Thread(target=refresh_loop, daemon=True)
+            thread.start()
+            try:
+                while True:
+                    command = input()
+                    if not command.strip():
+                        break
+                    self.handle_command(command)
+                    wake.set()
+            finally:
+                stop.set()
+                wake.set()
+                thread.join()
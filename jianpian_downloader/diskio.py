@@ -0,0 +1,363 @@
+"""磁盘写入调度
+
+几十个下载线程各自用带缓冲的文件对象写分片、每完成一个分片再打开一次 progress.txt 追加一行时，
+多集同时下载会产生大量交错的小块写入；写入机械硬盘或 NAS 时磁头在各个文件之间来回移动，吞吐量很低。
+
+DiskWriter 是所有下载共用的写入线程：
+- 下载线程把数据写入 SegmentSink，凑满 coalesce_size（默认 1MB）后交给写入线程一次写入，
+  磁盘上看到的是逐个文件的大块顺序写入；
+- 写完的分片文件不立即 fsync，每 fsync_every 个分片或每 fsync_interval 秒统一 fsync 一次，
+  之后才把这些分片记入 ProgressLog（progress.txt），断电后进度文件中的分片一定完整；
+- 合并输出可以使用 O_DIRECT（DirectFile），数据经页对齐的缓冲区按整块直接写入磁盘，
+  几 GB 的输出不再挤占页面缓存。
+
+fsync_every 为 0 时不调用 fsync，进度在分片写完后立即记录。
+"""
+import os
+import mmap
+import time
+import queue
+import threading
+
+from . import metrics
+
+DISK_WRITES = metrics.REGISTRY.counter('jianpian_disk_writes_total', '写入线程执行的写操作数')
+DISK_WRITE_BYTES = metrics.REGISTRY.counter('jianpian_disk_write_bytes_total', '写入线程写入的字节数')
+FSYNC_SECONDS = metrics.REGISTRY.histogram(
+    'jianpian_fsync_batch_seconds', '批量 fsync 的耗时', buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+
+COALESCE_SIZE = 1024 * 1024  # 合并小块写入的大小
+FSYNC_EVERY = 32  # 每写完多少个分片 fsync 一次
+FSYNC_INTERVAL = 5.0  # 最长多少秒 fsync 一次
+DIRECT_ALIGN = 4096  # O_DIRECT 要求的偏移和长度对齐
+DIRECT_BUFFER_SIZE = 4 * 1024 * 1024  # O_DIRECT 写入缓冲区大小（DIRECT_ALIGN 的整数倍）
+
+
+class _Job:
+    __slots__ = ('func', 'done', 'error')
+
+    def __init__(self, func):
+        self.func = func
+        self.done = threading.Event()
+        self.error = None
+
+
+class DiskWriter:
+    """所有下载共用的写入线程"""
+    def __init__(self, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL, direct=False,
+                 coalesce_size=COALESCE_SIZE):
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.direct = direct  # 合并输出是否使用 O_DIRECT
+        self.coalesce_size = coalesce_size
+        self.jobs = queue.Queue()
+        self.syncs = queue.Queue()  # 等待 fsync 的批次，由 fsync 线程处理，写入线程不必等待
+        self.lock = threading.Lock()
+        self.threads = []
+        self.unsynced = []  # 写完还没有 fsync 的分片文件描述符（只在写入线程中访问）
+        self.callbacks = []  # fsync 之后执行的回调（记录进度）
+        self.last_sync = time.monotonic()
+
+    def _start(self):
+        with self.lock:
+            if not self.threads:
+                for target, name in ((self._run, 'disk-writer'), (self._run_sync, 'disk-sync')):
+                    thread = threading.Thread(target=target, name=name, daemon=True)
+                    thread.start()
+                    self.threads.append(thread)
+
+    def submit(self, func):
+        """在写入线程中执行 func 并等待完成，异常在调用方重新抛出"""
+        self._start()
+        job = _Job(func)
+        self.jobs.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job
+
+    def _run(self):
+        while True:
+            timeout = None
+            if self.unsynced or self.callbacks:
+                timeout = max(0.0, self.last_sync + self.fsync_interval - time.monotonic())
+            try:
+                job = self.jobs.get(timeout=timeout)
+            except queue.Empty:
+                self._sync()
+                continue
+            try:
+                job.func()
+            except BaseException as e:
+                job.error = e
+            job.done.set()
+            if len(self.unsynced) >= max(self.fsync_every, 1):
+                self._sync()
+
+    def _sync(self, done=None):
+        """把积攒的分片文件和进度回调交给 fsync 线程（只在写入线程中调用）"""
+        batch = (self.unsynced, self.callbacks, done)
+        self.unsynced, self.callbacks = [], []
+        self.last_sync = time.monotonic()
+        self.syncs.put(batch)
+
+    def _run_sync(self):
+        while True:
+            self._sync_batch(*self.syncs.get())
+
+    def _sync_batch(self, fds, callbacks, done):
+        """fsync 一批分片文件，再执行这些分片的进度回调"""
+        start = time.monotonic()
+        for fd in fds:
+            try:
+                os.fsync(fd)
+            except OSError:
+                pass
+            os.close(fd)
+        if fds:
+            FSYNC_SECONDS.observe(time.monotonic() - start)
+        logs = set()
+        for callback in callbacks:
+            try:
+                logs.add(callback())
+            except OSError:
+                # 临时目录已被删除等情况，丢失的进度只会导致重新下载分片
+                pass
+        logs.discard(None)
+        for log in logs:
+            try:
+                log.sync()
+            except OSError:
+                pass
+        if done is not None:
+            done.set()
+
+    def _park(self, fd):
+        """分片写完：需要 fsync 时保留描述符等待批量 fsync，否则直接关闭"""
+        if self.fsync_every > 0:
+            self.unsynced.append(fd)
+        else:
+            os.close(fd)
+
+    def after_sync(self, callback):
+        """之前写完的分片 fsync 之后执行 callback（返回需要 fsync 的 ProgressLog）"""
+        def defer():
+            if self.fsync_every > 0:
+                self.callbacks.append(callback)
+            else:
+                log = callback()
+                if log is not None:
+                    log.sync()
+        self.submit(defer)
+
+    def flush(self):
+        """立即 fsync 所有写完的分片并记录进度，等待完成"""
+        done = threading.Event()
+        self.submit(lambda: self._sync(done))
+        done.wait()
+
+    def open(self, path):
+        """打开分片文件，返回 SegmentSink"""
+        return SegmentSink(self, path)
+
+    def open_output(self, path, console=None):
+        """打开合并输出文件；设置了 direct 时使用 O_DIRECT，文件系统不支持时改用普通文件"""
+        if self.direct:
+            try:
+                return DirectFile(path)
+            except (OSError, AttributeError) as e:
+                self.direct = False
+                if console is not None:
+                    console.print(f"[yellow]无法使用 O_DIRECT 写入（{str(e)}），改用普通写入[/yellow]")
+        return open(path, 'wb')
+
+    def sync_path(self, path):
+        """fsync 已关闭的输出文件（fsync_every 为 0 时跳过）"""
+        if self.fsync_every <= 0:
+            return
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class SegmentSink:
+    """分片文件的写入端：合并小块写入，满 coalesce_size 后交给写入线程"""
+    def __init__(self, writer, path):
+        self.writer = writer
+        self.path = path
+        self.buffer = bytearray()
+        self.fd = None
+        self.size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write(self, data):
+        if not self.buffer and len(data) >= self.writer.coalesce_size:
+            # 足够大的块不再复制，写入线程写完之前调用方不会改动 data
+            self._write_block(data)
+            return len(data)
+        self.buffer += data
+        if len(self.buffer) >= self.writer.coalesce_size:
+            self._write_buffer()
+        return len(data)
+
+    def _write_buffer(self):
+        block, self.buffer = self.buffer, bytearray()
+        self._write_block(block)
+
+    def _write_block(self, block):
+        def write():
+            if self.fd is None:
+                self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+            view = memoryview(block)
+            while view:
+                written = os.write(self.fd, view)
+                view = view[written:]
+            DISK_WRITES.inc()
+            DISK_WRITE_BYTES.inc(amount=len(block))
+        self.writer.submit(write)
+        self.size += len(block)
+
+    def close(self):
+        """写入剩余数据，文件交给写入线程等待批量 fsync"""
+        if self.buffer or self.fd is None:
+            self._write_buffer()
+
+        def park():
+            fd, self.fd = self.fd, None
+            self.writer._park(fd)
+        self.writer.submit(park)
+
+    def discard(self):
+        """放弃写入（出错时），已写入的部分保留，由调用方删除"""
+        self.buffer = bytearray()
+
+        def close():
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+        self.writer.submit(close)
+
+
+class ProgressLog:
+    """一集的进度文件，分片 fsync 之后才追加记录"""
+    def __init__(self, writer, path):
+        self.writer = writer
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        self.dirty = False
+        self.closed = False
+
+    def add(self, index):
+        def append():
+            with self.lock:
+                if self.closed:
+                    # 停止下载后仍在进行的分片写完时，直接追加到进度文件
+                    with open(self.path, 'a') as f:
+                        f.write(f"{index}\n")
+                    return None
+                if self.file is None:
+                    self.file = open(self.path, 'a')
+                self.file.write(f"{index}\n")
+                self.dirty = True
+                return self
+        self.writer.after_sync(append)
+
+    def sync(self):
+        """写回进度文件"""
+        with self.lock:
+            if self.file is not None and self.dirty:
+                self.file.flush()
+                if self.writer.fsync_every > 0:
+                    os.fsync(self.file.fileno())
+                self.dirty = False
+
+    def close(self):
+        """fsync 等待中的分片、写回进度并关闭文件"""
+        self.writer.flush()
+        with self.lock:
+            self.closed = True
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class DirectFile:
+    """以 O_DIRECT 顺序写入的文件：数据先放入页对齐的缓冲区，凑满整块后直接写入磁盘"""
+    def __init__(self, path, buffer_size=DIRECT_BUFFER_SIZE):
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DIRECT, 0o666)
+        self.memory = mmap.mmap(-1, buffer_size)  # 匿名映射按页对齐
+        self.view = memoryview(self.memory)
+        self.used = 0  # 缓冲区中还没有写入的字节数
+        self.position = 0  # 已写入磁盘的字节数
+        self.closed = False
+
+    def write(self, data):
+        data = memoryview(data).cast('B')
+        total = len(data)
+        while data:
+            size = min(len(data), len(self.view) - self.used)
+            self.view[self.used:self.used + size] = data[:size]
+            self.used += size
+            data = data[size:]
+            if self.used == len(self.view):
+                self._write_aligned()
+        return total
+
+    def _write_aligned(self):
+        size = self.used - self.used % DIRECT_ALIGN
+        if not size:
+            return
+        self._write_all(self.view[:size])
+        remainder = self.used - size
+        self.view[:remainder] = self.view[size:self.used]
+        self.used = remainder
+        self.position += size
+
+    def _write_all(self, view):
+        while view:
+            written = os.write(self.fd, view)
+            view = view[written:]
+
+    def tell(self):
+        return self.position + self.used
+
+    def flush(self):
+        """写入缓冲区中对齐的部分，不足一块的尾部留到后续写入或关闭时"""
+        self._write_aligned()
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        if self.closed:
+            return
+        self._write_aligned()
+        if self.used:
+            # 文件末尾不足一块，取消 O_DIRECT 后按普通方式写入
+            import fcntl
+            flags = fcntl.fcntl(self.fd, fcntl.F_GETFL)
+            fcntl.fcntl(self.fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+            self._write_all(self.view[:self.used])
+            self.position += self.used
+            self.used = 0
+        os.close(self.fd)
+        self.view.release()
+        self.memory.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
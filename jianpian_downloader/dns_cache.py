@@ -0,0 +1,222 @@
+"""进程内 DNS 缓存与 Happy Eyeballs 连接
+
+每集几十个下载线程各自建立连接时，都会对同一个 CDN 主机名调用一次 getaddrinfo。DNSCache 按
+(主机, 端口) 缓存解析结果，同一主机同时只解析一次（其他线程等待这次的结果），过期后重新解析，
+解析失败时在短时间内继续使用过期的结果。getaddrinfo 不返回记录的 TTL，缓存时间由 ttl 参数决定。
+
+建立连接时按 RFC 8305 的方式交替尝试 IPv6 和 IPv4 地址：先连接第一个地址，250ms 内没有结果时
+并行尝试下一个地址，最先成功的连接胜出。prefer 可以指定优先的地址族。
+
+DNSCachingAdapter 把以上逻辑接入 requests：连接池的连接类改为使用缓存的地址建立连接，
+缓存或并行连接失败时交回 urllib3 的默认流程，异常类型与原来一致。
+"""
+import errno
+import socket
+import threading
+import selectors
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from . import metrics
+
+DNS_LOOKUPS = metrics.REGISTRY.counter(
+    'jianpian_dns_lookups_total', 'DNS 缓存查询次数', ['result'])
+
+# 并行尝试下一个地址前的等待时间（RFC 8305 建议 250ms）
+CONNECTION_ATTEMPT_DELAY = 0.25
+_IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN, getattr(errno, 'WSAEWOULDBLOCK', -1)}
+
+
+def interleave(addresses, prefer='auto'):
+    """按地址族交替排列地址，prefer 为 ipv4 或 ipv6 时该地址族排在最前"""
+    if prefer == 'ipv4':
+        first = socket.AF_INET
+    elif prefer == 'ipv6':
+        first = socket.AF_INET6
+    elif addresses:
+        first = addresses[0][0]
+    else:
+        return []
+    primary = [a for a in addresses if a[0] == first]
+    secondary = [a for a in addresses if a[0] != first]
+    result = []
+    for i in range(max(len(primary), len(secondary))):
+        result.extend(group[i] for group in (primary, secondary) if i < len(group))
+    return result
+
+
+class DNSCache:
+    """按主机缓存 getaddrinfo 的结果"""
+    def __init__(self, ttl=300, stale_ttl=60, prefer='auto'):
+        self.ttl = ttl  # 解析结果的缓存时间（秒）
+        self.stale_ttl = stale_ttl  # 重新解析失败时继续使用过期结果的时间（秒）
+        self.prefer = prefer  # auto、ipv4 或 ipv6
+        self.lock = threading.Lock()
+        self.entries = {}  # (主机, 端口) -> (过期时间, 地址列表)
+        self.inflight = {}  # (主机, 端口) -> 正在解析时其他线程等待的 Event
+
+    def resolve(self, host, port):
+        """返回按连接顺序排列的 getaddrinfo 结果，解析失败时抛出 socket.gaierror"""
+        from urllib3.util.connection import allowed_gai_family
+
+        key = (host, port)
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    DNS_LOOKUPS.inc('hit')
+                    return entry[1]
+                waiting = self.inflight.get(key)
+                if waiting is None:
+                    done = self.inflight[key] = threading.Event()
+                    break
+            # 其他线程正在解析同一主机
+            waiting.wait(30)
+
+        try:
+            addresses = socket.getaddrinfo(host, port, allowed_gai_family(), socket.SOCK_STREAM)
+            addresses = interleave(addresses, self.prefer)
+            with self.lock:
+                self.entries[key] = (time.monotonic() + self.ttl, addresses)
+            DNS_LOOKUPS.inc('miss')
+            return addresses
+        except socket.gaierror:
+            if entry is not None:
+                with self.lock:
+                    self.entries[key] = (time.monotonic() + self.stale_ttl, entry[1])
+                DNS_LOOKUPS.inc('stale')
+                return entry[1]
+            DNS_LOOKUPS.inc('error')
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            done.set()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def happy_eyeballs_connect(addresses, timeout=None, source_address=None, socket_options=None,
+                           delay=CONNECTION_ATTEMPT_DELAY):
+    """依次（间隔 delay 秒并行）尝试连接各地址，返回最先连上的套接字
+
+    全部失败时抛出最后一个 OSError，超时抛出 socket.timeout。
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    remaining = list(addresses)
+    pending = {}
+    errors = []
+    selector = selectors.DefaultSelector()
+    next_attempt = time.monotonic()
+    try:
+        while remaining or pending:
+            now = time.monotonic()
+            if remaining and (not pending or now >= next_attempt):
+                family, socktype, proto, _, sockaddr = remaining.pop(0)
+                sock = None
+                try:
+                    sock = socket.socket(family, socktype, proto)
+                    for option in socket_options or ():
+                        sock.setsockopt(*option)
+                    if source_address:
+                        sock.bind(source_address)
+                    sock.setblocking(False)
+                    result = sock.connect_ex(sockaddr)
+                except OSError as e:
+                    if sock is not None:
+                        sock.close()
+                    errors.append(e)
+                    continue
+                if result == 0:
+                    pending[sock] = sockaddr
+                    return _finish(sock, pending, timeout)
+                if result not in _IN_PROGRESS:
+                    sock.close()
+                    errors.append(OSError(result, f"{errno.errorcode.get(result, result)} {sockaddr}"))
+                    continue
+                selector.register(sock, selectors.EVENT_WRITE)
+                pending[sock] = sockaddr
+                next_attempt = now + delay
+
+            wait = next_attempt - now if remaining else None
+            if deadline is not None:
+                left = deadline - now
+                if left <= 0:
+                    raise socket.timeout("timed out")
+                wait = left if wait is None else min(wait, left)
+            for key, _ in selector.select(wait):
+                sock = key.fileobj
+                selector.unregister(sock)
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error == 0:
+                    return _finish(sock, pending, timeout)
+                sockaddr = pending.pop(sock)
+                sock.close()
+                errors.append(OSError(error, f"{errno.errorcode.get(error, error)} {sockaddr}"))
+                # 失败时立即尝试下一个地址
+                next_attempt = time.monotonic()
+        if errors:
+            raise errors[-1]
+        raise OSError("没有可用的地址")
+    finally:
+        for sock in pending:
+            sock.close()
+        selector.close()
+
+
+def _finish(sock, pending, timeout):
+    """保留胜出的连接，其余连接在调用方的 finally 中关闭"""
+    del pending[sock]
+    sock.setblocking(True)
+    sock.settimeout(timeout)
+    return sock
+
+
+class _CachedResolveMixin:
+    """使用 DNSCache 和 Happy Eyeballs 建立连接"""
+    dns_cache = None
+
+    def _new_conn(self):
+        timeout = self.timeout if isinstance(self.timeout, (int, float)) else socket.getdefaulttimeout()
+        try:
+            addresses = self.dns_cache.resolve(self._dns_host, self.port)
+        except socket.gaierror:
+            # 交给 urllib3 重新解析并抛出 NameResolutionError
+            return super()._new_conn()
+        try:
+            return happy_eyeballs_connect(addresses, timeout, source_address=self.source_address,
+                                          socket_options=self.socket_options)
+        except socket.timeout as e:
+            raise ConnectTimeoutError(
+                self, f"Connection to {self.host} timed out. (connect timeout={timeout})") from e
+        except OSError as e:
+            raise NewConnectionError(self, f"Failed to establish a new connection: {e}") from e
+
+
+def pool_classes(dns_cache):
+    """返回使用指定 DNS 缓存的连接池类"""
+    http_connection = type('CachedHTTPConnection', (_CachedResolveMixin, HTTPConnection),
+                           {'dns_cache': dns_cache})
+    https_connection = type('CachedHTTPSConnection', (_CachedResolveMixin, HTTPSConnection),
+                            {'dns_cache': dns_cache})
+    return {
+        'http': type('CachedHTTPConnectionPool', (HTTPConnectionPool,), {'ConnectionCls': http_connection}),
+        'https': type('CachedHTTPSConnectionPool', (HTTPSConnectionPool,), {'ConnectionCls': https_connection}),
+    }
+
+
+class DNSCachingAdapter(HTTPAdapter):
+    """连接池使用 DNSCache 的 HTTPAdapter"""
+    def __init__(self, dns_cache, *args, **kwargs):
+        self.dns_cache = dns_cache
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = pool_classes(self.dns_cache)
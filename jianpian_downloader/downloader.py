@@ -0,0 +1,929 @@
+"""分片下载器
+
+MovieDownloader 负责搜索、解析播放列表、并发下载分片和合并输出；bs4、m3u8 和 rich
+的进度条只在用到时才导入，导入本模块不会创建控制台或修改进程资源限制。
+"""
+import os
+import re
+import time
+import shutil
+import threading
+import collections
+import concurrent.futures
+from contextlib import nullcontext
+from threading import Lock
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics, integrity, host_health
+from .console import get_console
+from .diskio import DiskWriter, ProgressLog
+from .dns_cache import DNSCache, DNSCachingAdapter
+from .host_health import HostHealth
+from .http_cache import ValidatorCache
+from .search_index import SEARCH_LOOKUPS, SearchIndex
+from .streaming import SegmentWriter, partial_path
+from .tracing import TRACER, profile_region
+from .video import Video
+
+# 分片读取缓冲区大小范围，读满时逐步放大
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+# 累计到该字节数后才更新一次速度统计
+PROGRESS_BATCH_BYTES = 1024 * 1024
+# 每集的分片并发数上限：HTTP/1.1 每个并发请求占一个连接，HTTP/2 多个请求复用连接
+MAX_SEGMENT_CONCURRENCY = 32
+HTTP2_MAX_SEGMENT_CONCURRENCY = 128
+# 边下边播时可以领先最早未完成分片的距离（分片并发数的倍数），以及失败分片的立即重试次数
+STREAM_LOOKAHEAD = 2
+STREAM_RETRIES = 2
+
+
+class TruncatedSegment(IOError):
+    """分片长度与 Content-Length 不符或为空"""
+
+
+# 每个下载线程复用一块读取缓冲区
+_read_buffers = threading.local()
+
+def _get_read_buffer():
+    """获取当前线程的读取缓冲区"""
+    buffer = getattr(_read_buffers, 'buffer', None)
+    if buffer is None:
+        buffer = _read_buffers.buffer = memoryview(bytearray(MAX_CHUNK_SIZE))
+    return buffer
+
+
+class SpeedMonitor:
+    def __init__(self):
+        self.downloaded_bytes = 0
+        self.start_time = time.time()
+        self.lock = Lock()
+        self.last_bytes = 0
+        self.last_time = time.time()
+        self.current_speed = 0
+        self.last_update = time.time()
+        metrics.track_speed_monitor(self)
+        
+    def add_bytes(self, bytes_count):
+        with self.lock:
+            current_time = time.time()
+            self.downloaded_bytes += bytes_count
+            
+            # 每0.5秒更新一次速度
+            if current_time - self.last_update >= 0.5:
+                time_diff = current_time - self.last_time
+                if time_diff > 0:
+                    bytes_diff = self.downloaded_bytes - self.last_bytes
+                    self.current_speed = bytes_diff / time_diff
+                    self.last_bytes = self.downloaded_bytes
+                    self.last_time = current_time
+                self.last_update = current_time
+            
+    def format_speed(self):
+        with self.lock:
+            if self.current_speed == 0:
+                return "-"
+            elif self.current_speed > 1024 * 1024:
+                return f"{self.current_speed / (1024 * 1024):.2f} MB/s"
+            elif self.current_speed > 1024:
+                return f"{self.current_speed / 1024:.2f} KB/s"
+            else:
+                return f"{self.current_speed:.2f} B/s"
+
+class MovieDownloader:
+    def __init__(self, max_workers=48, console=None, base_url="https://vodjp.com", segment_cache=None,
+                 http_cache=None, dns_cache=None, http2=False, host_health=None, disk_writer=None,
+                 search_index=None):
+        self.base_url = base_url.rstrip('/')  # 站点地址
+        self.headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        }
+        self.max_workers = max_workers  # 最大并行下载数
+        self.stop_flag = False  # 停止标志
+        self.console = console or get_console()  # 输出控制台（无界面模式下可替换）
+        self.output_lock = threading.Lock()  # 输出锁
+        self.download_manager = None  # 下载管理器引用
+        self.executor = None  # 线程池引用
+        # 进程内 DNS 缓存（dns_cache.DNSCache），ttl 为 0 时不缓存
+        self.dns_cache = dns_cache if dns_cache is not None else DNSCache()
+        self.prewarm_connections = 8  # 解析出播放列表地址后预先建立的连接数，0 表示不预热
+        self.http2 = http2  # https 请求是否使用 HTTP/2（需要 httpx[http2]），不支持的主机仍用 HTTP/1.1
+        self.session = self._create_session()  # 复用连接的会话
+        self.segment_cache = segment_cache  # 分片缓存（SegmentCache），None 表示不使用
+        # 页面和播放列表的验证信息（http_cache.ValidatorCache），用于条件请求
+        self.http_cache = http_cache if http_cache is not None else ValidatorCache()
+        self.live_options = None  # 直播录制参数（live.LiveOptions），None 表示不录制直播流
+        self.progress_callback = None  # 进度回调 callback(进度, 速度)，设置后代替下载管理器更新进度
+        # 各 CDN 主机的延迟、吞吐量和失败率（host_health.HostHealth），用于选择主机和设置并发数
+        self.host_health = host_health if host_health is not None else HostHealth()
+        # 分片和合并输出的写入线程（diskio.DiskWriter），负责合并小块写入和批量 fsync
+        self.disk_writer = disk_writer if disk_writer is not None else DiskWriter()
+        self.stream_mode = False  # 边下边播：按播放顺序下载，已完成的部分直接写入输出文件
+        self.remux = False  # 合并时是否把 TS 转封装为分片 MP4（remux.TSRemuxer）
+        self.buffer_pool = None  # 低内存模式的缓冲区池（lowmem.BufferPool），None 表示每个线程各用一块缓冲区
+        # 见过的视频标题和详情页信息（search_index.SearchIndex），search_cached 先从这里返回结果
+        self.search_index = search_index if search_index is not None else SearchIndex()
+        self.poster_cache = None  # 海报缓存（poster_cache.PosterCache），None 表示不下载海报
+        self.refreshing = set()  # 正在后台远程搜索的关键词
+        self.refresh_lock = threading.Lock()
+        
+    def _create_session(self):
+        """创建带连接池的会话，所有请求共享连接"""
+        session = requests.Session()
+        pool_size = max(self.max_workers, 10)
+        if self.dns_cache.ttl > 0:
+            adapter = DNSCachingAdapter(self.dns_cache, pool_connections=16, pool_maxsize=pool_size)
+        else:
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if self.http2:
+            try:
+                from .http2 import HTTP2Adapter
+                session.mount('https://', HTTP2Adapter(adapter, verify=session.verify))
+            except ImportError:
+                self.http2 = False
+                self.console.print("[yellow]未安装 httpx[http2]，继续使用 HTTP/1.1[/yellow]")
+        # 记录每个响应的主机和状态码
+        session.hooks['response'].append(metrics.record_response)
+        return session
+        
+    def prewarm(self, url, count=None):
+        """在后台预先建立到 url 所在主机的连接并放回连接池，不等待完成"""
+        count = self.prewarm_connections if count is None else count
+        count = min(count, max(self.max_workers, 10))
+        if count <= 0 or self.host_health.is_degraded(urlsplit(url).netloc):
+            return
+        adapter = self.session.get_adapter(url)
+        if hasattr(adapter, 'http1_adapter'):
+            # HTTP/2 的请求共用一个连接，只有改用 HTTP/1.1 的主机需要预热
+            adapter = adapter.http1_adapter(url)
+            if adapter is None:
+                return
+        
+        def connect():
+            try:
+                if hasattr(adapter, 'get_connection_with_tls_context'):
+                    request = requests.Request('GET', url).prepare()
+                    pool = adapter.get_connection_with_tls_context(request, verify=self.session.verify,
+                                                                   cert=self.session.cert)
+                else:
+                    pool = adapter.get_connection(url)
+                conn = pool._get_conn(timeout=1)
+            except Exception:
+                return
+            try:
+                if conn.sock is None:
+                    with TRACER.span('prewarm_connection', host=urlsplit(url).netloc):
+                        conn.connect()
+            except Exception:
+                conn.close()
+            finally:
+                pool._put_conn(conn)
+        
+        for _ in range(count):
+            threading.Thread(target=connect, name='prewarm', daemon=True).start()
+        
+    def fetch_text(self, url, timeout=10):
+        """获取页面或播放列表的文本，使用条件请求和压缩，HTTP 错误时抛出 HTTPError"""
+        return self.http_cache.fetch(self.session, url, self.headers, timeout=timeout)
+        
+    def set_download_manager(self, manager):
+        """设置下载管理器引用"""
+        self.download_manager = manager
+        
+    def print_progress(self, success_count, total_count, speed):
+        """打印下载进度"""
+        return
+        
+    def stop_download(self, signum=None, frame=None):
+        """停止下载"""
+        self.console.print("\n[yellow]正在停止所有下载...[/yellow]")
+        self.stop_flag = True
+        # 强制退出
+        os._exit(0)
+        
+    def search_cached(self, keyword, exact=False):
+        """先从本地搜索索引返回结果，同时在后台重新搜索并更新索引；索引中没有结果时等待远程搜索
+
+        exact 为 True 时索引中必须有标题与关键词完全相同的视频才直接返回，用于按标题自动选择视频。
+        """
+        videos = self.search_index.search(keyword)
+        if not videos or (exact and not any(v.title == keyword for v in videos)):
+            SEARCH_LOOKUPS.inc('remote')
+            return self.search_video(keyword)
+        SEARCH_LOOKUPS.inc('index')
+        self._prefetch_posters(videos)
+        if self.search_index.needs_refresh(keyword):
+            with self.refresh_lock:
+                if keyword in self.refreshing:
+                    return videos
+                self.refreshing.add(keyword)
+            threading.Thread(target=self._refresh_search, args=(keyword,), name='search-refresh',
+                             daemon=True).start()
+        return videos
+
+    def _refresh_search(self, keyword):
+        try:
+            self.search_video(keyword, quiet=True)
+        finally:
+            with self.refresh_lock:
+                self.refreshing.discard(keyword)
+
+    def _prefetch_posters(self, videos):
+        if self.poster_cache is not None:
+            self.poster_cache.prefetch([urljoin(self.base_url + '/', v.poster) for v in videos if v.poster])
+
+    def search_video(self, keyword, quiet=False):
+        """搜索视频,返回Video对象列表，结果同时加入本地搜索索引；quiet 为 True 时不显示进度和错误"""
+        from bs4 import BeautifulSoup
+        from rich.progress import Progress, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn
+        
+        videos = []
+        page = 1
+        completed = False
+        
+        with Progress(
+            TextColumn("[bold blue]{task.description}"),
+            BarColumn(),
+            TaskProgressColumn(),
+            TimeRemainingColumn(),
+            console=self.console,
+            disable=quiet
+        ) as progress:
+            search_task = progress.add_task(f"搜索: {keyword}", total=None)
+            
+            while True:
+                search_url = f"{self.base_url}/jpsearch/{keyword}----------{page}---.html"
+                try:
+                    progress.update(search_task, description=f"搜索第{page}页: {keyword}")
+                    with TRACER.span('search_page', category='metadata', keyword=keyword, page=page):
+                        text = self.fetch_text(search_url)
+                        
+                    soup = BeautifulSoup(text, 'html.parser')
+                    results = soup.find_all('li', class_='stui-vodlist__item')
+                    
+                    if not results:
+                        completed = True
+                        break
+                        
+                    for item in results:
+                        try:
+                            link_elem = item.find('a', class_='stui-vodlist__thumb')
+                            title = link_elem.get('title', '').strip()
+                            link = link_elem.get('href', '')
+                            poster = link_elem.get('data-original', '')  # 获取海报图片URL
+                            
+                            if link:
+                                link = self.base_url + link
+                                video = Video(title, link)
+                                video.poster = poster  # 保存海报URL
+                                videos.append(video)
+                        except Exception as e:
+                            if not quiet:
+                                self.console.print(f"[yellow]解析视频信息失败: {e}[/yellow]")
+                            continue
+                    
+                    page += 1
+                    
+                except requests.HTTPError as e:
+                    if not quiet:
+                        self.console.print(f"[red]搜索失败: HTTP {e.response.status_code}[/red]")
+                    break
+                except Exception as e:
+                    if not quiet:
+                        self.console.print(f"[red]搜索失败: {e}[/red]")
+                    break
+            
+        self.search_index.add_videos(videos)
+        if completed:
+            # 中途失败的搜索不算刷新过，下次仍会在后台重试
+            self.search_index.mark_refreshed(keyword)
+        self._prefetch_posters(videos)
+        return videos
+        
+    def get_play_urls(self, movie_url):
+        """获取电影播放链接"""
+        from bs4 import BeautifulSoup
+        
+        try:
+            self.console.print(f"正在获取播放地址: {movie_url}")
+            soup = BeautifulSoup(self.fetch_text(movie_url), 'html.parser')
+            
+            # 直接获取播放列表
+            play_list = soup.find('div', id='playlist1')
+            if not play_list:
+                self.console.print("[yellow]未找到播放列表[/yellow]")
+                return []
+            
+            episodes = []
+            links = play_list.find_all('a')
+            for link in links:
+                title = link.text.strip()
+                url = link.get('href', '')
+                if url:
+                    url = self.base_url + url
+                episodes.append({
+                    'title': title,
+                    'url': url
+                })
+            
+            return episodes
+            
+        except Exception as e:
+            self.console.print(f"[yellow]获取播放地址失败: {str(e)}[/yellow]")
+            return []
+    
+    def download_movie(self, play_url, save_path, stop_event=None):
+        """下载视频，stop_event 被设置时停止当前任务（保留已下载的分片）"""
+        with TRACER.span('download_movie', save_path=save_path):
+            return self._download_movie(play_url, save_path, stop_event)
+
+    def _download_movie(self, play_url, save_path, stop_event):
+        temp_dir = None
+        writer = None
+
+        def should_stop():
+            return self.stop_flag or (stop_event is not None and stop_event.is_set())
+
+        try:
+            # 已有带清单的合并结果时先校验，只修复损坏的分片
+            existing = self._verify_existing(save_path, should_stop)
+            if existing is not None:
+                return existing
+
+            # 解析视频地址和分片列表
+            resolve_start = time.monotonic()
+            playlist, playlist_url, is_variant = self._resolve_playlist(play_url)
+            if playlist is None:
+                return False
+            metrics.PLAYLIST_SECONDS.observe(time.monotonic() - resolve_start)
+            
+            # 没有结束标记的播放列表是直播流
+            if not playlist.is_endlist:
+                if self.live_options is not None:
+                    from .live import LiveRecorder
+                    recorder = LiveRecorder(self, playlist_url, save_path, self.live_options,
+                                            should_stop, self._progress_reporter(save_path))
+                    return recorder.record()
+                if not is_variant:
+                    return False
+            
+            # 只保留分片地址，m3u8 的分片对象在下载期间不再占用内存
+            segments = [segment.uri for segment in playlist.segments]
+            playlist = None
+            if not segments:
+                return False
+
+            # 检查是否存在未完成的下载
+            temp_dir = f"{save_path}.downloading"
+            progress_file = os.path.join(temp_dir, "progress.txt")
+            downloaded_segments = set()
+            
+            # 如果存在临时目录，说明是断点续传
+            if os.path.exists(temp_dir):
+                if os.path.exists(progress_file):
+                    with open(progress_file, 'r') as f:
+                        downloaded_segments = set(int(x.strip()) for x in f.readlines())
+                    self.console.print(f"[green]发现未完成的下载，已下载 {len(downloaded_segments)} 个分片[/green]")
+            else:
+                os.makedirs(temp_dir, exist_ok=True)
+
+            # 获取未下载的片段
+            remaining_segments = [(i, uri) for i, uri in enumerate(segments) if i not in downloaded_segments]
+            segment_urls = [urljoin(playlist_url, uri) for uri in segments]
+            
+            # 边下边播：按播放顺序下载，已连续完成的分片直接追加到输出文件
+            if self.stream_mode and remaining_segments:
+                writer = SegmentWriter(save_path, temp_dir, segment_urls, self.remux, console=self.console,
+                                       disk_writer=self.disk_writer)
+                for index in sorted(downloaded_segments):
+                    if os.path.exists(os.path.join(temp_dir, f"{index:05d}.ts")):
+                        writer.mark_done(index)
+            announced = False
+            
+            if remaining_segments:
+                success_count = len(downloaded_segments)
+                speed_monitor = SpeedMonitor()
+                total_segments = len(segments)
+                
+                report_progress = self._progress_reporter(save_path)
+
+                def update_progress():
+                    report_progress((success_count / total_segments) * 100, speed_monitor.format_speed())
+
+                progress = ProgressLog(self.disk_writer, progress_file)
+
+                # 本集分片失败的原因，下载结束后汇总输出
+                failures = collections.Counter()
+                failure_lock = threading.Lock()
+
+                def record_failure(netloc, reason):
+                    with failure_lock:
+                        failures[reason] += 1
+                    if self.host_health.record_failure(netloc, reason):
+                        self.console.print(f"[yellow]{netloc} 连续下载失败（{reason}），暂时降低优先级[/yellow]")
+
+                def download_segment(args):
+                    if should_stop():
+                        return None, False
+                    
+                    index, uri = args
+                    ts_path = os.path.join(temp_dir, f"{index:05d}.ts")
+                    if index in downloaded_segments and os.path.exists(ts_path):
+                        return index, True
+                    
+                    # 分片地址相对于所在的播放列表
+                    ts_url = urljoin(playlist_url, uri)
+                    host = urlsplit(ts_url).hostname or '-'
+                    netloc = urlsplit(ts_url).netloc
+                    segment_start = time.monotonic()
+                    metrics.ACTIVE_CONNECTIONS.inc()
+                    span = TRACER.span('segment', index=index, host=host)
+                    try:
+                        # 临时文件可能是缓存对象的硬链接，先删除再写入
+                        if os.path.exists(ts_path):
+                            os.remove(ts_path)
+                        
+                        with span:
+                            ts_response, cached_size = self._request_segment(ts_url, ts_path)
+                            if cached_size:
+                                progress.add(index)
+                                speed_monitor.add_bytes(cached_size)
+                                return index, True
+                            first_byte = time.monotonic() - segment_start
+                            ts_response.raise_for_status()
+                            
+                            # 数据经写入线程合并后写入，fsync 批量进行
+                            with self.disk_writer.open(ts_path) as f, profile_region('chunk_loop'):
+                                downloaded_size = self._stream_segment(
+                                    ts_response, f, should_stop, speed_monitor.add_bytes)
+                            if downloaded_size is None:
+                                return None, False
+                            # 长度与 Content-Length 不符说明分片被截断
+                            expected = ts_response.headers.get('Content-Length')
+                            encoding = ts_response.headers.get('Content-Encoding', 'identity').lower()
+                            if expected and encoding == 'identity' and downloaded_size != int(expected):
+                                downloaded_size = 0
+                            span.set(bytes=downloaded_size, status=ts_response.status_code)
+                        
+                        if downloaded_size > 0:
+                            # 分片 fsync 之后才记入进度文件
+                            progress.add(index)
+                            elapsed = time.monotonic() - segment_start
+                            self.host_health.record_success(netloc, first_byte, downloaded_size, elapsed)
+                            metrics.SEGMENT_SECONDS.observe(elapsed, host)
+                            metrics.SEGMENT_BYTES.inc(host, amount=downloaded_size)
+                            if self.segment_cache is not None:
+                                self._store_cached_segment(ts_url, ts_path, ts_response)
+                            return index, True
+                        else:
+                            record_failure(netloc, 'truncated')
+                            metrics.SEGMENT_FAILURES.inc(host)
+                            if os.path.exists(ts_path):
+                                os.remove(ts_path)
+                            return index, False
+                            
+                    except Exception as e:
+                        record_failure(netloc, host_health.failure_reason(e))
+                        metrics.SEGMENT_FAILURES.inc(host)
+                        if os.path.exists(ts_path):
+                            os.remove(ts_path)
+                        return None, False
+                    finally:
+                        metrics.ACTIVE_CONNECTIONS.dec()
+
+                try:
+                    # 限制并发数，避免打开太多文件
+                    max_concurrent = self._segment_concurrency(urljoin(playlist_url, segments[0]))
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+                        if writer is not None:
+                            # 分片按需提交，不会有排队中的 future
+                            futures = []
+                            completed = self._in_playback_order(executor, remaining_segments, download_segment,
+                                                                max_concurrent, should_stop)
+                        else:
+                            futures = [executor.submit(download_segment, args) for args in remaining_segments]
+                            completed = concurrent.futures.as_completed(futures)
+                        for future in completed:
+                            if should_stop():
+                                for f in futures:
+                                    f.cancel()
+                                executor._threads.clear()
+                                concurrent.futures.thread._threads_queues.clear()
+                                raise KeyboardInterrupt()
+                            
+                            result = future.result()
+                            if result:
+                                index, success = result
+                                if success:
+                                    success_count += 1
+                                    update_progress()
+                                    if writer is not None and writer.mark_done(index) and not announced:
+                                        announced = True
+                                        self.console.print(f"[green]边下边播: 可以用播放器打开 "
+                                                           f"{partial_path(save_path)}，完成后改名为 "
+                                                           f"{os.path.basename(save_path)}[/green]")
+                except KeyboardInterrupt:
+                    return False
+                finally:
+                    progress.close()
+                    self.host_health.flush()
+                if failures:
+                    summary = '，'.join(f"{reason} {count}" for reason, count in failures.most_common())
+                    self.console.print(f"[yellow]{os.path.basename(save_path)} 有 {sum(failures.values())} 个分片"
+                                       f"下载失败: {summary}[/yellow]")
+
+            # 合并文件（所有分片在之前的运行中已下载完成时也需要合并）
+            manifest = self._merge_segments(temp_dir, save_path, segment_urls, playlist_url, writer)
+            
+            # 合并后删除临时目录
+            with TRACER.span('cleanup'):
+                if os.path.exists(temp_dir):
+                    shutil.rmtree(temp_dir)
+            if manifest is None:
+                return False
+            
+            # 缺少的分片记录在清单中，重试时只补下载这些分片
+            missing = integrity.missing_segments(manifest)
+            if missing:
+                self.console.print(f"[yellow]{os.path.basename(save_path)} 缺少 {len(missing)} 个分片，"
+                                   f"重试时将只补下载缺少的分片[/yellow]")
+                return False
+            return True
+                    
+        except Exception as e:
+            self.console.print(f"[red]下载失败: {str(e)}[/red]")
+            return False
+        finally:
+            self.stop_flag = False
+            if writer is not None:
+                writer.close()
+
+    def _in_playback_order(self, executor, segments, download_segment, concurrency, should_stop):
+        """按播放顺序提交分片下载，逐个返回完成的 future
+
+        只提交序号小于 最早未完成的分片 + STREAM_LOOKAHEAD 倍并发数 的分片，失败的分片优先重试
+        STREAM_RETRIES 次，避免后面已下载的内容都等待这一个分片。
+        """
+        lookahead = concurrency * STREAM_LOOKAHEAD
+        pending = collections.deque(segments)
+        retries = collections.deque()
+        attempts = collections.Counter()
+        order = [index for index, _ in segments]
+        settled = set()  # 已成功或放弃重试的分片
+        floor = 0  # order 中第一个未结束的分片的位置
+        running = {}
+        while pending or retries or running:
+            while len(running) < concurrency:
+                if retries:
+                    item = retries.popleft()
+                elif pending and (floor >= len(order) or pending[0][0] < order[floor] + lookahead):
+                    item = pending.popleft()
+                else:
+                    break
+                running[executor.submit(download_segment, item)] = item
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in sorted(done, key=lambda f: running[f][0]):
+                item = running.pop(future)
+                index = item[0]
+                _, success = future.result()
+                if not success and attempts[index] < STREAM_RETRIES and not should_stop():
+                    attempts[index] += 1
+                    retries.append(item)
+                else:
+                    settled.add(index)
+                    while floor < len(order) and order[floor] in settled:
+                        floor += 1
+                yield future
+
+    def _segment_concurrency(self, url):
+        """url 所在主机的分片并发数：使用 HTTP/2 时放宽上限，按主机的失败率缩小"""
+        adapter = self.session.get_adapter(url)
+        if hasattr(adapter, 'http1_adapter') and adapter.http1_adapter(url) is None:
+            limit = min(self.max_workers, HTTP2_MAX_SEGMENT_CONCURRENCY)
+        else:
+            limit = min(self.max_workers, MAX_SEGMENT_CONCURRENCY)
+        return self.host_health.concurrency(urlsplit(url).netloc, limit)
+
+    def _progress_reporter(self, save_path):
+        """返回更新对应任务进度和速度的函数"""
+        if self.progress_callback is not None:
+            return self.progress_callback
+        # 获取任务ID以更新状态
+        task_id = None
+        if self.download_manager:
+            for tid, info in self.download_manager.downloads.items():
+                if info.get('save_path') == save_path:
+                    task_id = tid
+                    break
+
+        def report(progress, speed):
+            if task_id and self.download_manager:
+                with self.download_manager.lock:
+                    task = self.download_manager.downloads.get(task_id)
+                    if task and task['status'] == 'downloading':
+                        task['progress'] = progress
+                        task['speed'] = speed
+        return report
+
+    def _request_segment(self, ts_url, ts_path, **kwargs):
+        """请求分片（stream=True），返回 (响应, 缓存命中时的大小)
+
+        使用分片缓存时带上缓存的验证信息，服务器确认分片没有变化时把缓存放入 ts_path 并关闭响应，
+        不读取正文；否则返回 (响应, None)，由调用方读取正文。
+        """
+        headers = self.headers
+        if self.segment_cache is not None:
+            try:
+                headers = self.segment_cache.request_headers(ts_url, headers)
+            except Exception:
+                pass
+        response = self.session.get(ts_url, headers=headers, stream=True, **kwargs)
+        if self.segment_cache is None:
+            return response, None
+        cached_size = self._fetch_cached_segment(ts_url, ts_path, response)
+        if cached_size:
+            response.close()
+            return response, cached_size
+        if response.status_code == 304:
+            # 缓存对象在确认之后被淘汰，重新完整请求
+            response.close()
+            response = self.session.get(ts_url, headers=self.headers, stream=True, **kwargs)
+        return response, None
+
+    def _fetch_cached_segment(self, ts_url, ts_path, response):
+        """response 确认分片没有变化时从分片缓存取出分片，返回大小，未命中或出错时返回 None"""
+        try:
+            with TRACER.span('segment_cache_fetch'):
+                return self.segment_cache.fetch(ts_url, ts_path, response)
+        except Exception:
+            return None
+        
+    def _store_cached_segment(self, ts_url, ts_path, response):
+        """把新下载的分片和响应的验证信息加入缓存，失败不影响下载"""
+        try:
+            with TRACER.span('segment_cache_store'):
+                self.segment_cache.store(ts_url, ts_path, response)
+        except Exception as e:
+            self.console.print(f"[yellow]写入分片缓存失败: {str(e)}[/yellow]")
+
+    def _fetch_segment_file(self, ts_url, ts_path, should_stop, on_bytes):
+        """下载单个分片到 ts_path（先查分片缓存），返回字节数，被停止时返回 None，失败时返回 0"""
+        host = urlsplit(ts_url).hostname or '-'
+        netloc = urlsplit(ts_url).netloc
+        segment_start = time.monotonic()
+        metrics.ACTIVE_CONNECTIONS.inc()
+        try:
+            if os.path.exists(ts_path):
+                os.remove(ts_path)
+            with TRACER.span('segment', host=host):
+                response, cached_size = self._request_segment(ts_url, ts_path, timeout=30)
+                if cached_size:
+                    on_bytes(cached_size)
+                    return cached_size
+                first_byte = time.monotonic() - segment_start
+                response.raise_for_status()
+                with self.disk_writer.open(ts_path) as f, profile_region('chunk_loop'):
+                    size = self._stream_segment(response, f, should_stop, on_bytes)
+            if size is None:
+                return None
+            expected = response.headers.get('Content-Length')
+            encoding = response.headers.get('Content-Encoding', 'identity').lower()
+            if size == 0 or (expected and encoding == 'identity' and size != int(expected)):
+                raise TruncatedSegment("分片不完整")
+            elapsed = time.monotonic() - segment_start
+            self.host_health.record_success(netloc, first_byte, size, elapsed)
+            metrics.SEGMENT_SECONDS.observe(elapsed, host)
+            metrics.SEGMENT_BYTES.inc(host, amount=size)
+            if self.segment_cache is not None:
+                self._store_cached_segment(ts_url, ts_path, response)
+            return size
+        except Exception as e:
+            reason = 'truncated' if isinstance(e, TruncatedSegment) else host_health.failure_reason(e)
+            self.host_health.record_failure(netloc, reason)
+            metrics.SEGMENT_FAILURES.inc(host)
+            if os.path.exists(ts_path):
+                os.remove(ts_path)
+            return 0
+        finally:
+            metrics.ACTIVE_CONNECTIONS.dec()
+
+    def _stream_segment(self, response, outfile, should_stop, on_bytes):
+        """把分片响应写入文件，返回写入的字节数，被停止时返回 None
+        
+        未压缩的响应直接 readinto 到线程复用的缓冲区（设置了 buffer_pool 时从池中借用），
+        读满时把单次读取量从 64KB 逐步放大到 1MB（不超过缓冲区大小）；速度统计按
+        PROGRESS_BATCH_BYTES 批量累计。
+        """
+        total = 0
+        pending = 0
+        encoding = response.headers.get('Content-Encoding', 'identity').lower()
+        
+        if encoding != 'identity' or not hasattr(response.raw, 'readinto'):
+            # 压缩的响应交给 requests 解码
+            for chunk in response.iter_content(chunk_size=MIN_CHUNK_SIZE):
+                if should_stop():
+                    return None
+                if chunk:
+                    outfile.write(chunk)
+                    total += len(chunk)
+                    pending += len(chunk)
+                    if pending >= PROGRESS_BATCH_BYTES:
+                        on_bytes(pending)
+                        pending = 0
+        else:
+            lease = self.buffer_pool.buffer() if self.buffer_pool is not None else nullcontext(_get_read_buffer())
+            with lease as buffer:
+                max_chunk = min(MAX_CHUNK_SIZE, len(buffer))
+                chunk_size = min(MIN_CHUNK_SIZE, max_chunk)
+                while True:
+                    if should_stop():
+                        return None
+                    read_size = response.raw.readinto(buffer[:chunk_size])
+                    if not read_size:
+                        break
+                    outfile.write(buffer[:read_size])
+                    total += read_size
+                    pending += read_size
+                    if read_size == chunk_size and chunk_size < max_chunk:
+                        chunk_size = min(chunk_size * 2, max_chunk)
+                    if pending >= PROGRESS_BATCH_BYTES:
+                        on_bytes(pending)
+                        pending = 0
+        
+        if pending:
+            on_bytes(pending)
+        return total
+
+    def _resolve_playlist(self, play_url):
+        """解析播放页和 m3u8 播放列表
+        
+        返回 (媒体播放列表, 播放列表地址, 是否来自主播放列表的子列表)，失败时播放列表为 None。
+        play_url 本身是 m3u8 地址时跳过播放页。
+        """
+        from bs4 import BeautifulSoup
+        from m3u8 import M3U8
+        
+        if urlsplit(play_url).path.endswith('.m3u8'):
+            video_url = play_url
+        else:
+            with TRACER.span('play_page', url=play_url):
+                text = self.fetch_text(play_url, timeout=30)
+            
+            with TRACER.span('extract_video_url'):
+                soup = BeautifulSoup(text, 'html.parser')
+                video_url = self._extract_video_url(soup)
+        
+        if not video_url:
+            return None, None, False
+        # 获取和解析播放列表的同时预先建立到视频主机的连接
+        self.prewarm(video_url)
+        
+        # 下载并解析主m3u8文件
+        with TRACER.span('master_playlist', url=video_url):
+            m3u8_obj = M3U8(self.fetch_text(video_url, timeout=30))
+        
+        # 没有子列表时本身就是媒体播放列表（点播或直播）
+        if m3u8_obj.is_endlist or not m3u8_obj.playlists:
+            if not m3u8_obj.segments:
+                return None, None, False
+            return m3u8_obj, video_url, False
+            
+        sub_m3u8_url = self._pick_variant(m3u8_obj.playlists, video_url)
+        
+        with TRACER.span('sub_playlist', url=sub_m3u8_url):
+            sub_m3u8_obj = M3U8(self.fetch_text(sub_m3u8_url, timeout=30))
+        return sub_m3u8_obj, sub_m3u8_url, True
+
+    def _merge_segments(self, temp_dir, save_path, segment_urls, playlist_url, writer=None, should_stop=None):
+        """按顺序合并分片并写入清单，返回清单；合并结果为空时删除并返回 None
+
+        设置了 remux 时转封装为分片 MP4，分片无法转封装时改为直接拼接 TS。边下边播模式下
+        writer 已经写入了连续完成的分片，这里只写入剩余部分。should_stop() 为 True 时抛出
+        streaming.MergeAborted，不改名也不写清单。
+        """
+        lease = self.buffer_pool.buffer() if self.buffer_pool is not None else nullcontext()
+        with TRACER.span('merge', segments=len(segment_urls)), metrics.MERGE_SECONDS.time(), lease as buffer:
+            if writer is None:
+                writer = SegmentWriter(save_path, temp_dir, segment_urls, self.remux, buffer, self.console,
+                                       self.disk_writer)
+            entries, total_size, container = writer.finish(should_stop)
+        
+        # 检查文件大小
+        if not any(entry['size'] for entry in entries):
+            os.remove(save_path)
+            return None
+        manifest = integrity.new_manifest(playlist_url, entries, container=container, total_size=total_size)
+        integrity.write_manifest(save_path, manifest)
+        return manifest
+
+    def _verify_existing(self, save_path, should_stop):
+        """校验已有的合并结果
+        
+        完好时返回 True，修复成功时返回 True，修复失败时返回 None 以便重新下载整集；
+        没有清单或存在未完成的临时目录时返回 None。清单功能加入之前下载完成的文件先补写清单。
+        """
+        integrity.adopt_output(save_path)
+        if (not os.path.exists(save_path) or os.path.exists(f"{save_path}.downloading")
+                or integrity.load_manifest(save_path) is None):
+            return None
+        ok, broken = integrity.verify_output(save_path)
+        if ok:
+            return True
+        self.console.print(f"[yellow]{os.path.basename(save_path)} 有 {len(broken)} 个分片损坏，开始修复[/yellow]")
+        if integrity.repair_output(self, save_path, [index for index, _ in broken], should_stop):
+            ok, _ = integrity.verify_output(save_path)
+            if ok:
+                return True
+        if should_stop():
+            return False
+        return None
+    
+    def _pick_variant(self, playlists, video_url):
+        """取第一个子列表；有相同码率和分辨率的冗余子列表时选择健康度最高的主机"""
+        first = playlists[0].stream_info
+        candidates = [urljoin(video_url, variant.uri) for variant in playlists
+                      if variant.stream_info.bandwidth == first.bandwidth
+                      and variant.stream_info.resolution == first.resolution]
+        if len(candidates) == 1:
+            return candidates[0]
+        by_host = {}
+        for url in candidates:
+            by_host.setdefault(urlsplit(url).netloc, url)
+        best = self.host_health.rank(list(by_host))[0]
+        if best != urlsplit(candidates[0]).netloc:
+            self.console.print(f"[green]使用冗余线路 {best}[/green]")
+        return by_host[best]
+
+    def _extract_video_url(self, soup):
+        """从播放页面取视频地址"""
+        try:
+            # 查找包含播放器配置的script标签
+            scripts = soup.find_all('script')
+            for script in scripts:
+                script_text = script.string
+                if script_text and 'player_aaaa' in script_text:
+                    # 使用正则表达式提取m3u8地址
+                    match = re.search(r'"url":"([^"]+)"', script_text)
+                    if match:
+                        m3u8_url = match.group(1)
+                        m3u8_url = m3u8_url.replace('\\/', '/')
+                        return m3u8_url
+                    
+        except Exception:
+            pass
+        return ''
+    
+    def get_movie_info(self, movie_url):
+        """获取影片详细信息"""
+        from bs4 import BeautifulSoup
+        
+        try:
+            soup = BeautifulSoup(self.fetch_text(movie_url), 'html.parser')
+            info = {}
+            
+            # 提取基本信息
+            title_elem = soup.find('h3', class_='title')
+            if title_elem:
+                try:
+                    title_parts = title_elem.text.split('span')
+                    if title_parts:
+                        info['title'] = title_parts[0].strip()
+                    score_elem = title_elem.find('span', class_='score')
+                    if score_elem:
+                        info['score'] = score_elem.text.strip()
+                except Exception:
+                    pass
+            
+            # 提取其他信息
+            data_elems = soup.find_all('p', class_='data')
+            for elem in data_elems:
+                try:
+                    text = elem.get_text(strip=True)
+                    if '类型：' in text and '地区：' in text:
+                        info['type'] = text.split('类型：')[1].split('地区：')[0].strip()
+                    if '地区：' in text and '年份：' in text:
+                        info['area'] = text.split('地区：')[1].split('年份：')[0].strip()
+                    if '年份：' in text:
+                        info['year'] = text.split('年份：')[1].strip()
+                    if '主演：' in text:
+                        info['actors'] = text.split('主演：')[1].strip()
+                    if '导演：' in text:
+                        info['director'] = text.split('导演：')[1].strip()
+                except Exception:
+                    continue
+            
+            # 提取简介
+            desc_elem = soup.find('div', class_='stui-content__desc')
+            if desc_elem:
+                info['description'] = desc_elem.text.strip()
+            
+            self.search_index.add_info(movie_url, info)
+            return info
+            
+        except Exception:
+            return {}
@@ -0,0 +1,621 @@
+"""无界面批处理模式
+
+适用于服务器等无人值守场景：通过命令行参数或任务文件描述下载作业，
+下载进度以 JSON Lines 格式输出到标准输出，提示信息输出到标准错误，
+并通过退出码反映执行结果。
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+from urllib.parse import urlsplit
+
+from . import metrics, tracing
+from .video import Video, parse_episode_ranges
+
+# 退出码
+EXIT_OK = 0  # 全部成功
+EXIT_FAILED = 1  # 存在失败的剧集或作业
+EXIT_USAGE = 2  # 参数或任务文件错误
+EXIT_NOT_FOUND = 3  # 没有任何可下载的剧集
+EXIT_INTERRUPTED = 130  # 被信号中断
+
+
+class JsonLinesEmitter:
+    """以 JSON Lines 格式输出事件"""
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        """输出一条事件记录"""
+        record = {'event': event, 'ts': round(time.time(), 3)}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    from . import __version__
+
+    parser = argparse.ArgumentParser(
+        prog='jianpian-dl',
+        description='一个优雅的视频下载工具（不带参数运行时进入交互界面）'
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('-k', '--keyword', help='搜索关键词')
+    source.add_argument('-u', '--url', help='视频详情页地址')
+    source.add_argument('-f', '--job-file', help='JSON 任务文件，可包含多个下载作业')
+    parser.add_argument('-e', '--episodes', default='all',
+                        help='剧集范围，例如 1-3,5,7-9（默认 all 表示全部）')
+    parser.add_argument('-p', '--pick', type=int, default=1,
+                        help='关键词搜索时使用第几个结果（默认 1，标题完全匹配的结果优先）')
+    parser.add_argument('-o', '--output', default='downloads', help='下载目录（默认 downloads）')
+    parser.add_argument('-w', '--workers', type=int, default=48, help='每集的分片并发数（默认 48）')
+    parser.add_argument('-j', '--parallel', type=int, default=2, help='同时下载的剧集数（默认 2）')
+    parser.add_argument('--backend', choices=('thread', 'process'), default='thread',
+                        help='下载后端：thread 在线程中下载，process 每集使用独立的工作进程（默认 thread）')
+    parser.add_argument('--task-store', default='headless_tasks.json',
+                        help='任务状态文件路径（默认 headless_tasks.json，与交互界面的 download_tasks.json 分开）')
+    parser.add_argument('--resume', action='store_true', help='同时恢复任务状态文件中未完成（包括已暂停）的任务')
+    parser.add_argument('--interval', type=float, default=1.0, help='进度输出间隔，单位秒（默认 1）')
+    parser.add_argument('--daemon', action='store_true', help='以常驻服务方式运行，通过本地 HTTP 接口接收任务')
+    parser.add_argument('--listen', default='127.0.0.1:8765', help='常驻服务监听地址（默认 127.0.0.1:8765）')
+    parser.add_argument('--unix-socket', help='常驻服务改为监听 Unix 套接字')
+    parser.add_argument('--verbose', action='store_true', help='常驻服务输出访问日志')
+    parser.add_argument('--metrics-port', type=int, help='在本机该端口提供 Prometheus /metrics 接口')
+    parser.add_argument('--metrics-textfile', help='定期把指标写入该文件（node_exporter textfile 格式）')
+    parser.add_argument('--segment-cache', help='分片缓存目录，可在多次运行和多个用户之间共享')
+    parser.add_argument('--segment-cache-size', default='10G', help='分片缓存大小上限，例如 500M、10G（默认 10G）')
+    parser.add_argument('--fsync-every', type=int, default=32,
+                        help='每写完多少个分片统一 fsync 一次，0 表示不调用 fsync（默认 32）')
+    parser.add_argument('--fsync-interval', type=float, default=5, help='最长多少秒统一 fsync 一次（默认 5）')
+    parser.add_argument('--direct-io', action='store_true',
+                        help='合并输出使用 O_DIRECT 绕过页面缓存，适合向机械硬盘或 NAS 写入大文件')
+    parser.add_argument('--http-cache', help='保存页面和播放列表验证信息的 SQLite 文件，用于跨运行的条件请求')
+    parser.add_argument('--search-index',
+                        help='保存见过的视频标题和详情页信息的 SQLite 文件，搜索时先从本地索引返回结果，同时在后台刷新')
+    parser.add_argument('--poster-cache', help='海报缓存目录，搜索结果中的海报在后台下载到该目录')
+    parser.add_argument('--poster-workers', type=int, default=4, help='同时下载的海报数（默认 4）')
+    parser.add_argument('--host-health', help='保存各 CDN 主机延迟、吞吐量和失败率的 SQLite 文件，用于跨运行选择主机和并发数')
+    parser.add_argument('--dns-ttl', type=float, default=300, help='DNS 解析结果的缓存时间，单位秒，0 表示不缓存（默认 300）')
+    parser.add_argument('--ip-family', choices=('auto', 'ipv4', 'ipv6'), default='auto',
+                        help='建立连接时优先使用的地址族（默认 auto，按系统解析顺序交替尝试）')
+    parser.add_argument('--memory-limit',
+                        help='低内存模式：常驻内存预算，例如 256M；等待中的任务不占用线程，已完成的任务移出内存')
+    parser.add_argument('--http2', action='store_true',
+                        help='https 请求使用 HTTP/2 复用连接（需要安装 httpx[http2]），不支持的主机自动改用 HTTP/1.1')
+    parser.add_argument('--stream', action='store_true',
+                        help='边下边播：按播放顺序下载，已完成的部分直接写入输出文件，下载开始几秒后即可用播放器打开')
+    parser.add_argument('--remux', action='store_true',
+                        help='合并时把 TS 分片转封装为 MP4（仅支持 H.264/AAC，其他编码仍输出 TS）')
+    parser.add_argument('--prewarm', type=int, default=8, help='解析出视频地址后预先建立的连接数，0 表示不预热（默认 8）')
+    parser.add_argument('--live', action='store_true',
+                        help='录制直播流：播放列表没有结束标记时持续轮询并追加新分片（-u 可直接指定 m3u8 地址）')
+    parser.add_argument('--live-duration', help='直播录制时长，例如 3600、90m、2h')
+    parser.add_argument('--live-until', help='直播录制停止时间，例如 23:30 或 2024-12-31T23:30')
+    parser.add_argument('--cluster', help='多节点协同下载：共享的 SQLite 协调文件路径（输出目录需位于共享存储）')
+    parser.add_argument('--node-id', help='协同下载的节点名称（默认 主机名-进程号）')
+    parser.add_argument('--cluster-wait', action='store_true', help='协同下载时队列为空也继续等待新剧集')
+    parser.add_argument('--subscribe', action='store_true',
+                        help='订阅 -k/-u/-f 指定的视频，之后由 --watch 自动下载新增的剧集')
+    parser.add_argument('--backfill', action='store_true', help='订阅时把已有的剧集也加入下载')
+    parser.add_argument('--unsubscribe', metavar='URL', help='取消订阅该详情页地址')
+    parser.add_argument('--list-subscriptions', action='store_true', help='列出所有订阅')
+    parser.add_argument('--watch', action='store_true', help='持续检查订阅的视频，发现新剧集时自动下载')
+    parser.add_argument('--watch-interval', default='1h', help='订阅检查间隔，例如 900、30m、1h（默认 1h）')
+    parser.add_argument('--subscriptions', default='subscriptions.json', help='订阅文件路径')
+    parser.add_argument('--verify', action='store_true',
+                        help='按清单校验下载目录（-o）中已合并的文件，不下载')
+    parser.add_argument('--repair', action='store_true',
+                        help='校验下载目录中已合并的文件，只重新下载损坏的分片并修补文件')
+    parser.add_argument('--trace', help='把各阶段耗时导出为 Chrome trace JSON 文件')
+    parser.add_argument('--profile', help='对分片读取循环采样分析，结果以 folded stacks 格式写入该文件')
+    parser.add_argument('--profile-interval', type=float, default=0.005, help='采样间隔，单位秒（默认 0.005）')
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    return parser
+
+
+def load_jobs(args):
+    """根据命令行参数或任务文件生成作业列表
+
+    任务文件格式为 JSON 数组，或包含 jobs 数组的对象，每个作业形如:
+    {"keyword": "片名", "episodes": "1-3,5", "pick": 1, "output": "downloads"}
+    或 {"url": "详情页地址", "episodes": "all"}，未指定的字段沿用命令行参数。
+    """
+    defaults = {
+        'episodes': args.episodes,
+        'pick': args.pick,
+        'output': args.output,
+    }
+
+    if args.job_file:
+        with open(args.job_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get('jobs')
+        if not isinstance(data, list) or not data:
+            raise ValueError("任务文件中没有作业")
+
+        jobs = []
+        for i, item in enumerate(data, 1):
+            if not isinstance(item, dict) or not (item.get('keyword') or item.get('url')):
+                raise ValueError(f"第 {i} 个作业缺少 keyword 或 url")
+            jobs.append({
+                'keyword': item.get('keyword'),
+                'url': item.get('url'),
+                'episodes': str(item.get('episodes', defaults['episodes'])),
+                'pick': int(item.get('pick', defaults['pick'])),
+                'output': item.get('output', defaults['output']),
+            })
+        return jobs
+
+    if args.keyword or args.url:
+        job = {'keyword': args.keyword, 'url': args.url}
+        job.update(defaults)
+        return [job]
+
+    raise ValueError("请指定 --keyword、--url 或 --job-file")
+
+
+def build_downloader(args, console):
+    """根据命令行参数创建下载器"""
+    segment_cache = None
+    if args.segment_cache:
+        from .segment_cache import SegmentCache, parse_size
+        segment_cache = SegmentCache(args.segment_cache, max_bytes=parse_size(args.segment_cache_size))
+    http_cache = None
+    if getattr(args, 'http_cache', None):
+        from .http_cache import ValidatorCache
+        http_cache = ValidatorCache(args.http_cache)
+    from .diskio import DiskWriter
+    from .dns_cache import DNSCache
+    from .downloader import MovieDownloader
+    from .host_health import HostHealth
+    from .search_index import SearchIndex
+
+    dns_cache = DNSCache(ttl=getattr(args, 'dns_ttl', 300), prefer=getattr(args, 'ip_family', 'auto'))
+    downloader = MovieDownloader(max_workers=args.workers, console=console, segment_cache=segment_cache,
+                                 http_cache=http_cache, dns_cache=dns_cache, http2=getattr(args, 'http2', False),
+                                 host_health=HostHealth(getattr(args, 'host_health', None)),
+                                 search_index=SearchIndex(getattr(args, 'search_index', None)),
+                                 disk_writer=DiskWriter(fsync_every=getattr(args, 'fsync_every', 32),
+                                                        fsync_interval=getattr(args, 'fsync_interval', 5),
+                                                        direct=getattr(args, 'direct_io', False)))
+    downloader.prewarm_connections = getattr(args, 'prewarm', 8)
+    downloader.remux = getattr(args, 'remux', False)
+    downloader.stream_mode = getattr(args, 'stream', False)
+    if getattr(args, 'poster_cache', None):
+        from .poster_cache import PosterCache
+        downloader.poster_cache = PosterCache(args.poster_cache, downloader.session, downloader.headers,
+                                              max_workers=max(getattr(args, 'poster_workers', 4), 1))
+    if getattr(args, 'live', False):
+        from .live import LiveOptions, parse_stop_time
+        downloader.live_options = LiveOptions(
+            duration=parse_duration(args.live_duration) if args.live_duration else None,
+            stop_at=parse_stop_time(args.live_until) if args.live_until else None,
+        )
+    return downloader
+
+
+def build_memory_budget(args, downloader):
+    """指定了 --memory-limit 时按预算调整下载器，返回 lowmem.MemoryBudget，否则返回 None"""
+    if not getattr(args, 'memory_limit', None):
+        return None
+    from .lowmem import MemoryBudget
+    from .segment_cache import parse_size
+    budget = MemoryBudget(parse_size(args.memory_limit))
+    budget.apply(downloader, args.parallel)
+    return budget
+
+
+def build_backend(args):
+    """根据命令行参数创建下载后端，线程后端返回 None"""
+    if getattr(args, 'backend', 'thread') == 'process':
+        from .workers import ProcessBackend
+        return ProcessBackend()
+    return None
+
+
+def parse_duration(text):
+    """解析 3600、90m、2h 这样的时长，返回秒数"""
+    text = str(text).strip().lower()
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def resolve_job(job, downloader):
+    """解析作业对应的视频和剧集索引，返回 (video, episode_indexes, error)"""
+    if job['url'] and urlsplit(job['url']).path.endswith('.m3u8'):
+        # 直接给出的播放列表地址（例如直播流）作为只有一集的视频
+        name = time.strftime('%Y%m%d-%H%M%S')
+        video = Video(urlsplit(job['url']).netloc or 'stream', job['url'])
+        video.episodes = [{'title': name, 'url': job['url']}]
+        return video, [0], None
+    if job['url']:
+        info = downloader.get_movie_info(job['url'])
+        title = info.get('title') or job['url'].rstrip('/').rsplit('/', 1)[-1]
+        video = Video(title, job['url'])
+    else:
+        videos = downloader.search_cached(job['keyword'], exact=True)
+        if not videos:
+            return None, [], f"未找到相关视频: {job['keyword']}"
+        exact = [v for v in videos if v.title == job['keyword']]
+        if exact:
+            video = exact[0]
+        elif 1 <= job['pick'] <= len(videos):
+            video = videos[job['pick'] - 1]
+        else:
+            return None, [], f"搜索结果只有 {len(videos)} 个，无法选择第 {job['pick']} 个"
+
+    if not video.get_episodes(downloader):
+        return video, [], f"获取剧集列表失败: {video.title}"
+
+    episodes = job['episodes'].strip().lower()
+    if episodes in ('', 'all'):
+        return video, list(range(len(video.episodes))), None
+    try:
+        return video, parse_episode_ranges(episodes, len(video.episodes)), None
+    except ValueError as e:
+        return video, [], str(e)
+
+
+def run_headless(argv):
+    """以无界面模式运行下载作业，返回退出码"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    emitter = JsonLinesEmitter()
+    from rich.console import Console
+    console = Console(stderr=True)
+
+    if args.workers < 1 or args.parallel < 1 or args.interval <= 0:
+        emitter.emit('error', message="--workers、--parallel 和 --interval 必须为正数")
+        return EXIT_USAGE
+
+    metrics_writer = None
+    try:
+        if args.metrics_port:
+            metrics.start_metrics_server(args.metrics_port)
+        if args.metrics_textfile:
+            metrics_writer = metrics.start_textfile_writer(args.metrics_textfile)
+    except OSError as e:
+        emitter.emit('error', message=f"启动指标输出失败: {e}")
+        return EXIT_USAGE
+
+    if args.trace:
+        tracing.TRACER.enable()
+    if args.profile:
+        tracing.enable_profiler(args.profile_interval)
+
+    try:
+        return _run(args, emitter, console)
+    finally:
+        _write_profiles(args, emitter)
+        if metrics_writer:
+            metrics_writer.set()
+            try:
+                metrics.REGISTRY.write_textfile(args.metrics_textfile)
+            except OSError:
+                pass
+
+
+def _write_profiles(args, emitter):
+    """写出追踪和采样分析结果"""
+    try:
+        if args.trace:
+            tracing.TRACER.export_chrome_trace(args.trace)
+        if args.profile and tracing.PROFILER is not None:
+            tracing.PROFILER.stop()
+            tracing.PROFILER.write_folded(args.profile)
+    except OSError as e:
+        emitter.emit('error', message=f"写入分析结果失败: {e}")
+
+
+def _run_verify(args, emitter, console):
+    """校验（并按需修复）下载目录中带清单的文件"""
+    from . import integrity
+
+    root = os.path.abspath(os.path.expanduser(args.output))
+    suffix = '.manifest.json'
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        paths.extend(os.path.join(dirpath, name[:-len(suffix)]) for name in filenames if name.endswith(suffix))
+    if not paths:
+        emitter.emit('error', message=f"{root} 中没有带清单的文件")
+        return EXIT_NOT_FOUND
+
+    downloader = build_downloader(args, console) if args.repair else None
+    broken_files = 0
+    for path in sorted(paths):
+        ok, broken = integrity.verify_output(path)
+        repaired = False
+        if not ok and downloader is not None and broken:
+            repaired = integrity.repair_output(downloader, path, [index for index, _ in broken])
+            if repaired:
+                ok, broken = integrity.verify_output(path)
+        if not ok:
+            broken_files += 1
+        emitter.emit('verify', path=path, ok=ok, repaired=repaired,
+                     broken=[{'segment': index, 'reason': reason} for index, reason in broken])
+
+    emitter.emit('summary', total=len(paths), broken=broken_files)
+    return EXIT_FAILED if broken_files else EXIT_OK
+
+
+def _run_cluster(args, emitter, console):
+    """把作业提交到共享队列，并作为一个节点参与下载"""
+    import sqlite3
+    from .cluster import SQLiteCoordinator, ClusterNode
+
+    try:
+        jobs = load_jobs(args) if (args.keyword or args.url or args.job_file) else []
+        downloader = build_downloader(args, console)
+        coordinator = SQLiteCoordinator(args.cluster)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        emitter.emit('error', message=str(e))
+        return EXIT_USAGE
+
+    interrupted = threading.Event()
+
+    def handle_signal(signum, frame):
+        interrupted.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    start_time = time.time()
+    job_errors = 0
+    for job_no, job in enumerate(jobs, 1):
+        video, episode_indexes, error = resolve_job(job, downloader)
+        if error:
+            job_errors += 1
+            emitter.emit('job_error', job=job_no, keyword=job['keyword'], url=job['url'], message=error)
+            continue
+        save_dir = os.path.abspath(os.path.expanduser(job['output']))
+        submitted = 0
+        for episode_index in episode_indexes:
+            save_path = video.get_episode_path(save_dir, episode_index)
+            if coordinator.submit(f"{video.title}_{episode_index}", video.episodes[episode_index]['url'], save_path):
+                submitted += 1
+        emitter.emit('job_resolved', job=job_no, video=video.title, detail_url=video.detail_url,
+                     episodes=len(episode_indexes), submitted=submitted, save_dir=save_dir)
+
+    node = ClusterNode(downloader, coordinator, node_id=args.node_id)
+    worker = threading.Thread(target=node.run, args=(interrupted, args.cluster_wait), daemon=True)
+    worker.start()
+    emitter.emit('node_started', node=node.node_id, cluster=coordinator.path)
+
+    # 定期输出共享队列中各剧集的进度
+    last_reported = {}
+    while worker.is_alive():
+        worker.join(args.interval)
+        for episode in coordinator.episodes():
+            snapshot = (episode['status'], episode['done'])
+            if last_reported.get(episode['id']) == snapshot:
+                continue
+            last_reported[episode['id']] = snapshot
+            emitter.emit('progress', task_id=episode['id'], status=episode['status'],
+                         segments=episode['segment_count'], done=episode['done'],
+                         merged_by=episode['merged_by'], error=episode['error'])
+
+    episodes = coordinator.episodes()
+    completed = sum(1 for e in episodes if e['status'] == 'completed')
+    failed = sum(1 for e in episodes if e['status'] == 'failed')
+    coordinator.close()
+    if interrupted.is_set():
+        emitter.emit('interrupted', total=len(episodes), completed=completed, failed=failed)
+        return EXIT_INTERRUPTED
+    emitter.emit('summary', total=len(episodes), completed=completed, failed=failed,
+                 job_errors=job_errors, elapsed=round(time.time() - start_time, 3))
+    if not episodes:
+        return EXIT_NOT_FOUND
+    if failed or job_errors:
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+def _run_subscriptions(args, emitter, console):
+    """管理订阅，--watch 时持续检查订阅并下载新剧集"""
+    from .manager import DownloadManager
+    from .subscriptions import SubscriptionStore, SubscriptionWatcher
+
+    try:
+        store = SubscriptionStore(args.subscriptions)
+        interval = parse_duration(args.watch_interval)
+        jobs = load_jobs(args) if args.subscribe else []
+        downloader = build_downloader(args, console)
+        memory_budget = build_memory_budget(args, downloader)
+    except (OSError, ValueError) as e:
+        emitter.emit('error', message=str(e))
+        return EXIT_USAGE
+
+    job_errors = 0
+    for job_no, job in enumerate(jobs, 1):
+        video, _, error = resolve_job(dict(job, episodes='all'), downloader)
+        if error:
+            job_errors += 1
+            emitter.emit('job_error', job=job_no, keyword=job['keyword'], url=job['url'], message=error)
+            continue
+        added = store.add(video, job['output'], backfill=args.backfill)
+        emitter.emit('subscribed', video=video.title, detail_url=video.detail_url,
+                     episodes=len(video.episodes), new=added)
+    if args.unsubscribe:
+        emitter.emit('unsubscribed', detail_url=args.unsubscribe, removed=store.remove(args.unsubscribe))
+    if jobs or args.unsubscribe:
+        store.save()
+    if args.list_subscriptions:
+        for url, sub in store.items():
+            emitter.emit('subscription', video=sub['title'], detail_url=url, episodes=len(sub['known']),
+                         output=sub['output'], last_checked=sub['last_checked'], error=sub['error'])
+    if not args.watch:
+        return EXIT_FAILED if job_errors else EXIT_OK
+
+    download_manager = DownloadManager(
+        store_path=args.task_store,
+        max_active_tasks=args.parallel,
+        console=console,
+        backend=build_backend(args),
+        memory_budget=memory_budget
+    )
+    downloader.set_download_manager(download_manager)
+    download_manager.restore_tasks(downloader)
+    download_manager.start_auto_save()
+
+    def on_new(video, indexes):
+        emitter.emit('new_episodes', video=video.title, detail_url=video.detail_url,
+                     episodes=[video.episodes[i]['title'] for i in indexes])
+
+    watcher = SubscriptionWatcher(downloader, download_manager, store, interval=interval, on_new=on_new)
+    interrupted = threading.Event()
+
+    def handle_signal(signum, frame):
+        interrupted.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    worker = threading.Thread(target=watcher.run, args=(interrupted,), daemon=True)
+    worker.start()
+    emitter.emit('watch_started', subscriptions=len(store.items()), interval=interval)
+
+    # 输出下载进度，直到被中断
+    last_reported = {}
+    while not interrupted.wait(args.interval):
+        for task_id, info in download_manager.get_status().items():
+            snapshot = (info['status'], round(info['progress'], 1))
+            if last_reported.get(task_id) == snapshot:
+                continue
+            last_reported[task_id] = snapshot
+            emitter.emit('progress', task_id=task_id, video=info['video'], episode=info['episode'],
+                         status=info['status'], progress=round(info['progress'], 1), speed=info['speed'])
+
+    downloader.stop_flag = True
+    worker.join(timeout=30)
+    download_manager.stop()
+    emitter.emit('interrupted', subscriptions=len(store.items()))
+    return EXIT_INTERRUPTED
+
+
+def _run(args, emitter, console):
+    """运行常驻服务或批处理作业"""
+    if args.daemon:
+        from .daemon import run_daemon
+        try:
+            return run_daemon(args, console=console)
+        except (OSError, ValueError) as e:
+            emitter.emit('error', message=str(e))
+            return EXIT_USAGE
+
+    if args.verify or args.repair:
+        return _run_verify(args, emitter, console)
+    if args.cluster:
+        return _run_cluster(args, emitter, console)
+    if args.subscribe or args.unsubscribe or args.list_subscriptions or args.watch:
+        return _run_subscriptions(args, emitter, console)
+
+    from .manager import DownloadManager
+
+    try:
+        jobs = load_jobs(args)
+        downloader = build_downloader(args, console)
+        memory_budget = build_memory_budget(args, downloader)
+    except (OSError, ValueError) as e:
+        emitter.emit('error', message=str(e))
+        return EXIT_USAGE
+
+    download_manager = DownloadManager(
+        store_path=args.task_store,
+        max_active_tasks=args.parallel,
+        console=console,
+        backend=build_backend(args),
+        memory_budget=memory_budget
+    )
+    downloader.set_download_manager(download_manager)
+
+    interrupted = threading.Event()
+
+    def handle_signal(signum, frame):
+        interrupted.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    start_time = time.time()
+    task_ids = []
+    job_errors = 0
+
+    if args.resume:
+        download_manager.restore_tasks(downloader)
+        with download_manager.lock:
+            task_ids.extend(download_manager.downloads.keys())
+            paused = [task_id for task_id, task in download_manager.downloads.items() if task['status'] == 'paused']
+        # 无界面模式下没有其他途径继续已暂停的任务，否则会一直等待它们
+        download_manager.resume_tasks(paused, downloader)
+    known = set(task_ids)
+
+    for job_no, job in enumerate(jobs, 1):
+        if interrupted.is_set():
+            break
+        video, episode_indexes, error = resolve_job(job, downloader)
+        if error:
+            job_errors += 1
+            emitter.emit('job_error', job=job_no, keyword=job['keyword'], url=job['url'], message=error)
+            continue
+
+        save_dir = os.path.abspath(os.path.expanduser(job['output']))
+        emitter.emit('job_resolved', job=job_no, video=video.title, detail_url=video.detail_url,
+                     episodes=len(episode_indexes), save_dir=save_dir)
+
+        pending = [i for i in episode_indexes if download_manager.task_id(video, i) not in known]
+        for task_id in download_manager.add_downloads(video, pending, save_dir, downloader):
+            known.add(task_id)
+            task_ids.append(task_id)
+
+    download_manager.start_auto_save()
+
+    # 轮询任务状态，状态或进度变化时输出事件
+    last_reported = {}
+    while task_ids:
+        statuses = download_manager.get_status()
+        for task_id in task_ids:
+            info = statuses.get(task_id)
+            if not info:
+                continue
+            snapshot = (info['status'], round(info['progress'], 1))
+            if last_reported.get(task_id) == snapshot:
+                continue
+            last_reported[task_id] = snapshot
+            emitter.emit('progress', task_id=task_id, video=info['video'], episode=info['episode'],
+                         status=info['status'], progress=round(info['progress'], 1), speed=info['speed'])
+
+        if download_manager.is_all_completed() or interrupted.wait(args.interval):
+            break
+
+    statuses = download_manager.get_status()
+    completed = sum(1 for t in task_ids if statuses.get(t, {}).get('status') == 'completed')
+    failed = sum(1 for t in task_ids if statuses.get(t, {}).get('status') == 'failed')
+
+    if interrupted.is_set():
+        downloader.stop_flag = True
+        download_manager.stop()
+        emitter.emit('interrupted', total=len(task_ids), completed=completed, failed=failed)
+        return EXIT_INTERRUPTED
+
+    download_manager.stop()
+    emitter.emit('summary', total=len(task_ids), completed=completed, failed=failed,
+                 job_errors=job_errors, elapsed=round(time.time() - start_time, 3))
+
+    if not task_ids:
+        return EXIT_NOT_FOUND
+    if failed or job_errors:
+        return EXIT_FAILED
+    return EXIT_OK
@@ -0,0 +1,231 @@
+"""CDN 主机健康度
+
+按主机统计分片请求的首字节延迟、单连接吞吐量和失败率（指数加权平均），所有任务共用一份，
+传入 path 时保存到 SQLite，下次运行时直接使用上次的结果。下载器用这些数据：
+- 主播放列表中有多个相同码率的冗余子列表（位于不同主机）时，选择得分最高的主机；
+- 按主机的失败率设置每集开始时的分片并发数，失败多的主机少开连接；
+- 连续失败的主机判定为降级，一段时间内不预热连接、不优先选用，再次降级时时长加倍。
+
+得分是按该主机平均分片大小估算的有效下载速度（字节/秒）：
+分片大小 / (首字节延迟 + 分片大小 / 吞吐量) × 成功率。
+"""
+import time
+import sqlite3
+import threading
+
+import requests
+
+from . import metrics
+
+HOST_SCORE = metrics.REGISTRY.gauge('jianpian_host_score', '主机的估算有效下载速度（字节/秒）', ['host'])
+HOST_DEGRADED = metrics.REGISTRY.counter('jianpian_host_degraded_total', '主机被判定为降级的次数', ['host'])
+SEGMENT_ERRORS = metrics.REGISTRY.counter(
+    'jianpian_segment_errors_total', '分片请求失败按主机和原因统计', ['host', 'reason'])
+
+ALPHA = 0.2  # 延迟、吞吐量和分片大小的平滑系数
+ERROR_ALPHA = 0.05  # 失败率的平滑系数，变化比延迟慢
+DEGRADE_FAILURES = 5  # 连续失败达到该次数时判定为降级
+DEGRADE_ERROR_RATE = 0.5  # 样本足够时失败率超过该值也判定为降级
+MIN_SAMPLES = 20  # 按失败率判定降级需要的最少样本数
+DEGRADE_SECONDS = 60  # 首次降级的时长（秒），之后每次加倍
+DEGRADE_MAX_SECONDS = 3600  # 降级时长上限（秒）
+STALE_SECONDS = 7 * 24 * 3600  # 超过该时间没有更新的记录不再使用
+MIN_WINDOW = 2  # 按健康度缩小后的最小分片并发数
+
+
+def failure_reason(error):
+    """把分片请求的异常归类为简短的原因"""
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return f'http_{error.response.status_code}'
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return 'connection'
+    if isinstance(error, OSError):
+        return 'io'
+    return 'other'
+
+
+class HostStats:
+    """单个主机的统计"""
+    __slots__ = ('latency', 'throughput', 'segment_size', 'error_rate', 'samples', 'failures',
+                 'degraded_until', 'degrade_count', 'updated_at', 'last_error')
+
+    def __init__(self, latency=None, throughput=None, segment_size=None, error_rate=0.0, samples=0,
+                 failures=0, degraded_until=0.0, degrade_count=0, updated_at=0.0, last_error=None):
+        self.latency = latency  # 首字节延迟（秒）
+        self.throughput = throughput  # 单连接吞吐量（字节/秒）
+        self.segment_size = segment_size  # 分片大小（字节）
+        self.error_rate = error_rate  # 失败率
+        self.samples = samples  # 请求次数
+        self.failures = failures  # 连续失败次数
+        self.degraded_until = degraded_until  # 降级结束时间（time.time()）
+        self.degrade_count = degrade_count  # 连续降级次数，决定下次降级的时长
+        self.updated_at = updated_at
+        self.last_error = last_error
+
+    def score(self):
+        """估算的有效下载速度（字节/秒），还没有成功的请求时返回 None"""
+        if self.throughput is None:
+            return None
+        size = self.segment_size or 1
+        seconds = (self.latency or 0.0) + size / max(self.throughput, 1.0)
+        return size / seconds * (1.0 - self.error_rate)
+
+    def as_dict(self, now):
+        return {
+            'latency': self.latency, 'throughput': self.throughput, 'segment_size': self.segment_size,
+            'error_rate': round(self.error_rate, 4), 'samples': self.samples, 'failures': self.failures,
+            'degraded': self.degraded_until > now, 'score': self.score(), 'last_error': self.last_error,
+        }
+
+
+def _ewma(old, value, alpha):
+    return value if old is None else old + alpha * (value - old)
+
+
+class HostHealth:
+    """各主机的健康度统计"""
+    COLUMNS = HostStats.__slots__
+
+    def __init__(self, path=None, flush_interval=10):
+        self.path = path  # SQLite 文件，None 表示只保存在内存中
+        self.flush_interval = flush_interval  # 写回 SQLite 的最短间隔（秒）
+        self.lock = threading.Lock()
+        self.hosts = {}  # 主机 -> HostStats
+        self.dirty = set()  # 还没有写回的主机
+        self.last_flush = time.monotonic()
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self.lock, self.db:
+                self.db.execute('PRAGMA journal_mode=WAL')
+                self.db.execute('CREATE TABLE IF NOT EXISTS hosts (host TEXT PRIMARY KEY, '
+                                + ', '.join(self.COLUMNS) + ')')
+                self._load()
+
+    def _load(self):
+        cutoff = time.time() - STALE_SECONDS
+        rows = self.db.execute(f"SELECT host, {', '.join(self.COLUMNS)} FROM hosts WHERE updated_at >= ?",
+                               (cutoff,))
+        for row in rows:
+            self.hosts[row[0]] = HostStats(*row[1:])
+
+    def _stats(self, host):
+        stats = self.hosts.get(host)
+        if stats is None:
+            stats = self.hosts[host] = HostStats()
+        return stats
+
+    def record_success(self, host, latency, size, seconds):
+        """记录一次成功的分片请求：首字节延迟、字节数和总耗时（秒）"""
+        with self.lock:
+            stats = self._stats(host)
+            stats.latency = _ewma(stats.latency, latency, ALPHA)
+            transfer = seconds - latency
+            if size > 0 and transfer > 0:
+                stats.throughput = _ewma(stats.throughput, size / transfer, ALPHA)
+            elif stats.throughput is None:
+                stats.throughput = float(size / max(seconds, 1e-3))
+            stats.segment_size = _ewma(stats.segment_size, size, ALPHA)
+            stats.error_rate = _ewma(stats.error_rate, 0.0, ERROR_ALPHA)
+            stats.samples += 1
+            stats.failures = 0
+            # 降级期间被迫使用时请求成功，说明主机已恢复
+            stats.degraded_until = 0.0
+            stats.degrade_count = 0
+            self._touch(host, stats)
+        score = stats.score()
+        if score is not None:
+            HOST_SCORE.set(score, host)
+
+    def record_failure(self, host, reason):
+        """记录一次失败的分片请求，返回该主机是否因此被判定为降级"""
+        SEGMENT_ERRORS.inc(host, reason)
+        now = time.time()
+        with self.lock:
+            stats = self._stats(host)
+            stats.error_rate = _ewma(stats.error_rate, 1.0, ERROR_ALPHA)
+            stats.samples += 1
+            stats.failures += 1
+            stats.last_error = reason
+            degrade = stats.degraded_until <= now and (
+                stats.failures >= DEGRADE_FAILURES
+                or (stats.samples >= MIN_SAMPLES and stats.error_rate > DEGRADE_ERROR_RATE))
+            if degrade:
+                duration = min(DEGRADE_SECONDS * 2 ** stats.degrade_count, DEGRADE_MAX_SECONDS)
+                stats.degraded_until = now + duration
+                stats.degrade_count += 1
+                stats.failures = 0
+            self._touch(host, stats)
+        if degrade:
+            HOST_DEGRADED.inc(host)
+        return degrade
+
+    def _touch(self, host, stats):
+        stats.updated_at = time.time()
+        self.dirty.add(host)
+        if self.db is not None and time.monotonic() - self.last_flush >= self.flush_interval:
+            self._flush()
+
+    def is_degraded(self, host):
+        with self.lock:
+            stats = self.hosts.get(host)
+            return stats is not None and stats.degraded_until > time.time()
+
+    def score(self, host):
+        """主机的得分，没有记录时返回 None，降级中返回 0"""
+        with self.lock:
+            stats = self.hosts.get(host)
+            if stats is None:
+                return None
+            return 0.0 if stats.degraded_until > time.time() else stats.score()
+
+    def rank(self, hosts):
+        """按得分从高到低排列主机：有记录的健康主机、没有记录的主机、降级中的主机"""
+        def key(host):
+            score = self.score(host)
+            if score is None:
+                return (1, 0.0)
+            return (0 if score > 0 else 2, -score)
+        return sorted(hosts, key=key)
+
+    def concurrency(self, host, limit):
+        """主机开始下载时的分片并发数：按失败率缩小，降级中的主机只用 limit 的八分之一"""
+        with self.lock:
+            stats = self.hosts.get(host)
+            if stats is None:
+                return limit
+            if stats.degraded_until > time.time():
+                return max(MIN_WINDOW, limit // 8)
+            return max(MIN_WINDOW, min(limit, int(limit * (1.0 - stats.error_rate) ** 2)))
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        self.last_flush = time.monotonic()
+        if self.db is None or not self.dirty:
+            return
+        placeholders = ', '.join('?' * (len(self.COLUMNS) + 1))
+        rows = [(host,) + tuple(getattr(self.hosts[host], name) for name in self.COLUMNS) for host in self.dirty]
+        try:
+            with self.db:
+                self.db.executemany(f'INSERT OR REPLACE INTO hosts VALUES ({placeholders})', rows)
+            self.dirty.clear()
+        except sqlite3.Error:
+            # 数据库被其他进程锁住时留到下次写回
+            pass
+
+    def stats(self):
+        now = time.time()
+        with self.lock:
+            return {host: stats.as_dict(now) for host, stats in self.hosts.items()}
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            if self.db is not None:
+                self.db.close()
+                self.db = None
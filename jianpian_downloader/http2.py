@@ -0,0 +1,174 @@
+"""HTTP/2 传输
+
+HTTP/1.1 下每个并发的分片请求各占一个连接，几十个分片并发、几集同时下载时打开的连接数很多，
+容易用完文件描述符或触发 CDN 的单 IP 连接数限制。HTTP2Adapter 把 https 请求交给启用了
+HTTP/2 的 httpx 客户端，同一主机的并发请求复用少量连接上的多个流。
+
+服务器通过 ALPN 只协商出 HTTP/1.1，或者 HTTP/2 连接出现协议错误时，该主机之后的请求改用
+原来的 HTTP/1.1 连接池（requests 的 HTTPAdapter）。需要安装 httpx[http2]，没有安装时
+创建 HTTP2Adapter 抛出 ImportError，调用方继续使用 HTTP/1.1。
+
+响应转换为 requests.Response，raw 支持 read、readinto、stream 和 tell，原有的分片读取、
+条件请求和指标代码不需要修改；cookie 和代理参数不经过这里（代理仍可通过环境变量设置）。
+"""
+import threading
+import importlib.util
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from . import metrics
+
+HTTP_VERSIONS = metrics.REGISTRY.counter(
+    'jianpian_http_version_responses_total', '经过 HTTP/2 传输的请求按实际协议版本统计的响应数', ['version'])
+HTTP2_FALLBACKS = metrics.REGISTRY.counter(
+    'jianpian_http2_fallbacks_total', '改用 HTTP/1.1 连接池的主机数', ['reason'])
+
+MAX_CONNECTIONS = 16  # HTTP/2 客户端的连接总数上限，每个主机通常只需要一个
+# HTTP/2 禁止的逐跳首部
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade', 'te'}
+
+
+class _StreamReader:
+    """把 httpx 的流式响应包装成 requests 使用的 raw 对象"""
+    def __init__(self, response):
+        self.response = response
+        self.chunks = None  # 未解码的数据块迭代器
+        self.pending = memoryview(b'')  # 上一个数据块中还没有读出的部分
+
+    def _next_chunk(self):
+        if self.chunks is None:
+            self.chunks = self.response.iter_raw()
+        for chunk in self.chunks:
+            if chunk:
+                return memoryview(chunk)
+        return None
+
+    def readinto(self, buffer):
+        if not self.pending:
+            chunk = self._next_chunk()
+            if chunk is None:
+                return 0
+            self.pending = chunk
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def read(self, amt=None, decode_content=False):
+        """读取未解码的数据，amt 为 None 时读到结束"""
+        parts = []
+        total = 0
+        while amt is None or total < amt:
+            if not self.pending:
+                chunk = self._next_chunk()
+                if chunk is None:
+                    break
+                self.pending = chunk
+            size = len(self.pending) if amt is None else min(amt - total, len(self.pending))
+            parts.append(self.pending[:size].tobytes())
+            self.pending = self.pending[size:]
+            total += size
+        return b''.join(parts)
+
+    def stream(self, chunk_size=None, decode_content=True):
+        if decode_content:
+            yield from self.response.iter_bytes(chunk_size)
+        else:
+            yield from self.response.iter_raw(chunk_size)
+
+    def tell(self):
+        """已接收的未解码字节数"""
+        return self.response.num_bytes_downloaded
+
+    def close(self):
+        self.response.close()
+
+    def release_conn(self):
+        self.response.close()
+
+
+class HTTP2Adapter(BaseAdapter):
+    """通过 HTTP/2 发送请求，不支持 HTTP/2 的主机交给 HTTP/1.1 连接池"""
+    def __init__(self, fallback, verify=True, max_connections=MAX_CONNECTIONS):
+        import httpx
+        # 没有安装 h2 时 httpx 无法协商 HTTP/2，只检查是否可用，不需要导入
+        if importlib.util.find_spec('h2') is None:
+            raise ImportError("未安装 h2")
+
+        super().__init__()
+        self.httpx = httpx
+        self.fallback = fallback  # HTTP/1.1 的 HTTPAdapter
+        self.client = httpx.Client(
+            http2=True, verify=verify, follow_redirects=False,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections))
+        self.lock = threading.Lock()
+        self.http1_hosts = set()  # 改用 HTTP/1.1 的主机
+
+    def http1_adapter(self, url):
+        """url 所在主机改用 HTTP/1.1 时返回 HTTP/1.1 的适配器，否则返回 None"""
+        with self.lock:
+            return self.fallback if urlsplit(url).netloc in self.http1_hosts else None
+
+    def _use_http1(self, host, reason):
+        with self.lock:
+            if host in self.http1_hosts:
+                return
+            self.http1_hosts.add(host)
+        HTTP2_FALLBACKS.inc(reason)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        host = urlsplit(request.url).netloc
+        if self.http1_adapter(request.url) is not None:
+            return self.fallback.send(request, stream=stream, timeout=timeout, verify=verify,
+                                      cert=cert, proxies=proxies)
+
+        httpx = self.httpx
+        headers = [(name, value) for name, value in request.headers.items()
+                   if name.lower() not in HOP_BY_HOP_HEADERS]
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            request_timeout = httpx.Timeout(connect=connect, read=read, write=read, pool=connect)
+        else:
+            request_timeout = httpx.Timeout(timeout)
+        try:
+            outgoing = self.client.build_request(request.method, request.url, headers=headers,
+                                                 content=request.body, timeout=request_timeout)
+            response = self.client.send(outgoing, stream=True)
+        except httpx.RemoteProtocolError:
+            # HTTP/2 连接出现协议错误，该主机改用 HTTP/1.1 并重新发送
+            self._use_http1(host, 'protocol_error')
+            return self.fallback.send(request, stream=stream, timeout=timeout, verify=verify,
+                                      cert=cert, proxies=proxies)
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(e, request=request)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ReadTimeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+        HTTP_VERSIONS.inc(response.http_version)
+        if response.http_version != 'HTTP/2':
+            # 服务器只支持 HTTP/1.1，之后使用 requests 的连接池，连接数不受 MAX_CONNECTIONS 限制
+            self._use_http1(host, 'negotiated_http1')
+        return self.build_response(request, response)
+
+    def build_response(self, request, response):
+        result = requests.Response()
+        result.status_code = response.status_code
+        result.headers = CaseInsensitiveDict(response.headers.items())
+        result.encoding = get_encoding_from_headers(result.headers)
+        result.reason = response.reason_phrase
+        result.url = request.url
+        result.request = request
+        result.connection = self
+        # 与 HTTPAdapter 一致，非流式请求的正文由 Session 读取
+        result.raw = _StreamReader(response)
+        return result
+
+    def close(self):
+        self.client.close()
+        self.fallback.close()
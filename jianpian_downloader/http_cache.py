@@ -0,0 +1,156 @@
+"""页面和播放列表的条件请求与压缩协商
+
+ValidatorCache 按地址保存响应的 ETag / Last-Modified 和正文，再次请求同一地址时带上
+If-None-Match / If-Modified-Since，服务器返回 304 时直接使用保存的正文，反复轮询同一部剧的
+剧集列表时大多只需要一个空的 304 响应。请求时显式声明 Accept-Encoding（安装了 brotli 时优先 br），
+并统计条件请求的结果以及 304 和压缩各自节省的传输字节数。
+
+传入 path 时验证信息和正文同时保存到 SQLite，重新启动后（例如定时运行的批处理）仍然有效。
+"""
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from . import metrics
+
+CONDITIONAL_REQUESTS = metrics.REGISTRY.counter(
+    'jianpian_http_conditional_requests_total', '带验证信息的页面和播放列表请求数', ['result'])
+HTTP_BYTES_SAVED = metrics.REGISTRY.counter(
+    'jianpian_http_bytes_saved_total', '条件请求（not_modified）和压缩（compression）节省的传输字节数', ['reason'])
+
+
+def _accept_encoding():
+    """urllib3 能解码的压缩格式，br 需要安装 brotli 或 brotlicffi"""
+    for module in ('brotli', 'brotlicffi'):
+        try:
+            __import__(module)
+            return 'br, gzip, deflate'
+        except ImportError:
+            continue
+    return 'gzip, deflate'
+
+
+ACCEPT_ENCODING = _accept_encoding()
+
+
+def wire_size(response):
+    """响应在网络上传输的正文字节数（压缩后），无法得知时返回 None"""
+    tell = getattr(response.raw, 'tell', None)
+    if tell is not None:
+        try:
+            return tell()
+        except Exception:
+            pass
+    length = response.headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+
+class ValidatorCache:
+    """保存页面和播放列表的验证信息与正文"""
+    def __init__(self, path=None, max_entries=512):
+        self.path = path  # SQLite 文件，None 表示只保存在内存中
+        self.max_entries = max_entries  # 内存中保留的条目数
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # 地址 -> (etag, last_modified, 正文, 传输字节数)
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self.lock, self.db:
+                self.db.execute('PRAGMA journal_mode=WAL')
+                self.db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                                'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body TEXT NOT NULL, '
+                                'size INTEGER NOT NULL, last_used REAL NOT NULL)')
+
+    def get(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                self.entries.move_to_end(url)
+                return entry
+            if self.db is None:
+                return None
+            row = self.db.execute('SELECT etag, last_modified, body, size FROM responses WHERE url = ?',
+                                  (url,)).fetchone()
+            if row is None:
+                return None
+            self._remember(url, tuple(row))
+            return tuple(row)
+
+    def put(self, url, etag, last_modified, body, size):
+        entry = (etag, last_modified, body, size)
+        with self.lock:
+            self._remember(url, entry)
+            if self.db is not None:
+                with self.db:
+                    self.db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                                    (url, etag, last_modified, body, size, time.time()))
+
+    def discard(self, url):
+        with self.lock:
+            self.entries.pop(url, None)
+            if self.db is not None:
+                with self.db:
+                    self.db.execute('DELETE FROM responses WHERE url = ?', (url,))
+
+    def _remember(self, url, entry):
+        self.entries[url] = entry
+        self.entries.move_to_end(url)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def fetch(self, session, url, headers, timeout=10):
+        """获取页面或播放列表的文本，服务器返回 304 时使用保存的正文
+
+        请求失败时抛出 requests 的异常（HTTP 错误为 HTTPError）。
+        """
+        request_headers = dict(headers)
+        request_headers['Accept-Encoding'] = ACCEPT_ENCODING
+        entry = self.get(url)
+        if entry is not None:
+            etag, last_modified = entry[0], entry[1]
+            if etag:
+                request_headers['If-None-Match'] = etag
+            if last_modified:
+                request_headers['If-Modified-Since'] = last_modified
+
+        response = session.get(url, headers=request_headers, timeout=timeout)
+        if response.status_code == 304 and entry is not None:
+            with self.lock:
+                self.hits += 1
+            CONDITIONAL_REQUESTS.inc('not_modified')
+            HTTP_BYTES_SAVED.inc('not_modified', amount=entry[3])
+            return entry[2]
+        response.raise_for_status()
+
+        text = response.text
+        size = wire_size(response)
+        if size is not None and response.headers.get('Content-Encoding'):
+            saved = len(response.content) - size
+            if saved > 0:
+                HTTP_BYTES_SAVED.inc('compression', amount=saved)
+        if entry is not None:
+            with self.lock:
+                self.misses += 1
+            CONDITIONAL_REQUESTS.inc('modified')
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self.put(url, etag, last_modified, text, size if size is not None else len(response.content))
+        elif entry is not None:
+            # 服务器不再提供验证信息
+            self.discard(url)
+        return text
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'not_modified': self.hits, 'modified': self.misses}
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
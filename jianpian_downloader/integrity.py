@@ -0,0 +1,269 @@
+"""合并结果的完整性校验与修复
+
+合并分片时在输出文件旁写入清单（<输出文件>.manifest.json），记录每个分片的地址、
+在输出文件中的偏移、大小和 SHA-256。校验时按清单检查缺失、截断和内容不一致的分片；
+修复时只重新下载这些分片，大小不变时直接在原文件对应位置覆盖，否则重写输出文件，
+其余分片从原文件中复制，不需要重新下载整集。
+
+清单功能加入之前下载完成的文件没有清单，由 adopt_output 补写一份只记录文件大小的清单（adopted），
+这些文件不会被当作未完成而重新下载覆盖，但无法按分片校验和修复。
+"""
+import os
+import json
+import shutil
+import hashlib
+import concurrent.futures
+from datetime import datetime
+
+from . import metrics
+from .tracing import TRACER
+
+MANIFEST_VERSION = 1
+COPY_BLOCK_SIZE = 1024 * 1024
+
+VERIFY_FAILURES = metrics.REGISTRY.counter(
+    'jianpian_integrity_broken_segments_total', '校验发现的损坏分片数', ['reason'])
+REPAIRED_SEGMENTS = metrics.REGISTRY.counter(
+    'jianpian_integrity_repaired_segments_total', '修复时重新下载的分片数')
+
+
+def manifest_path(save_path):
+    return f"{save_path}.manifest.json"
+
+
+def load_manifest(save_path):
+    """读取输出文件的清单，不存在或无法解析时返回 None"""
+    try:
+        with open(manifest_path(save_path), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def write_manifest(save_path, manifest):
+    """原子地写入清单"""
+    path = manifest_path(save_path)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def new_manifest(playlist_url, entries, container='ts', total_size=None):
+    """根据分片记录（url、offset、size、sha256、missing）生成清单
+
+    container 为 mp4 时记录的是每个分片转封装后的片段，total_size 包含文件头和索引。
+    """
+    return {
+        'version': MANIFEST_VERSION,
+        'playlist_url': playlist_url,
+        'created_at': datetime.now().isoformat(),
+        'container': container,
+        'total_size': sum(entry['size'] for entry in entries) if total_size is None else total_size,
+        'segments': entries,
+    }
+
+
+def copy_hashed(infile, outfile, limit=None, buffer=None):
+    """从 infile 复制最多 limit 字节到 outfile，返回 (字节数, SHA-256)
+
+    传入 buffer（可写的 memoryview）时读入该缓冲区，复制过程中不再分配内存。
+    """
+    sha256 = hashlib.sha256()
+    total = 0
+    if buffer is not None:
+        while limit is None or total < limit:
+            size = len(buffer) if limit is None else min(len(buffer), limit - total)
+            read = infile.readinto(buffer[:size])
+            if not read:
+                break
+            sha256.update(buffer[:read])
+            outfile.write(buffer[:read])
+            total += read
+        return total, sha256.hexdigest()
+    while limit is None or total < limit:
+        size = COPY_BLOCK_SIZE if limit is None else min(COPY_BLOCK_SIZE, limit - total)
+        block = infile.read(size)
+        if not block:
+            break
+        sha256.update(block)
+        outfile.write(block)
+        total += len(block)
+    return total, sha256.hexdigest()
+
+
+def missing_segments(manifest):
+    """合并时就缺失的分片序号"""
+    return [i for i, entry in enumerate(manifest['segments']) if entry.get('missing')]
+
+
+def adopt_output(save_path):
+    """为清单功能加入之前下载完成的文件补写清单，返回是否补写
+
+    只接受非空、没有清单、也没有未完成临时目录（<输出文件>.downloading）的文件；当时合并完成后
+    才删除临时目录，临时目录还在说明下载被中断，文件可能不完整。
+    """
+    if (load_manifest(save_path) is not None or os.path.exists(f"{save_path}.downloading")
+            or not os.path.isfile(save_path)):
+        return False
+    size = os.path.getsize(save_path)
+    if size == 0:
+        return False
+    entry = {'url': None, 'offset': 0, 'size': size, 'sha256': None}
+    manifest = new_manifest(None, [entry])  # 当时只会直接拼接 TS
+    manifest['adopted'] = True
+    write_manifest(save_path, manifest)
+    return True
+
+
+def verify_output(save_path, full=True):
+    """按清单校验输出文件
+
+    返回 (是否完好, [(分片序号, 原因)])，原因为 missing、truncated 或 mismatch；
+    full 为 False 时只检查缺失和文件长度，不计算哈希。没有清单的文件无法确认是否完整，
+    视为未完成（先用 adopt_output 接收旧文件）；补写的清单没有哈希，只检查长度。
+    """
+    if not os.path.exists(save_path):
+        return False, []
+    manifest = load_manifest(save_path)
+    if manifest is None:
+        return False, []
+
+    broken = []
+    file_size = os.path.getsize(save_path)
+    with TRACER.span('verify', save_path=save_path, full=full), open(save_path, 'rb') as f:
+        for index, entry in enumerate(manifest['segments']):
+            if entry.get('missing'):
+                broken.append((index, 'missing'))
+            elif entry['offset'] + entry['size'] > file_size:
+                broken.append((index, 'truncated'))
+            elif full and entry['sha256'] is not None:
+                f.seek(entry['offset'])
+                sha256 = hashlib.sha256()
+                remaining = entry['size']
+                while remaining:
+                    block = f.read(min(COPY_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    sha256.update(block)
+                    remaining -= len(block)
+                if remaining or sha256.hexdigest() != entry['sha256']:
+                    broken.append((index, 'mismatch'))
+    if not broken and file_size != manifest['total_size']:
+        # 末尾多出的数据同样说明文件与清单不一致
+        broken.append((len(manifest['segments']) - 1, 'mismatch'))
+    for _, reason in broken:
+        VERIFY_FAILURES.inc(reason)
+    return not broken, broken
+
+
+def repair_output(downloader, save_path, indexes, should_stop=None):
+    """重新下载损坏的分片并修补输出文件，成功时返回 True"""
+    manifest = load_manifest(save_path)
+    if manifest is None or not indexes:
+        return False
+    if manifest.get('adopted'):
+        downloader.console.print(f"[yellow]{os.path.basename(save_path)} 没有分片记录，无法只修复单个分片[/yellow]")
+        return False
+    if manifest.get('live'):
+        downloader.console.print(f"[yellow]{os.path.basename(save_path)} 是直播录像，分片已不在服务器上，无法修复[/yellow]")
+        return False
+    if manifest.get('container', 'ts') != 'ts':
+        # 片段的大小和文件头都由整集的分片决定，转封装的输出只能整集重新下载
+        downloader.console.print(f"[yellow]{os.path.basename(save_path)} 已转封装为 MP4，无法只修复单个分片[/yellow]")
+        return False
+    should_stop = should_stop or (lambda: False)
+    indexes = sorted(set(indexes))
+    repair_dir = f"{save_path}.repair"
+    os.makedirs(repair_dir, exist_ok=True)
+    console = downloader.console
+
+    def fetch(index):
+        entry = manifest['segments'][index]
+        path = os.path.join(repair_dir, f"{index:05d}.ts")
+        for _ in range(3):
+            if should_stop():
+                return index, None
+            # 与正常下载相同：检查 Content-Length，截断的分片返回 0
+            size = downloader._fetch_segment_file(entry['url'], path, should_stop, lambda n: None)
+            if size is None:
+                return index, None
+            if size and _matches(path, entry):
+                return index, path
+        return index, None
+
+    try:
+        with TRACER.span('repair', save_path=save_path, segments=len(indexes)):
+            fetched = {}
+            workers = max(1, min(downloader.max_workers, 8, len(indexes)))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                for index, path in executor.map(fetch, indexes):
+                    if path is None:
+                        if not should_stop():
+                            console.print(f"[yellow]修复失败，第 {index + 1} 个分片无法下载或与清单不符[/yellow]")
+                        return False
+                    fetched[index] = path
+
+            entries = manifest['segments']
+            same_size = all(
+                not entries[i].get('missing') and os.path.getsize(path) == entries[i]['size']
+                for i, path in fetched.items()
+            )
+            if same_size and os.path.getsize(save_path) >= manifest['total_size']:
+                _patch_in_place(save_path, entries, fetched, manifest['total_size'])
+            else:
+                _rewrite(save_path, entries, fetched)
+            manifest['total_size'] = sum(entry['size'] for entry in entries)
+            write_manifest(save_path, manifest)
+        REPAIRED_SEGMENTS.inc(amount=len(fetched))
+        console.print(f"[green]已修复 {len(fetched)} 个分片: {os.path.basename(save_path)}[/green]")
+        return True
+    finally:
+        shutil.rmtree(repair_dir, ignore_errors=True)
+
+
+def _matches(path, entry):
+    """重新下载的分片与清单记录的大小和哈希一致；合并时就缺失的分片没有记录，任何内容都接受
+
+    内容与记录不同说明下载不完整或站点上的分片已经改变，不能把它的哈希当作正确的值写入清单。
+    """
+    if entry.get('missing') or entry['sha256'] is None:
+        return True
+    if os.path.getsize(path) != entry['size']:
+        return False
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+            sha256.update(block)
+    return sha256.hexdigest() == entry['sha256']
+
+
+def _patch_in_place(save_path, entries, fetched, total_size):
+    """分片大小不变时直接覆盖原文件中的对应位置"""
+    with open(save_path, 'r+b') as outfile:
+        for index, path in fetched.items():
+            outfile.seek(entries[index]['offset'])
+            with open(path, 'rb') as infile:
+                _, entries[index]['sha256'] = copy_hashed(infile, outfile)
+        outfile.truncate(total_size)
+
+
+def _rewrite(save_path, entries, fetched):
+    """分片大小变化时重写输出文件，未损坏的分片从原文件复制"""
+    temp_path = f"{save_path}.repairing"
+    offset = 0
+    with open(temp_path, 'wb') as outfile, open(save_path, 'rb') as original:
+        for index, entry in enumerate(entries):
+            if index in fetched:
+                with open(fetched[index], 'rb') as infile:
+                    size, digest = copy_hashed(infile, outfile)
+                entry.pop('missing', None)
+            else:
+                original.seek(entry['offset'])
+                size, digest = copy_hashed(original, outfile, entry['size'])
+            entry.update(offset=offset, size=size, sha256=digest)
+            offset += size
+    os.replace(temp_path, save_path)
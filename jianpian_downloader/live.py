@@ -0,0 +1,271 @@
+"""直播流（滑动窗口 HLS）录制
+
+直播的媒体播放列表没有 #EXT-X-ENDLIST，服务器只保留最近若干个分片，并随时间向后滑动。
+LiveRecorder 按目标时长的节奏轮询播放列表，用 #EXT-X-MEDIA-SEQUENCE 记录已录制到的位置，
+只下载新出现的分片，并按顺序直接追加写入输出文件，内存占用与录制时长无关。
+
+录制过程中写入 <输出文件>.part，任务被暂停后继续录制时接着追加；录制结束（到达截止时间、直播结束、
+播放列表持续无法获取或程序退出）时改名为输出文件并写入清单（标记为 live），之后再加入同一任务时
+视为已完成，不会再追加一段录像。直播的分片很快就从服务器上消失，清单只用于校验，不能按分片修复。
+
+播放列表没有序列号时退化为按分片地址去重。窗口滑过了尚未下载的分片（轮询不及时或下载太慢）
+时会记录缺失的分片数并给出提示。
+"""
+import os
+import time
+import hashlib
+from collections import deque
+from datetime import datetime
+from urllib.parse import urljoin, urlsplit
+
+from m3u8 import M3U8
+
+from . import integrity, metrics, host_health
+from .streaming import partial_path
+from .tracing import TRACER
+
+LIVE_SEGMENTS = metrics.REGISTRY.counter(
+    'jianpian_live_segments_total', '直播录制写入的分片数')
+LIVE_GAPS = metrics.REGISTRY.counter(
+    'jianpian_live_missed_segments_total', '直播录制中因窗口滑过而缺失的分片数')
+
+# 按地址去重时记住的分片数
+SEEN_URIS_LIMIT = 4096
+
+
+def parse_stop_time(text):
+    """解析停止时间，支持 HH:MM、HH:MM:SS 和 ISO 格式的日期时间，返回时间戳"""
+    text = text.strip()
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            clock = datetime.strptime(text, fmt).time()
+        except ValueError:
+            continue
+        now = datetime.now()
+        stop_at = datetime.combine(now.date(), clock)
+        if stop_at <= now:
+            # 今天的时间已经过去，视为明天
+            stop_at = datetime.fromtimestamp(stop_at.timestamp() + 86400)
+        return stop_at.timestamp()
+    return datetime.fromisoformat(text).timestamp()
+
+
+class LiveOptions:
+    """直播录制参数"""
+    def __init__(self, duration=None, stop_at=None, max_playlist_errors=10, segment_retries=3):
+        self.duration = duration  # 录制时长（秒），None 表示不限
+        self.stop_at = stop_at  # 停止时间（时间戳），None 表示不限
+        self.max_playlist_errors = max_playlist_errors  # 连续获取播放列表失败多少次后停止
+        self.segment_retries = segment_retries  # 单个分片的重试次数
+
+    def deadline(self, start):
+        """根据开始时间计算截止时间，没有限制时返回 None"""
+        deadlines = []
+        if self.duration:
+            deadlines.append(start + self.duration)
+        if self.stop_at:
+            deadlines.append(self.stop_at)
+        return min(deadlines) if deadlines else None
+
+
+class _HashingWriter:
+    """写入输出文件的同时计算 SHA-256"""
+    def __init__(self, outfile):
+        self.outfile = outfile
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.outfile.write(data)
+
+
+class LiveRecorder:
+    """轮询直播播放列表，把新分片按顺序追加到输出文件"""
+    def __init__(self, downloader, playlist_url, save_path, options, should_stop, report_progress):
+        self.downloader = downloader
+        self.console = downloader.console
+        self.playlist_url = playlist_url
+        self.save_path = save_path
+        self.partial_path = partial_path(save_path)  # 录制中的文件，结束时改名为 save_path
+        self.options = options
+        self.should_stop = should_stop
+        self.report_progress = report_progress  # report(进度百分比, 速度文本)
+        self.next_sequence = None  # 下一个要录制的媒体序列号
+        self.seen_uris = deque(maxlen=SEEN_URIS_LIMIT)
+        self.seen_set = set()
+        self.recorded_segments = 0
+        self.recorded_bytes = 0
+        self.missed_segments = 0
+        self.entries = []  # 清单的分片记录
+
+    def record(self):
+        """开始录制，直到停止、到达截止时间或直播结束
+
+        录制结束且录到内容时返回 True；任务被暂停或取消时返回 False，已录制的内容留在 .part 文件中。
+        """
+        from .downloader import SpeedMonitor
+
+        start = time.time()
+        deadline = self.options.deadline(start)
+        speed_monitor = SpeedMonitor()
+        playlist_errors = 0
+        self.console.print(f"[cyan]开始录制直播: {os.path.basename(self.save_path)}[/cyan]")
+        os.makedirs(os.path.dirname(self.save_path), exist_ok=True)
+
+        with TRACER.span('live_record', save_path=self.save_path), open(self.partial_path, 'ab') as output:
+            resumed = output.tell()
+            if resumed:
+                # 中断前录制的部分，重新计算哈希需要读完整个文件，只记录大小
+                self.entries.append({'url': None, 'offset': 0, 'size': resumed, 'sha256': None})
+            while not self.should_stop():
+                if deadline is not None and time.time() >= deadline:
+                    break
+                try:
+                    text = self._fetch_playlist()
+                    playlist_errors = 0
+                except Exception as e:
+                    playlist_errors += 1
+                    self.console.print(f"[yellow]获取直播播放列表失败 ({playlist_errors}): {str(e)}[/yellow]")
+                    if playlist_errors >= self.options.max_playlist_errors:
+                        break
+                    self._wait(2, deadline)
+                    continue
+
+                playlist = M3U8(text)
+                new_segments = self._new_segments(playlist, '#EXT-X-MEDIA-SEQUENCE' in text)
+                for uri in new_segments:
+                    if self.should_stop() or (deadline is not None and time.time() >= deadline):
+                        break
+                    if not self._append_segment(output, urljoin(self.playlist_url, uri), speed_monitor):
+                        self.missed_segments += 1
+                        LIVE_GAPS.inc()
+                    self._report(start, deadline, speed_monitor)
+
+                if playlist.is_endlist:
+                    self.console.print("[cyan]直播已结束[/cyan]")
+                    break
+                # 有新分片时按目标时长轮询，没有变化时按一半的目标时长轮询
+                target = playlist.target_duration or 6
+                self._wait(target if new_segments else target / 2, deadline)
+            total_size = output.tell()
+
+        self.console.print(
+            f"[green]直播录制结束: {self.recorded_segments} 个分片，"
+            f"{self.recorded_bytes / 1024 / 1024:.1f}MB，缺失 {self.missed_segments} 个分片[/green]")
+        if total_size == 0:
+            os.remove(self.partial_path)
+            return False
+        if self.should_stop() and not self.downloader.stop_flag:
+            # 只有任务被暂停或取消；程序退出（stop_flag）时结束录制
+            return False
+        self.downloader.disk_writer.sync_path(self.partial_path)
+        os.replace(self.partial_path, self.save_path)
+        manifest = integrity.new_manifest(self.playlist_url, self.entries, total_size=total_size)
+        manifest['live'] = True
+        integrity.write_manifest(self.save_path, manifest)
+        return True
+
+    def _fetch_playlist(self):
+        with TRACER.span('live_playlist', url=self.playlist_url):
+            return self.downloader.fetch_text(self.playlist_url, timeout=30)
+
+    def _new_segments(self, playlist, has_sequence):
+        """返回本次播放列表中尚未录制的分片地址"""
+        if has_sequence:
+            first = playlist.media_sequence or 0
+            if self.next_sequence is None:
+                self.next_sequence = first
+            elif first > self.next_sequence:
+                missed = first - self.next_sequence
+                self._report_gap(missed)
+                self.next_sequence = first
+            elif first + len(playlist.segments) < self.next_sequence:
+                # 序列号回退（例如推流重启），从新的窗口开始录制
+                self.console.print("[yellow]直播序列号回退，从当前窗口重新开始[/yellow]")
+                self.next_sequence = first
+            start = self.next_sequence - first
+            self.next_sequence = first + len(playlist.segments)
+            return [segment.uri for segment in playlist.segments[start:]]
+
+        uris = [segment.uri for segment in playlist.segments]
+        new = [uri for uri in uris if uri not in self.seen_set]
+        if self.seen_uris and uris and len(new) == len(uris):
+            # 整个窗口都是新分片，说明中间可能有分片已经滑出窗口
+            self._report_gap(None)
+        for uri in new:
+            if len(self.seen_uris) == self.seen_uris.maxlen:
+                self.seen_set.discard(self.seen_uris[0])
+            self.seen_uris.append(uri)
+            self.seen_set.add(uri)
+        return new
+
+    def _report_gap(self, missed):
+        if missed is None:
+            self.console.print("[yellow]直播窗口已滑过，可能缺失部分分片[/yellow]")
+            return
+        self.missed_segments += missed
+        LIVE_GAPS.inc(amount=missed)
+        self.console.print(f"[yellow]直播窗口已滑过，缺失 {missed} 个分片[/yellow]")
+
+    def _append_segment(self, output, ts_url, speed_monitor):
+        """下载一个分片并追加到输出文件，失败时回退已写入的部分"""
+        host = urlsplit(ts_url).netloc
+        position = output.tell()
+        for attempt in range(self.options.segment_retries):
+            if self.should_stop():
+                return True
+            segment_start = time.monotonic()
+            metrics.ACTIVE_CONNECTIONS.inc()
+            try:
+                with TRACER.span('live_segment', host=host, attempt=attempt + 1):
+                    response = self.downloader.session.get(ts_url, headers=self.downloader.headers,
+                                                           stream=True, timeout=30)
+                    first_byte = time.monotonic() - segment_start
+                    response.raise_for_status()
+                    writer = _HashingWriter(output)
+                    size = self.downloader._stream_segment(
+                        response, writer, self.should_stop, speed_monitor.add_bytes)
+                if size is None:
+                    # 被停止时丢弃不完整的分片
+                    output.truncate(position)
+                    output.seek(position)
+                    return True
+                if size > 0:
+                    elapsed = time.monotonic() - segment_start
+                    self.downloader.host_health.record_success(host, first_byte, size, elapsed)
+                    metrics.SEGMENT_SECONDS.observe(elapsed, host)
+                    metrics.SEGMENT_BYTES.inc(host, amount=size)
+                    LIVE_SEGMENTS.inc()
+                    self.entries.append({'url': ts_url, 'offset': position, 'size': size,
+                                         'sha256': writer.sha256.hexdigest()})
+                    self.recorded_segments += 1
+                    self.recorded_bytes += size
+                    return True
+                self.downloader.host_health.record_failure(host, 'truncated')
+            except Exception as e:
+                self.downloader.host_health.record_failure(host, host_health.failure_reason(e))
+            finally:
+                metrics.ACTIVE_CONNECTIONS.dec()
+            metrics.SEGMENT_FAILURES.inc(host)
+            output.truncate(position)
+            output.seek(position)
+        self.console.print(f"[yellow]直播分片下载失败: {ts_url}[/yellow]")
+        return False
+
+    def _report(self, start, deadline, speed_monitor):
+        if deadline is not None and deadline > start:
+            progress = min(100.0, (time.time() - start) / (deadline - start) * 100)
+        else:
+            progress = 0
+        self.report_progress(progress, speed_monitor.format_speed())
+
+    def _wait(self, seconds, deadline):
+        """等待指定秒数，期间响应停止请求和截止时间"""
+        end = time.monotonic() + seconds
+        while not self.should_stop():
+            remaining = end - time.monotonic()
+            if deadline is not None:
+                remaining = min(remaining, deadline - time.time())
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, 0.5))
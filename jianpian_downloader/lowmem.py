@@ -0,0 +1,173 @@
+"""低内存模式
+
+在内存很小的机器（例如 512MB 的 ARM 开发板）上长时间运行时，常驻内存主要来自：每个下载线程
+各自的读取缓冲区和线程栈、glibc 为多线程分配的多个 malloc arena、页面缓存中的正文，以及
+DownloadManager 中一直保留的已完成任务。
+
+MemoryBudget 按给定的常驻内存预算调整这些部分：
+- 读取和合并使用 BufferPool 中固定数量、固定大小的缓冲区，没有空闲缓冲区时等待；
+- 分片下载并发数不超过缓冲区数量，新线程使用较小的栈；
+- 限制 malloc arena 数量，定期检查常驻内存，超出预算时回收并把空闲内存交还系统；
+- DownloadManager 只为即将开始的任务创建线程，已完成的任务移出内存（见 manager.DownloadManager）。
+
+预算是软限制：超出时不会中断正在下载的任务，只是暂缓开始新任务。
+"""
+import gc
+import os
+import sys
+import queue
+import ctypes
+import threading
+from contextlib import contextmanager
+
+from . import metrics
+
+PROCESS_RSS = metrics.REGISTRY.gauge('jianpian_process_rss_bytes', '进程常驻内存（字节）')
+MEMORY_TRIMS = metrics.REGISTRY.counter('jianpian_memory_trims_total', '常驻内存超出预算时的回收次数')
+
+DEFAULT_BUFFER_SIZE = 128 * 1024  # 低内存模式下单个读取缓冲区的大小
+THREAD_STACK_SIZE = 512 * 1024  # 低内存模式下新线程的栈大小
+MALLOC_ARENAS = 2  # 低内存模式下 glibc 的 malloc arena 数量上限
+_M_ARENA_MAX = -8  # glibc mallopt 参数
+
+
+def current_rss():
+    """当前进程的常驻内存（字节）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # 非 Linux 系统退化为峰值内存
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def _libc():
+    """glibc 的句柄，其他 C 库返回 None"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(None)
+        return libc if hasattr(libc, 'malloc_trim') else None
+    except OSError:
+        return None
+
+
+def limit_malloc_arenas(count=MALLOC_ARENAS):
+    """限制 glibc 的 malloc arena 数量，返回是否生效
+
+    glibc 默认最多为每个 CPU 核心创建 8 个 arena，几十个下载线程轮流分配释放时
+    各个 arena 中的碎片会让常驻内存持续上涨。
+    """
+    libc = _libc()
+    if libc is None:
+        return False
+    return bool(libc.mallopt(_M_ARENA_MAX, count))
+
+
+def release_memory():
+    """回收循环引用并把空闲的堆内存交还系统"""
+    gc.collect()
+    libc = _libc()
+    if libc is not None:
+        libc.malloc_trim(0)
+
+
+class BufferPool:
+    """固定数量、固定大小的缓冲区池，所有缓冲区在创建时一次分配"""
+    def __init__(self, count, size=DEFAULT_BUFFER_SIZE):
+        self.count = count
+        self.size = size
+        self.memory = bytearray(count * size)
+        view = memoryview(self.memory)
+        self.free = queue.LifoQueue()  # 最近用过的缓冲区优先复用，仍在 CPU 缓存中
+        for i in range(count):
+            self.free.put(view[i * size:(i + 1) * size])
+
+    def acquire(self, timeout=None):
+        """取出一个缓冲区（memoryview），没有空闲的缓冲区时等待，超时抛出 queue.Empty"""
+        return self.free.get(timeout=timeout)
+
+    def release(self, buffer):
+        self.free.put(buffer)
+
+    @contextmanager
+    def buffer(self):
+        buffer = self.acquire()
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+    def available(self):
+        return self.free.qsize()
+
+
+class MemoryBudget:
+    """常驻内存预算"""
+    def __init__(self, limit, buffer_size=DEFAULT_BUFFER_SIZE, check_interval=5):
+        self.limit = limit  # 常驻内存预算（字节）
+        self.buffer_size = buffer_size
+        self.pool = None  # apply() 时按并发数创建
+        self.task_limit = None  # 缓冲区池能同时支撑的任务数，apply() 之前为 None（只按常驻内存控制）
+        self.check_interval = check_interval  # 检查常驻内存的间隔（秒）
+        self.trims = 0
+        self.monitor_thread = None
+        self.stop_event = threading.Event()
+
+    def over_budget(self):
+        return current_rss() > self.limit
+
+    def check(self):
+        """检查常驻内存，超出预算时回收，返回回收后的常驻内存"""
+        rss = current_rss()
+        if rss > self.limit:
+            release_memory()
+            self.trims += 1
+            MEMORY_TRIMS.inc()
+            rss = current_rss()
+        PROCESS_RSS.set(rss)
+        return rss
+
+    def apply(self, downloader, max_active_tasks=None):
+        """按预算调整下载器和当前进程，之后创建的线程使用较小的栈
+
+        max_active_tasks 为 None 时不限制同时下载数，按预算能容纳的缓冲区数计算（见 task_limit）。
+        """
+        limit_malloc_arenas()
+        threading.stack_size(THREAD_STACK_SIZE)
+        # 每个分片下载线程同时占用一个缓冲区，合并时再占用一个；缓冲区总量不超过预算的四分之一
+        buffers = max(2, self.limit // 4 // self.buffer_size)
+        if max_active_tasks:
+            per_task = max(1, buffers // max_active_tasks - 1)
+            downloader.max_workers = max(1, min(downloader.max_workers, per_task))
+            self.task_limit = max_active_tasks
+        else:
+            downloader.max_workers = max(1, min(downloader.max_workers, buffers - 1))
+            self.task_limit = max(1, buffers // (downloader.max_workers + 1))
+        self.pool = BufferPool(self.task_limit * (downloader.max_workers + 1), self.buffer_size)
+        downloader.buffer_pool = self.pool
+        # 每个分片下载线程在交给写入线程之前最多积攒一个缓冲区大小的数据
+        downloader.disk_writer.coalesce_size = min(downloader.disk_writer.coalesce_size, self.buffer_size)
+        if downloader.http_cache is not None:
+            downloader.http_cache.max_entries = min(downloader.http_cache.max_entries, 32)
+        self.start_monitor()
+
+    def start_monitor(self):
+        if self.monitor_thread is None:
+            self.monitor_thread = threading.Thread(target=self._monitor, daemon=True)
+            self.monitor_thread.start()
+
+    def _monitor(self):
+        while not self.stop_event.wait(self.check_interval):
+            self.check()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        stats = {'limit': self.limit, 'rss': current_rss(), 'trims': self.trims}
+        if self.pool is not None:
+            stats.update(buffers=self.pool.count, buffer_size=self.pool.size, buffers_free=self.pool.available())
+        return stats
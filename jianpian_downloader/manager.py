@@ -0,0 +1,762 @@
+"""下载任务管理
+
+DownloadManager 维护所有剧集下载任务的状态（DownloadManager.downloads），控制同时下载数、
+暂停、继续、取消和重试；TaskStore 把未完成的任务保存到 JSON 文件，下次启动时恢复。
+
+限制了同时下载数时，等待中的任务放在 ready 队列中，不创建线程，有空闲名额时按队列顺序启动；
+add_downloads、cancel_tasks、pause_tasks、resume_tasks、retry_failed 和 prioritize 一次处理一批任务，
+整批只写一次任务文件。
+
+低内存模式（传入 memory_budget）下超出内存预算时暂缓启动新任务；已完成的任务从 downloads 移出，
+只在 evicted 中保留显示用的标题和路径，完整记录追加到 TaskStore 的历史文件。
+"""
+import os
+import json
+import time
+import shutil
+import threading
+from collections import deque
+from datetime import datetime
+
+from . import metrics, integrity
+from .console import get_console
+from .streaming import partial_path
+from .video import Video
+
+
+class TaskRecord:
+    """下载任务记录
+
+    字段保存在 __slots__ 中，比同样内容的字典小得多；支持 task['status']、task.get('error')
+    这样的字典式访问，没有设置的字段视为不存在。
+    """
+    __slots__ = ('thread', 'stop_event', 'status', 'progress', 'speed', 'video', 'episode',
+                 'episode_index', 'save_dir', 'save_path', 'created_at', 'error')
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        if key in self:
+            delattr(self, key)
+        return value
+
+
+class DownloadManager:
+    """下载管理器"""
+    def __init__(self, store_path="download_tasks.json", max_active_tasks=None, console=None, backend=None,
+                 memory_budget=None):
+        self.downloads = {}  # 保存所有下载任务
+        self.lock = threading.Lock()
+        self.output_lock = threading.Lock()  # 输出锁
+        self.status_display = False  # 状态显示标志
+        self.console = console or get_console()  # 输出控制台
+        self.task_store = TaskStore(store_path, console=self.console)  # 任务存储器
+        self.backend = backend  # 下载后端（workers.ProcessBackend），None 表示在当前进程的线程中下载
+        self.max_active_tasks = max_active_tasks  # 同时下载的剧集数上限，None 表示不限制
+        self.memory_budget = memory_budget  # 常驻内存预算（lowmem.MemoryBudget），None 表示关闭低内存模式
+        # 等待启动的 (任务 ID, 下载器)，不限制同时下载数时为 None，每个任务直接创建线程
+        self.ready = deque() if max_active_tasks or memory_budget is not None else None
+        self.queued = set()  # ready 中的任务 ID
+        self.running = 0  # 已从 ready 中启动、还没有结束的任务数
+        self.evicted = {}  # 已移出内存的完成任务，任务 ID -> (视频标题, 剧集标题, 保存目录, 保存路径)
+        metrics.QUEUE_DEPTH.set_function(self.get_pending_count)
+        metrics.ACTIVE_TASKS.set_function(self.get_active_count)
+        self.stop_flag = False  # 停止标志
+        self.auto_save_thread = None  # 自动保存线程
+        
+    def start_auto_save(self):
+        """启动自动保存线程"""
+        if self.auto_save_thread is None:
+            self.auto_save_thread = threading.Thread(target=self._auto_save_tasks, daemon=True)
+            self.auto_save_thread.start()
+        
+    def _auto_save_tasks(self):
+        """定期自动保存任务状态"""
+        while not self.stop_flag:
+            try:
+                with self.lock:
+                    self.task_store.save_tasks(self.downloads)
+            except Exception as e:
+                self.console.print(f"[yellow]自动保存任务状态失败: {str(e)}[/yellow]")
+            time.sleep(5) 
+            
+    def stop(self):
+        """停止下载管理器"""
+        self.stop_flag = True
+        # 确保最后一次保存
+        with self.lock:
+            self.task_store.save_tasks(self.downloads)
+        
+    def restore_tasks(self, downloader):
+        """恢复未完成的下载任务"""
+        stored_tasks = self.task_store.load_tasks()
+        restored_count = 0
+        videos = {}  # 同一视频的任务共用 Video 对象，剧集列表只获取一次
+        
+        for task_id, task_info in stored_tasks.items():
+            try:
+                # 检查临时目录
+                temp_dir = f"{task_info['save_path']}.downloading"
+                if not os.path.exists(temp_dir):
+                    os.makedirs(temp_dir, exist_ok=True)
+                
+                # 创建Video对象并获取剧集列表
+                video = videos.get(task_info['video_url'])
+                if video is None:
+                    video = Video(task_info['video_title'], task_info['video_url'])
+                    if not video.get_episodes(downloader):
+                        self.console.print(f"[yellow]恢复任务失败 {task_id}: 无法获取剧集列表[/yellow]")
+                        continue
+                    videos[task_info['video_url']] = video
+                
+                # 查找对应的剧集
+                episode_index = None
+                for i, ep in enumerate(video.episodes):
+                    if ep['url'] == task_info['episode_url']:
+                        episode_index = i
+                        break
+                
+                if episode_index is None:
+                    self.console.print(f"[yellow]恢复任务失败 {task_id}: 找不到对应剧集[/yellow]")
+                    continue
+                
+                # 添加到下载队列，保持原始状态和进度，已暂停的任务不自动开始
+                with self.lock:
+                    task = self.downloads[task_id] = TaskRecord(
+                        thread=None,
+                        stop_event=threading.Event(),
+                        status=task_info['status'],  # 保持原始状态
+                        progress=task_info['progress'],  # 保持原始进度
+                        speed='0 B/s',
+                        video=video,
+                        episode=video.episodes[episode_index],
+                        episode_index=episode_index,
+                        save_dir=task_info['save_dir'],
+                        save_path=task_info['save_path'],
+                        created_at=task_info['created_at']
+                    )
+                    if task_info['status'] != 'paused':
+                        self._start_task(task_id, task, downloader)
+                restored_count += 1
+                self.console.print(f"[green]已恢复任务: {video.title} - {video.episodes[episode_index]['title']} (进度: {task_info['progress']:.1f}%)[/green]")
+                
+            except Exception as e:
+                self.console.print(f"[yellow]恢复任务 {task_id} 失败: {str(e)}[/yellow]")
+                continue
+        
+        return restored_count
+        
+    def add_download(self, video, episode_index, save_dir, downloader):
+        """添加下载任务"""
+        return bool(self.add_downloads(video, [episode_index], save_dir, downloader))
+
+    def add_downloads(self, video, episode_indexes, save_dir, downloader, front=False):
+        """批量添加同一视频的下载任务，返回加入的任务 ID 列表（按 episode_indexes 的顺序）
+
+        越界和已存在的剧集被跳过；剧集目录只列出一次，输出文件已完整的剧集直接记为完成。
+        整批任务一次交给调度器，任务文件只写一次；front 为 True 时排在等待队列最前面。
+        """
+        indexes = [i for i in dict.fromkeys(episode_indexes) if 0 <= i < len(video.episodes)]
+        if not indexes:
+            return []
+        paths = {i: video.get_episode_path(save_dir, i) for i in indexes}
+        existing = _list_dir(os.path.dirname(paths[indexes[0]]))
+        # 只对已存在的输出文件读取清单
+        complete = {i for i in indexes
+                    if os.path.basename(paths[i]) in existing and self._is_output_complete(paths[i])}
+        created_at = datetime.now().isoformat()
+
+        with self.lock:
+            added = []
+            to_start = []
+            for i in indexes:
+                task_id = self.task_id(video, i)
+                if self._occupied(task_id, video.episodes[i]):
+                    continue
+                done = i in complete
+                task = self.downloads[task_id] = TaskRecord(
+                    thread=None,
+                    stop_event=threading.Event(),
+                    status='completed' if done else 'pending',
+                    progress=100 if done else 0,
+                    speed='-' if done else '0 B/s',
+                    video=video,
+                    episode=video.episodes[i],
+                    episode_index=i,
+                    save_dir=save_dir,
+                    save_path=paths[i],
+                    created_at=created_at
+                )
+                added.append(task_id)
+                if not done:
+                    to_start.append((task_id, task))
+                elif self.memory_budget is not None:
+                    self._evict(task_id)
+            if added:
+                self._start_tasks(to_start, downloader, front)
+                self.task_store.save_tasks(self.downloads)
+            return added
+
+    @staticmethod
+    def task_id(video, episode_index):
+        """剧集的任务 ID"""
+        return f"{video.title}_{episode_index}"
+
+    def _occupied(self, task_id, episode):
+        """任务 ID 已被占用（调用方持有 self.lock）
+
+        任务 ID 按剧集序号生成，剧集列表中间插入新剧集后，新剧集可能与另一集的任务 ID 相同，
+        另一集的任务已完成或已取消时丢弃旧记录，让新剧集加入。
+        """
+        task = self.downloads.get(task_id)
+        if task is not None:
+            if task['status'] not in ('completed', 'cancelled') or task['episode']['url'] == episode['url']:
+                return True
+            del self.downloads[task_id]
+            return False
+        evicted = self.evicted.get(task_id)
+        if evicted is not None:
+            if evicted[1] == episode['title']:
+                return True
+            del self.evicted[task_id]
+        return False
+
+    def is_episode_completed(self, video, episode_index):
+        """剧集已有完成的任务（包括已移出内存的任务）"""
+        task_id = self.task_id(video, episode_index)
+        episode = video.episodes[episode_index]
+        with self.lock:
+            task = self.downloads.get(task_id)
+            if task is not None:
+                return task['status'] == 'completed' and task['episode']['url'] == episode['url']
+            evicted = self.evicted.get(task_id)
+            return evicted is not None and evicted[1] == episode['title']
+
+    def _start_task(self, task_id, task, downloader):
+        """为任务创建下载线程或加入等待队列（调用方持有 self.lock）"""
+        self._start_tasks([(task_id, task)], downloader)
+
+    def _start_tasks(self, tasks, downloader, front=False):
+        """把一批 (任务 ID, 任务) 交给调度器（调用方持有 self.lock）"""
+        if self.ready is None:
+            for task_id, task in tasks:
+                task['thread'] = self._new_thread(task_id, task, downloader)
+                task['thread'].start()
+            return
+        entries = []
+        for task_id, task in tasks:
+            task['thread'] = None
+            if task_id not in self.queued:
+                self.queued.add(task_id)
+                entries.append((task_id, downloader))
+        if front:
+            self.ready.extendleft(reversed(entries))
+        else:
+            self.ready.extend(entries)
+        self._dispatch()
+
+    def _new_thread(self, task_id, task, downloader):
+        return threading.Thread(
+            target=self._download_task,
+            args=(task_id, task['video'], task['episode_index'], task['save_dir'], downloader),
+            daemon=True
+        )
+
+    def _dispatch(self):
+        """在名额内按队列顺序启动等待的任务，低内存模式下超出内存预算时暂缓（调用方持有 self.lock）
+
+        没有设置同时下载数时，低内存模式按缓冲区池能支撑的任务数（MemoryBudget.task_limit）限制，
+        预算还没有应用到下载器时只按常驻内存控制。
+        """
+        limit = self.max_active_tasks
+        if limit is None and self.memory_budget is not None:
+            limit = self.memory_budget.task_limit
+        while self.ready and (limit is None or self.running < limit):
+            # 没有正在运行的任务时总是启动一个，避免一直等待
+            if self.running and self.memory_budget is not None and self.memory_budget.over_budget():
+                break
+            task_id, downloader = self.ready.popleft()
+            self.queued.discard(task_id)
+            task = self.downloads.get(task_id)
+            if task is None or task['status'] in ('paused', 'cancelled', 'completed'):
+                continue
+            if task['thread'] is not None and task['thread'].is_alive():
+                continue
+            task['thread'] = self._new_thread(task_id, task, downloader)
+            self.running += 1
+            task['thread'].start()
+
+    def _evict(self, task_id):
+        """把已完成的任务移出内存，完整记录写入历史文件（调用方持有 self.lock）"""
+        task = self.downloads.pop(task_id)
+        self.evicted[task_id] = (task['video'].title, task['episode']['title'], task['save_dir'], task['save_path'])
+        self.task_store.append_history(task_id, task)
+            
+    def _is_output_complete(self, save_path):
+        """输出文件存在且清单中没有缺失或截断的分片（快速检查，不计算哈希）"""
+        integrity.adopt_output(save_path)
+        ok, _ = integrity.verify_output(save_path, full=False)
+        return ok
+
+    def _download_task(self, task_id, video, episode_index, save_dir, downloader):
+        """下载任务处理函数，受同时下载数上限约束"""
+        if self.ready is not None:
+            # 创建线程时已占用名额，退出时启动下一个等待的任务
+            try:
+                with self.lock:
+                    task = self.downloads.get(task_id)
+                    stop_event = task['stop_event'] if task is not None else None
+                if stop_event is not None:
+                    self._run_download_task(task_id, video, episode_index, save_dir, downloader, stop_event)
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self._dispatch()
+            return
+
+        with self.lock:
+            if task_id not in self.downloads:
+                return
+            stop_event = self.downloads[task_id]['stop_event']
+        self._run_download_task(task_id, video, episode_index, save_dir, downloader, stop_event)
+
+    def _run_download_task(self, task_id, video, episode_index, save_dir, downloader, stop_event):
+        """执行下载并处理重试"""
+        max_retries = 3  # 最大重试次数
+        retry_count = 0
+        
+        while retry_count < max_retries:
+            try:
+                with self.lock:
+                    if task_id not in self.downloads:
+                        return
+                    if stop_event.is_set():
+                        break
+                        
+                    if retry_count > 0:
+                        self.downloads[task_id]['status'] = 'retrying'
+                    else:
+                        self.downloads[task_id]['status'] = 'downloading'
+                    self.task_store.save_tasks(self.downloads)
+                    
+                # 同一视频的多个任务同时下载，不能依赖 Video.current_episode，直接按序号取剧集
+                if not 0 <= episode_index < len(video.episodes):
+                    with self.lock:
+                        if task_id not in self.downloads:
+                            return
+                        self.downloads[task_id]['status'] = 'failed'
+                        self.downloads[task_id]['error'] = '剧集不存在'
+                        self.task_store.save_tasks(self.downloads)
+                        return
+                        
+                # 设置下载管理器引用
+                downloader.set_download_manager(self)
+                
+                # 开始下载
+                play_url = video.episodes[episode_index]['url']
+                save_path = video.get_episode_path(save_dir, episode_index)
+                if self.backend is None:
+                    success = downloader.download_movie(play_url, save_path, stop_event=stop_event)
+                else:
+                    success = self.backend.download(downloader, play_url, save_path, stop_event,
+                                                    downloader._progress_reporter(save_path))
+                
+                with self.lock:
+                    if task_id not in self.downloads:
+                        return
+                    if stop_event.is_set():
+                        # 被暂停或取消，不再重试
+                        break
+                        
+                    if success:
+                        self.downloads[task_id]['status'] = 'completed'
+                        self.downloads[task_id]['progress'] = 100
+                        self.task_store.save_tasks(self.downloads)
+                        metrics.EPISODES.inc('completed')
+                        if self.memory_budget is not None:
+                            self._evict(task_id)
+                        return
+                    elif retry_count == max_retries - 1:
+                        # 如果是最后一次重试，标记为失败
+                        self.downloads[task_id]['status'] = 'failed'
+                        self.task_store.save_tasks(self.downloads)
+                        metrics.EPISODES.inc('failed')
+                        return
+                        
+            except Exception:
+                with self.lock:
+                    if task_id not in self.downloads:
+                        return
+                    # 如果是最后一次重试，标记为失败
+                    if retry_count == max_retries - 1:
+                        self.downloads[task_id]['status'] = 'failed'
+                        self.task_store.save_tasks(self.downloads)
+                        metrics.EPISODES.inc('failed')
+                        return
+            
+            # 如果到这里，说明下载失败，准备重试
+            retry_count += 1
+            if retry_count < max_retries:
+                metrics.TASK_RETRIES.inc()
+                if stop_event.wait(10):  # 等待10秒后重试
+                    break
+                with self.lock:
+                    if task_id not in self.downloads:
+                        return
+                    self.downloads[task_id]['status'] = f'等待重试 ({retry_count}/{max_retries-1})'
+                    self.task_store.save_tasks(self.downloads)
+        
+        self._cleanup_cancelled(task_id)
+
+    def _cleanup_cancelled(self, task_id):
+        """清理已取消任务的临时文件"""
+        with self.lock:
+            task = self.downloads.get(task_id)
+            if not task or task['status'] != 'cancelled' or not task.get('save_path'):
+                return
+            temp_dir = f"{task['save_path']}.downloading"
+            part = partial_path(task['save_path'])
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        if os.path.exists(part):
+            os.remove(part)
+
+    def pause_task(self, task_id):
+        """暂停任务，保留已下载的分片"""
+        return bool(self.pause_tasks([task_id]))
+
+    def pause_tasks(self, task_ids):
+        """批量暂停任务，返回被暂停的任务 ID 列表"""
+        with self.lock:
+            paused = []
+            for task_id in task_ids:
+                task = self.downloads.get(task_id)
+                if not task or task['status'] in ('completed', 'failed', 'cancelled', 'paused'):
+                    continue
+                task['status'] = 'paused'
+                task['speed'] = '-'
+                task['stop_event'].set()
+                paused.append(task_id)
+            if paused:
+                self.task_store.save_tasks(self.downloads)
+            return paused
+
+    def resume_task(self, task_id, downloader):
+        """继续已暂停或失败的任务"""
+        return bool(self.resume_tasks([task_id], downloader))
+
+    def resume_tasks(self, task_ids, downloader, front=False):
+        """批量继续已暂停或失败的任务，返回重新加入队列的任务 ID 列表"""
+        with self.lock:
+            old_threads = [self.downloads[task_id]['thread'] for task_id in task_ids
+                           if task_id in self.downloads
+                           and self.downloads[task_id]['status'] in ('paused', 'failed')]
+            
+        # 等待旧线程退出，避免两个线程同时写同一个临时目录
+        deadline = time.monotonic() + 30
+        for thread in old_threads:
+            if thread is not None and thread.is_alive():
+                thread.join(timeout=max(0, deadline - time.monotonic()))
+            
+        with self.lock:
+            resumed = []
+            for task_id in task_ids:
+                task = self.downloads.get(task_id)
+                if not task or task['status'] not in ('paused', 'failed'):
+                    continue
+                if task['thread'] is not None and task['thread'].is_alive():
+                    continue
+                task['stop_event'] = threading.Event()
+                task['status'] = 'pending'
+                task.pop('error', None)
+                resumed.append((task_id, task))
+            if resumed:
+                self._start_tasks(resumed, downloader, front)
+                self.task_store.save_tasks(self.downloads)
+            return [task_id for task_id, _ in resumed]
+
+    def retry_failed(self, downloader, task_ids=None):
+        """重新开始失败的任务（task_ids 为 None 时为全部失败的任务），返回重新加入队列的任务 ID 列表"""
+        with self.lock:
+            candidates = self.downloads if task_ids is None else task_ids
+            failed = [task_id for task_id in candidates
+                      if task_id in self.downloads and self.downloads[task_id]['status'] == 'failed']
+        return self.resume_tasks(failed, downloader)
+
+    def prioritize(self, task_ids):
+        """把等待中的任务按 task_ids 的顺序移到队列最前面，返回移动的任务 ID 列表"""
+        with self.lock:
+            if self.ready is None:
+                # 不限制同时下载数时所有任务都已开始
+                return []
+            wanted = [task_id for task_id in dict.fromkeys(task_ids) if task_id in self.queued]
+            if not wanted:
+                return []
+            moved = {}
+            rest = deque()
+            for entry in self.ready:
+                if entry[0] in moved or entry[0] not in wanted:
+                    rest.append(entry)
+                else:
+                    moved[entry[0]] = entry
+            rest.extendleft(reversed([moved[task_id] for task_id in wanted]))
+            self.ready = rest
+            return wanted
+
+    def cancel_task(self, task_id):
+        """取消任务并删除已下载的分片"""
+        return bool(self.cancel_tasks([task_id]))
+
+    def cancel_tasks(self, task_ids):
+        """批量取消任务并删除已下载的分片，返回被取消的任务 ID 列表"""
+        with self.lock:
+            cancelled = []
+            idle = []
+            for task_id in task_ids:
+                task = self.downloads.get(task_id)
+                if not task or task['status'] in ('completed', 'cancelled'):
+                    continue
+                task['status'] = 'cancelled'
+                task['speed'] = '-'
+                task['stop_event'].set()
+                cancelled.append(task_id)
+                if task['thread'] is None or not task['thread'].is_alive():
+                    idle.append(task_id)
+            if cancelled and self.ready is not None:
+                # 等待队列中被取消的任务不会再启动
+                removed = set(cancelled)
+                self.ready = deque(entry for entry in self.ready if entry[0] not in removed)
+                self.queued -= removed
+            if cancelled:
+                self.task_store.save_tasks(self.downloads)
+        
+        # 线程仍在运行时由线程退出前清理
+        for task_id in idle:
+            self._cleanup_cancelled(task_id)
+        return cancelled
+
+    def get_status(self):
+        """获取所有下载任务的状态"""
+        try:
+            with self.lock:
+                status = {
+                    task_id: {
+                        'status': 'completed',
+                        'progress': 100,
+                        'video': video,
+                        'episode': episode,
+                        'save_dir': save_dir,
+                        'save_path': save_path,
+                        'speed': '-'
+                    }
+                    for task_id, (video, episode, save_dir, save_path) in self.evicted.items()
+                }
+                status.update({
+                    task_id: {
+                        'status': info['status'],
+                        'progress': info['progress'],
+                        'video': info['video'].title,
+                        'episode': info['episode']['title'],
+                        'save_dir': info['save_dir'],
+                        'save_path': info['save_path'],
+                        'speed': info.get('speed', '-')
+                    }
+                    for task_id, info in self.downloads.items()
+                })
+                return status
+        except Exception as e:
+            self.console.print(f"[yellow]获取状态时出错: {str(e)}[/yellow]")
+            return {}
+
+    def snapshot(self):
+        """不加锁地复制任务状态，返回 [(任务 ID, 状态)]，供界面渲染使用
+
+        list(dict.items()) 和单个字段的读取都在持有 GIL 时一次完成，不会与下载线程冲突；
+        得到的状态可能比实际略旧，但渲染不会阻塞下载线程。
+        """
+        tasks = [(task_id, {'status': 'completed', 'progress': 100, 'speed': '-', 'video': video, 'episode': episode})
+                 for task_id, (video, episode, _, _) in list(self.evicted.items())]
+        for task_id, info in list(self.downloads.items()):
+            tasks.append((task_id, {
+                'status': info['status'],
+                'progress': info['progress'],
+                'speed': info.get('speed', '-'),
+                'video': info['video'].title,
+                'episode': info['episode']['title'],
+            }))
+        return tasks
+
+    def print_status(self):
+        """打印一次下载状态（第一页）"""
+        from .dashboard import StatusDashboard
+        try:
+            self.console.print(StatusDashboard(self, self.console).render())
+        except Exception as e:
+            self.console.print(f"[yellow]显示状态时出错: {str(e)}[/yellow]")
+            
+    def is_all_completed(self):
+        """检查是否所有任务都已完成"""
+        with self.lock:
+            return all(info['status'] in ['completed', 'failed', 'cancelled'] 
+                      for info in self.downloads.values())
+                      
+    def get_active_count(self):
+        """获取正在下载的任务数"""
+        with self.lock:
+            return sum(1 for info in self.downloads.values() 
+                      if info['status'] == 'downloading')
+                      
+    def get_pending_count(self):
+        """获取等待下载的任务数"""
+        with self.lock:
+            return sum(1 for info in self.downloads.values()
+                      if info['status'] == 'pending')
+
+
+def _list_dir(path):
+    """目录中的文件名集合，目录不存在时为空"""
+    try:
+        with os.scandir(path) as entries:
+            return {entry.name for entry in entries}
+    except OSError:
+        return set()
+
+
+class TaskStore:
+    """下载任务持久化存储"""
+    def __init__(self, store_path="download_tasks.json", console=None):
+        self.store_path = store_path
+        self.console = console or get_console()  # 输出控制台
+        
+    def save_tasks(self, downloads):
+        """保存下载任务到文件，store_path 为 None 时只在内存中保存"""
+        if self.store_path is None:
+            return
+        with metrics.TASK_STORE_SECONDS.time():
+            self._save_tasks(downloads)
+            
+    def _save_tasks(self, downloads):
+        try:
+            tasks = {}
+            for task_id, info in downloads.items():
+                # 只保存未完成和失败的任务，完成和取消的任务不保存
+                if info['status'] not in ('completed', 'cancelled'):
+                    tasks[task_id] = {
+                        'video_title': info['video'].title,
+                        'video_url': info['video'].detail_url,
+                        'episode_title': info['episode']['title'],
+                        'episode_url': info['episode']['url'],
+                        'save_dir': info['save_dir'],
+                        'save_path': info['save_path'],
+                        'status': info['status'],
+                        'progress': info['progress'],
+                        'created_at': info.get('created_at', datetime.now().isoformat())
+                    }
+            
+            # 如果没有需要保存的任务，且文件存在，则删除文件
+            if not tasks and os.path.exists(self.store_path):
+                os.remove(self.store_path)
+                return
+                
+            # 否则写入未完成和失败的任务
+            with open(self.store_path, 'w', encoding='utf-8') as f:
+                json.dump(tasks, f, ensure_ascii=False, indent=2)
+                
+        except Exception as e:
+            self.console.print(f"[red]保存任务失败: {str(e)}[/red]")
+            
+    def append_history(self, task_id, info):
+        """把移出内存的已完成任务追加到历史文件（store_path.history.jsonl）"""
+        if self.store_path is None:
+            return
+        record = {
+            'task_id': task_id,
+            'video_title': info['video'].title,
+            'video_url': info['video'].detail_url,
+            'episode_title': info['episode']['title'],
+            'episode_url': info['episode']['url'],
+            'save_dir': info['save_dir'],
+            'save_path': info['save_path'],
+            'status': info['status'],
+            'created_at': info.get('created_at'),
+            'finished_at': datetime.now().isoformat()
+        }
+        try:
+            with open(f"{self.store_path}.history.jsonl", 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except Exception as e:
+            self.console.print(f"[yellow]写入任务历史失败: {str(e)}[/yellow]")
+
+    def load_tasks(self):
+        """从文件加载任务"""
+        if self.store_path is None:
+            return {}
+        try:
+            # 检查文件是否存在
+            if not os.path.exists(self.store_path):
+                return {}
+                
+            # 检查文件大小
+            if os.path.getsize(self.store_path) == 0:
+                os.remove(self.store_path)
+                return {}
+                
+            try:
+                with open(self.store_path, 'r', encoding='utf-8') as f:
+                    tasks = json.load(f)
+                    
+                # 验证任务数据的完整性
+                valid_tasks = {}
+                for task_id, task_info in tasks.items():
+                    required_fields = [
+                        'video_title', 'video_url', 'episode_title', 'episode_url',
+                        'save_dir', 'save_path', 'status', 'progress'
+                    ]
+                    
+                    # 检查必需字段
+                    if all(field in task_info for field in required_fields):
+                        # 按清单检查文件是否已完成，被截断或下载中断的文件继续下载
+                        integrity.adopt_output(task_info['save_path'])
+                        if integrity.verify_output(task_info['save_path'], full=False)[0]:
+                            continue  # 跳过已完成的任务
+                            
+                        # 保留原始状态和进度
+                        valid_tasks[task_id] = task_info
+                    else:
+                        self.console.print(f"[yellow]跳过无效的任务记录: {task_id}[/yellow]")
+                
+                return valid_tasks
+                
+            except json.JSONDecodeError:
+                self.console.print("[yellow]任务文件格式错误，将重新创建[/yellow]")
+                os.remove(self.store_path)
+                return {}
+                
+        except Exception as e:
+            self.console.print(f"[red]加载任务失败: {str(e)}[/red]")
+            return {}
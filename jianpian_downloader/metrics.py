@@ -0,0 +1,332 @@
+"""下载流程的 Prometheus/OpenMetrics 指标
+
+只依赖标准库。指标默认注册在全局 REGISTRY 上，可以通过本地 /metrics
+接口提供给 Prometheus 抓取，也可以定期写入 node_exporter 的 textfile 目录。
+"""
+import os
+import time
+import bisect
+import weakref
+import threading
+from urllib.parse import urlsplit
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LONG_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _escape(value):
+    """转义标签值"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """指标基类，按标签值保存各个序列"""
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+        return tuple(str(v) for v in labels)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        with self.lock:
+            items = list(self.series.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def get(self, *labels):
+        with self.lock:
+            return self.series.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值，也可以在抓取时通过函数计算"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.function = None
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = value
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set_function(self, function):
+        """抓取时调用 function() 获取数值（仅限无标签指标）"""
+        self.function = function
+
+    def _samples(self):
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception:
+                return []
+            return [f"{self.name} {_format_value(value)}"]
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def get(self, *labels):
+        """返回 (总和, 次数)"""
+        with self.lock:
+            series = self.series.get(self._key(labels))
+            return (series[1], series[2]) if series else (0.0, 0)
+
+    def time(self, *labels):
+        """用作上下文管理器，记录代码块耗时"""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        with self.lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self.series.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.monotonic() - self.start, *self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """指标注册表"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """生成文本格式的全部指标"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """原子地写入 textfile，供 node_exporter 读取"""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+
+REGISTRY = MetricsRegistry()
+
+# 分片下载
+SEGMENT_SECONDS = REGISTRY.histogram(
+    'jianpian_segment_duration_seconds', '单个分片从请求到写完的耗时', ('host',))
+SEGMENT_BYTES = REGISTRY.counter(
+    'jianpian_segment_bytes_total', '已下载的分片字节数', ('host',))
+SEGMENT_FAILURES = REGISTRY.counter(
+    'jianpian_segment_failures_total', '下载失败的分片数', ('host',))
+ACTIVE_CONNECTIONS = REGISTRY.gauge(
+    'jianpian_active_segment_requests', '正在进行的分片请求数')
+DOWNLOAD_SPEED = REGISTRY.gauge(
+    'jianpian_download_speed_bytes', '所有任务当前的下载速度（字节/秒）')
+
+# HTTP 响应
+HTTP_RESPONSES = REGISTRY.counter(
+    'jianpian_http_responses_total', '按主机和状态码统计的 HTTP 响应数', ('host', 'code'))
+HTTP_RESPONSE_SECONDS = REGISTRY.histogram(
+    'jianpian_http_response_seconds', '收到响应头的耗时', ('host',))
+
+# 各阶段
+PLAYLIST_SECONDS = REGISTRY.histogram(
+    'jianpian_playlist_resolve_seconds', '解析播放页和 m3u8 播放列表的耗时')
+MERGE_SECONDS = REGISTRY.histogram(
+    'jianpian_merge_duration_seconds', '合并分片的耗时', buckets=LONG_BUCKETS)
+EPISODES = REGISTRY.counter(
+    'jianpian_episodes_total', '按结果统计的剧集下载次数', ('result',))
+
+# 任务管理
+TASK_RETRIES = REGISTRY.counter(
+    'jianpian_task_retries_total', '剧集下载的重试次数')
+QUEUE_DEPTH = REGISTRY.gauge(
+    'jianpian_queue_depth', '等待下载的任务数')
+ACTIVE_TASKS = REGISTRY.gauge(
+    'jianpian_active_tasks', '正在下载的任务数')
+TASK_STORE_SECONDS = REGISTRY.histogram(
+    'jianpian_task_store_save_seconds', '保存任务状态文件的耗时',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+
+_speed_monitors = weakref.WeakSet()
+_speed_lock = threading.Lock()
+
+
+def track_speed_monitor(monitor):
+    """登记速度监控器，抓取时汇总所有存活监控器的速度"""
+    with _speed_lock:
+        _speed_monitors.add(monitor)
+
+
+def _total_speed():
+    with _speed_lock:
+        monitors = list(_speed_monitors)
+    return sum(m.current_speed for m in monitors)
+
+
+DOWNLOAD_SPEED.set_function(_total_speed)
+
+
+def record_response(response, *args, **kwargs):
+    """requests 响应钩子，记录每个响应的主机、状态码和耗时"""
+    try:
+        host = urlsplit(response.url).hostname or '-'
+        HTTP_RESPONSES.inc(host, response.status_code)
+        if response.elapsed is not None:
+            HTTP_RESPONSE_SECONDS.observe(response.elapsed.total_seconds(), host)
+    except Exception:
+        pass
+    return response
+
+
+def start_metrics_server(port, host='127.0.0.1', registry=REGISTRY):
+    """在后台线程中提供 /metrics 接口，返回服务对象"""
+    # 只在需要时导入 http.server，避免拖慢命令行启动
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if urlsplit(self.path).path != '/metrics':
+                self.send_error(404)
+                return
+            body = self.server.registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def start_textfile_writer(path, interval=15, registry=REGISTRY):
+    """在后台线程中定期写入 textfile，返回用于停止的 Event"""
+    stop_event = threading.Event()
+
+    def loop():
+        # 停止后再写一次，保证最终数值落盘
+        while True:
+            try:
+                registry.write_textfile(path)
+            except OSError:
+                pass
+            if stop_event.is_set():
+                return
+            stop_event.wait(interval)
+
+    threading.Thread(target=loop, daemon=True).start()
+    return stop_event
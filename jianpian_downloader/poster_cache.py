@@ -0,0 +1,118 @@
+"""海报缓存
+
+搜索结果中的海报图片在后台下载到缓存目录，文件名为地址的 SHA-1。同时下载的数量不超过 max_workers，
+等待下载的数量不超过 max_pending（超出的直接丢弃，下次搜索时再尝试）；缓存总大小超过 max_bytes 时
+按修改时间删除最旧的文件。站点的 data-original 本身就是列表页用的缩略图，按原样保存。
+"""
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from . import metrics
+
+POSTER_FETCHES = metrics.REGISTRY.counter('jianpian_poster_fetches_total', '海报下载次数按结果统计', ['result'])
+
+MAX_POSTER_SIZE = 5 * 1024 * 1024  # 单张海报的大小上限
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+
+class PosterCache:
+    """在后台有限并发地下载海报"""
+    def __init__(self, cache_dir, session, headers=None, max_workers=4, max_pending=64, max_bytes=200 * 1024 ** 2):
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.session = session  # 复用下载器的连接池
+        self.headers = headers or {}
+        self.max_pending = max_pending
+        self.max_bytes = max_bytes  # 缓存总大小上限
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.pending = set()  # 等待或正在下载的地址
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='poster')
+        self.closed = False
+
+    def path(self, url):
+        """海报在缓存中的路径，还没有下载时返回 None"""
+        path = self._path(url)
+        return path if os.path.exists(path) else None
+
+    def _path(self, url):
+        ext = os.path.splitext(urlsplit(url).path)[1].lower()
+        if ext not in IMAGE_EXTENSIONS:
+            ext = '.jpg'
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + ext)
+
+    def prefetch(self, urls):
+        """把还没有缓存的海报加入下载队列，返回加入的数量"""
+        queued = 0
+        with self.lock:
+            for url in urls:
+                if self.closed or len(self.pending) >= self.max_pending:
+                    break
+                if not url or url in self.pending or os.path.exists(self._path(url)):
+                    continue
+                self.pending.add(url)
+                self.executor.submit(self._fetch, url)
+                queued += 1
+        if queued:
+            POSTER_FETCHES.inc('queued', amount=queued)
+        return queued
+
+    def _fetch(self, url):
+        path = self._path(url)
+        temp_path = f"{path}.{threading.get_ident()}.part"
+        try:
+            with self.session.get(url, headers=self.headers, timeout=10, stream=True) as response:
+                response.raise_for_status()
+                if not response.headers.get('Content-Type', 'image/').startswith('image/'):
+                    POSTER_FETCHES.inc('rejected')
+                    return
+                size = 0
+                with open(temp_path, 'wb') as f:
+                    for chunk in response.iter_content(64 * 1024):
+                        size += len(chunk)
+                        if size > MAX_POSTER_SIZE:
+                            raise IOError("海报过大")
+                        f.write(chunk)
+            os.replace(temp_path, path)
+            POSTER_FETCHES.inc('fetched')
+            self._trim()
+        except Exception:
+            POSTER_FETCHES.inc('failed')
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            with self.lock:
+                self.pending.discard(url)
+
+    def _trim(self):
+        """总大小超过上限时删除最旧的海报"""
+        files = []
+        total = 0
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith('.part'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(files):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self.lock:
+            return {'pending': len(self.pending)}
+
+    def close(self):
+        """不再接受新的下载，正在下载的海报在后台完成"""
+        with self.lock:
+            self.closed = True
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,554 @@
+"""MPEG-TS 转封装为分片 MP4（fMP4）
+
+HLS 的分片是 MPEG-TS，直接拼接后虽然以 .mp4 命名，播放器和媒体库扫描时仍要从头解析整个文件，
+拖动进度也很慢。TSRemuxer 在按顺序合并分片时逐个解析分片中的 H.264 视频和 AAC 音频，
+不转码，每个分片写成一个 moof + mdat 片段：
+
+    ftyp | moov（编码参数、时长） | moof mdat（第 1 个分片） | ... | mfra（各片段的时间和位置索引）
+
+moov 在读完第一个分片、得到 SPS/PPS 和音频参数后写入，时长在结束时回填；每个分片只读取一次，
+不需要额外遍历数据。不支持的编码（例如 HEVC、AC-3）在第一个分片时抛出 RemuxUnsupported，
+调用方改为直接拼接 TS。
+"""
+import struct
+import hashlib
+
+TS_PACKET_SIZE = 188
+STREAM_TYPE_AAC = 0x0F
+STREAM_TYPE_H264 = 0x1B
+# 其他视频、音频编码出现时不能只转封装 H.264/AAC
+UNSUPPORTED_STREAM_TYPES = {0x01, 0x02, 0x03, 0x04, 0x10, 0x11, 0x24, 0x81, 0x87}
+
+VIDEO_TIMESCALE = 90000
+SAMPLES_PER_AAC_FRAME = 1024
+AAC_SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+# H.264 中不放入样本的 NAL 单元：SPS、PPS（放在 avcC 中）、访问单元分隔符、填充数据
+SKIPPED_NAL_TYPES = {7, 8, 9, 12}
+HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+
+# trun 的 sample_flags
+SYNC_SAMPLE_FLAGS = 0x02000000
+NON_SYNC_SAMPLE_FLAGS = 0x01010000
+UNITY_MATRIX = (0x00010000, 0, 0, 0, 0x00010000, 0, 0, 0, 0x40000000)
+
+
+class RemuxError(Exception):
+    """分片无法解析"""
+
+
+class RemuxUnsupported(RemuxError):
+    """分片中的编码不支持转封装"""
+
+
+def box(kind, *payloads):
+    data = b''.join(payloads)
+    return struct.pack('>I4s', 8 + len(data), kind) + data
+
+
+def full_box(kind, version, flags, *payloads):
+    return box(kind, struct.pack('>I', (version << 24) | flags), *payloads)
+
+
+class _Bits:
+    """按位读取 SPS（已去除防竞争字节）"""
+    def __init__(self, data):
+        self.value = int.from_bytes(data, 'big')
+        self.size = len(data) * 8
+        self.pos = 0
+
+    def read(self, count):
+        if self.pos + count > self.size:
+            raise RemuxError("SPS 数据不完整")
+        self.pos += count
+        return (self.value >> (self.size - self.pos)) & ((1 << count) - 1)
+
+    def ue(self):
+        zeros = 0
+        while not self.read(1):
+            zeros += 1
+        return (1 << zeros) - 1 + self.read(zeros)
+
+    def se(self):
+        value = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+def _unescape(nal):
+    """去除 NAL 单元中的防竞争字节（00 00 03）"""
+    return nal.replace(b'\x00\x00\x03', b'\x00\x00')
+
+
+def parse_sps(sps):
+    """从 H.264 SPS 解析出画面的宽和高"""
+    bits = _Bits(_unescape(sps[1:]))
+    profile = bits.read(8)
+    bits.read(16)  # 约束标志和级别
+    bits.ue()  # seq_parameter_set_id
+    chroma_format = 1
+    if profile in HIGH_PROFILES:
+        chroma_format = bits.ue()
+        if chroma_format == 3:
+            bits.read(1)
+        bits.ue()
+        bits.ue()
+        bits.read(1)
+        if bits.read(1):  # seq_scaling_matrix_present_flag
+            for i in range(8 if chroma_format != 3 else 12):
+                if bits.read(1):
+                    last = next_scale = 8
+                    for _ in range(16 if i < 6 else 64):
+                        if next_scale:
+                            next_scale = (last + bits.se() + 256) % 256
+                        last = next_scale or last
+    bits.ue()  # log2_max_frame_num_minus4
+    poc_type = bits.ue()
+    if poc_type == 0:
+        bits.ue()
+    elif poc_type == 1:
+        bits.read(1)
+        bits.se()
+        bits.se()
+        for _ in range(bits.ue()):
+            bits.se()
+    bits.ue()  # max_num_ref_frames
+    bits.read(1)
+    width_mbs = bits.ue() + 1
+    height_units = bits.ue() + 1
+    frame_mbs_only = bits.read(1)
+    if not frame_mbs_only:
+        bits.read(1)
+    bits.read(1)
+    width = width_mbs * 16
+    height = (2 - frame_mbs_only) * height_units * 16
+    if bits.read(1):  # frame_cropping_flag
+        left, right, top, bottom = bits.ue(), bits.ue(), bits.ue(), bits.ue()
+        unit_x = 1 if chroma_format == 0 else 2
+        unit_y = (2 - frame_mbs_only) * (1 if chroma_format == 0 else 2)
+        width -= (left + right) * unit_x
+        height -= (top + bottom) * unit_y
+    return width, height
+
+
+def split_nal_units(data):
+    """按起始码拆分 Annex B 字节流"""
+    units = []
+    start = data.find(b'\x00\x00\x01')
+    while start != -1:
+        start += 3
+        end = data.find(b'\x00\x00\x01', start)
+        unit = data[start:end] if end != -1 else data[start:]
+        # 四字节起始码的前导 0 属于上一个单元的末尾
+        units.append(unit.rstrip(b'\x00') if end != -1 else unit)
+        start = end
+    return [unit for unit in units if unit]
+
+
+def _read_timestamp(data, offset):
+    return (((data[offset] >> 1) & 0x07) << 30 | data[offset + 1] << 22 | (data[offset + 2] >> 1) << 15
+            | data[offset + 3] << 7 | data[offset + 4] >> 1)
+
+
+class _Unwrapper:
+    """展开 33 位的 PTS/DTS 回绕"""
+    def __init__(self):
+        self.last = None
+        self.offset = 0
+
+    def __call__(self, value):
+        if value is None:
+            return None
+        value += self.offset
+        if self.last is not None and value < self.last - (1 << 32):
+            self.offset += 1 << 33
+            value += 1 << 33
+        self.last = value
+        return value
+
+
+class TSDemuxer:
+    """解析 TS 包，按 PID 组装 PES"""
+    def __init__(self):
+        self.pmt_pid = None
+        self.streams = {}  # PID -> stream_type
+        self.buffers = {}  # PID -> 正在组装的 PES 数据
+        self.carry = b''  # 不足一个包的剩余数据
+
+    def feed(self, data):
+        """输入任意长度的数据，返回已完成的 [(PID, pts, dts, 负载)]"""
+        if self.carry:
+            data = self.carry + bytes(data)
+        end = len(data) - len(data) % TS_PACKET_SIZE
+        self.carry = bytes(data[end:])
+        done = []
+        for offset in range(0, end, TS_PACKET_SIZE):
+            packet = data[offset:offset + TS_PACKET_SIZE]
+            if packet[0] != 0x47:
+                raise RemuxError("TS 同步字节错误")
+            pid = (packet[1] & 0x1F) << 8 | packet[2]
+            start = packet[1] & 0x40
+            control = (packet[3] >> 4) & 0x03
+            if not control & 0x01:
+                continue
+            payload_start = 4 + (packet[4] + 1 if control & 0x02 else 0)
+            if payload_start >= TS_PACKET_SIZE:
+                continue
+            payload = packet[payload_start:]
+            if pid == 0:
+                if start:
+                    self._parse_pat(bytes(payload))
+            elif pid == self.pmt_pid:
+                if start:
+                    self._parse_pmt(bytes(payload))
+            elif pid in self.streams:
+                if start:
+                    pes = self._finish(pid)
+                    if pes is not None:
+                        done.append(pes)
+                    self.buffers[pid] = bytearray(payload)
+                elif pid in self.buffers:
+                    self.buffers[pid] += payload
+        return done
+
+    def flush(self):
+        """分片结束时返回未完成的 PES"""
+        done = []
+        for pid in list(self.buffers):
+            pes = self._finish(pid)
+            if pes is not None:
+                done.append(pes)
+        self.carry = b''
+        return done
+
+    def _section(self, payload):
+        pointer = payload[0]
+        section = payload[1 + pointer:]
+        length = ((section[1] & 0x0F) << 8 | section[2]) + 3
+        return section[:length - 4]  # 去掉 CRC
+
+    def _parse_pat(self, payload):
+        section = self._section(payload)
+        for offset in range(8, len(section) - 3, 4):
+            program = section[offset] << 8 | section[offset + 1]
+            if program != 0:
+                self.pmt_pid = (section[offset + 2] & 0x1F) << 8 | section[offset + 3]
+                return
+
+    def _parse_pmt(self, payload):
+        section = self._section(payload)
+        info_length = (section[10] & 0x0F) << 8 | section[11]
+        offset = 12 + info_length
+        while offset + 5 <= len(section):
+            stream_type = section[offset]
+            pid = (section[offset + 1] & 0x1F) << 8 | section[offset + 2]
+            self.streams[pid] = stream_type
+            offset += 5 + ((section[offset + 3] & 0x0F) << 8 | section[offset + 4])
+
+    def _finish(self, pid):
+        data = self.buffers.pop(pid, None)
+        if not data or data[:3] != b'\x00\x00\x01' or len(data) < 9:
+            return None
+        flags = data[7]
+        pts = _read_timestamp(data, 9) if flags & 0x80 else None
+        dts = _read_timestamp(data, 14) if flags & 0xC0 == 0xC0 else pts
+        return pid, pts, dts, bytes(data[9 + data[8]:])
+
+
+class _VideoTrack:
+    """H.264 视频轨道"""
+    handler = b'vide'
+    timescale = VIDEO_TIMESCALE
+
+    def __init__(self, track_id):
+        self.track_id = track_id
+        self.sps = None
+        self.pps = None
+        self.unwrap = _Unwrapper()
+        self.samples = []  # 当前分片的 [dts, cto, 数据, 是否关键帧]
+        self.last_duration = 3000
+        self.end_time = 0  # 最后一个样本结束的时间
+
+    def add_pes(self, pts, dts, payload, base):
+        units = []
+        keyframe = False
+        for unit in split_nal_units(payload):
+            nal_type = unit[0] & 0x1F
+            if nal_type == 7 and self.sps is None:
+                self.sps = unit
+            elif nal_type == 8 and self.pps is None:
+                self.pps = unit
+            elif nal_type == 5:
+                keyframe = True
+            if nal_type not in SKIPPED_NAL_TYPES:
+                units.append(struct.pack('>I', len(unit)) + unit)
+        if not units:
+            return
+        dts = self.unwrap(dts)
+        pts = self.unwrap(pts) if pts is not None else dts
+        if dts is None:
+            # 没有时间戳的 PES 接在上一个样本之后
+            if not self.samples:
+                return
+            dts = self.samples[-1][0] + self.last_duration + base
+            pts = dts
+        self.samples.append([dts - base, pts - dts, b''.join(units), keyframe])
+
+    def take(self):
+        """取出当前分片的样本，返回 (起始时间, [(时长, 大小, 标志, cto)], 数据)"""
+        samples, self.samples = self.samples, []
+        if not samples:
+            return None
+        entries = []
+        for i, (dts, cto, data, keyframe) in enumerate(samples):
+            # 分片的最后一个样本沿用上一个样本的时长，下一个片段的 tfdt 会校正累计误差
+            duration = samples[i + 1][0] - dts if i + 1 < len(samples) else self.last_duration
+            if duration > 0:
+                self.last_duration = duration
+            entries.append((max(duration, 0), len(data), SYNC_SAMPLE_FLAGS if keyframe else NON_SYNC_SAMPLE_FLAGS, cto))
+        self.end_time = samples[-1][0] + self.last_duration
+        return samples[0][0], entries, b''.join(sample[2] for sample in samples)
+
+    def ready(self):
+        return self.sps is not None and self.pps is not None
+
+    def sample_entry(self):
+        width, height = parse_sps(self.sps)
+        avcc = box(b'avcC', bytes([1, self.sps[1], self.sps[2], self.sps[3], 0xFF, 0xE1]),
+                   struct.pack('>H', len(self.sps)), self.sps, b'\x01', struct.pack('>H', len(self.pps)), self.pps)
+        entry = box(b'avc1', bytes(6), struct.pack('>H', 1), bytes(16), struct.pack('>HH', width, height),
+                    struct.pack('>II', 0x00480000, 0x00480000), bytes(4), struct.pack('>H', 1), bytes(32),
+                    struct.pack('>Hh', 0x0018, -1), avcc)
+        return entry, width, height
+
+
+class _AudioTrack:
+    """AAC（ADTS）音频轨道"""
+    handler = b'soun'
+
+    def __init__(self, track_id):
+        self.track_id = track_id
+        self.config = None  # (profile, 采样率序号, 声道配置)
+        self.timescale = None
+        self.unwrap = _Unwrapper()
+        self.carry = b''  # 跨 PES 的不完整 ADTS 帧
+        self.next_time = None  # 下一帧的时间（采样率为单位）
+        self.samples = []  # 当前分片的 [时间, 数据]
+        self.end_time = 0
+
+    def add_pes(self, pts, dts, payload, base):
+        data = self.carry + payload if self.carry else payload
+        pts = self.unwrap(pts)
+        offset = 0
+        while offset + 7 <= len(data):
+            if data[offset] != 0xFF or data[offset + 1] & 0xF0 != 0xF0:
+                offset += 1
+                continue
+            header_size = 7 if data[offset + 1] & 0x01 else 9
+            frame_size = (data[offset + 3] & 0x03) << 11 | data[offset + 4] << 3 | data[offset + 5] >> 5
+            if frame_size < header_size:
+                offset += 1
+                continue
+            if offset + frame_size > len(data):
+                break
+            if self.config is None:
+                profile = (data[offset + 2] >> 6) + 1
+                rate_index = (data[offset + 2] >> 2) & 0x0F
+                channels = (data[offset + 2] & 0x01) << 2 | data[offset + 3] >> 6
+                if rate_index >= len(AAC_SAMPLE_RATES):
+                    raise RemuxError("不支持的 AAC 采样率")
+                self.config = (profile, rate_index, channels)
+                self.timescale = AAC_SAMPLE_RATES[rate_index]
+            if pts is not None:
+                expected = round((pts - base) * self.timescale / VIDEO_TIMESCALE)
+                # 与按帧累计的时间相差超过一帧时（例如不连续）以 PES 的时间戳为准
+                if self.next_time is None or abs(expected - self.next_time) > SAMPLES_PER_AAC_FRAME:
+                    self.next_time = max(expected, 0)
+                pts = None
+            if self.next_time is None:
+                self.next_time = 0
+            self.samples.append([self.next_time, data[offset + header_size:offset + frame_size]])
+            self.next_time += SAMPLES_PER_AAC_FRAME
+            offset += frame_size
+        self.carry = data[offset:]
+
+    def take(self):
+        samples, self.samples = self.samples, []
+        if not samples:
+            return None
+        entries = [(SAMPLES_PER_AAC_FRAME, len(data), SYNC_SAMPLE_FLAGS, 0) for _, data in samples]
+        self.end_time = samples[-1][0] + SAMPLES_PER_AAC_FRAME
+        return samples[0][0], entries, b''.join(data for _, data in samples)
+
+    def ready(self):
+        return self.config is not None
+
+    def sample_entry(self):
+        profile, rate_index, channels = self.config
+        specific = struct.pack('>H', profile << 11 | rate_index << 7 | channels << 3)
+        decoder_specific = b'\x05' + bytes([len(specific)]) + specific
+        decoder_config = bytes([0x40, 0x15]) + bytes(3) + bytes(8) + decoder_specific
+        decoder_config = b'\x04' + bytes([len(decoder_config)]) + decoder_config
+        es = struct.pack('>HB', 0, 0) + decoder_config + b'\x06\x01\x02'
+        esds = full_box(b'esds', 0, 0, b'\x03', bytes([len(es)]), es)
+        # samplerate 是 16.16 定点数，88.2/96kHz 放不下，按 ISO/IEC 14496-12 写 0，以 mdhd 的 timescale 为准
+        samplerate = self.timescale << 16 if self.timescale <= 0xFFFF else 0
+        entry = box(b'mp4a', bytes(6), struct.pack('>H', 1), bytes(8), struct.pack('>HH', channels or 2, 16),
+                    bytes(4), struct.pack('>I', samplerate), esds)
+        return entry, 0, 0
+
+
+class TSRemuxer:
+    """把按顺序输入的 TS 分片写成分片 MP4"""
+    def __init__(self, outfile):
+        self.outfile = outfile
+        self.demuxer = TSDemuxer()
+        self.tracks = {}  # PID -> 轨道
+        self.base = None  # 第一个分片中最小的时间戳（90kHz）
+        self.header_written = False
+        self.sequence = 0
+        self.index = []  # [(轨道, 起始时间, moof 偏移)]
+        self.mvhd_duration_offset = None
+        self.mehd_offset = None
+
+    def add_segment(self, infile, buffer=None, block_size=1024 * 1024):
+        """读取一个 TS 分片并写入对应的片段，返回 (偏移, 大小, SHA-256)；没有样本时大小为 0"""
+        pending = []
+        while True:
+            if buffer is not None:
+                read = infile.readinto(buffer)
+                block = buffer[:read]
+            else:
+                block = infile.read(block_size)
+                read = len(block)
+            if not read:
+                break
+            pending.extend(self.demuxer.feed(block))
+        pending.extend(self.demuxer.flush())
+        self._register_tracks()
+        if not self.tracks:
+            raise RemuxUnsupported("分片中没有节目表")
+
+        if self.base is None:
+            times = [dts for pid, _, dts, _ in pending if dts is not None and pid in self.tracks]
+            if not times:
+                raise RemuxError("第一个分片中没有时间戳")
+            self.base = min(times)
+        for pid, pts, dts, payload in pending:
+            track = self.tracks.get(pid)
+            if track is not None:
+                track.add_pes(pts, dts, payload, self.base)
+
+        if not self.header_written:
+            if not all(track.ready() for track in self.tracks.values()):
+                raise RemuxError("第一个分片中缺少编码参数")
+            self._write(self._header())
+            self.header_written = True
+
+        offset = self.outfile.tell()
+        fragment = self._fragment(offset)
+        if fragment is None:
+            return offset, 0, hashlib.sha256().hexdigest()
+        self._write(fragment)
+        return offset, len(fragment), hashlib.sha256(fragment).hexdigest()
+
+    def finish(self):
+        """写入 mfra 索引并回填时长"""
+        if not self.header_written:
+            return
+        self._write(self._mfra())
+        end = self.outfile.tell()
+        duration_ms = max((track.end_time * 1000 // track.timescale for track in self.tracks.values()), default=0)
+        self.outfile.seek(self.mvhd_duration_offset)
+        self.outfile.write(struct.pack('>I', min(duration_ms, 0xFFFFFFFF)))
+        self.outfile.seek(self.mehd_offset)
+        self.outfile.write(struct.pack('>Q', duration_ms))
+        self.outfile.seek(end)
+
+    def _write(self, data):
+        self.outfile.write(data)
+
+    def _register_tracks(self):
+        if self.tracks or not self.demuxer.streams:
+            return
+        streams = self.demuxer.streams
+        unsupported = [t for t in streams.values() if t in UNSUPPORTED_STREAM_TYPES]
+        if unsupported:
+            raise RemuxUnsupported(f"不支持的编码类型: {', '.join(hex(t) for t in unsupported)}")
+        track_id = 1
+        for pid, stream_type in sorted(streams.items(), key=lambda item: item[1] != STREAM_TYPE_H264):
+            if stream_type == STREAM_TYPE_H264:
+                self.tracks[pid] = _VideoTrack(track_id)
+            elif stream_type == STREAM_TYPE_AAC:
+                self.tracks[pid] = _AudioTrack(track_id)
+            else:
+                continue  # 字幕、ID3 等元数据流
+            track_id += 1
+        if not self.tracks:
+            raise RemuxUnsupported("没有 H.264 或 AAC 流")
+
+    def _header(self):
+        ftyp = box(b'ftyp', b'isom', struct.pack('>I', 0x200), b'isom', b'iso6', b'avc1', b'mp41')
+        tracks = list(self.tracks.values())
+        mvhd = full_box(b'mvhd', 0, 0, struct.pack('>IIII', 0, 0, 1000, 0), struct.pack('>IH', 0x00010000, 0x0100),
+                        bytes(10), struct.pack('>9I', *UNITY_MATRIX), bytes(24), struct.pack('>I', len(tracks) + 1))
+        mehd = full_box(b'mehd', 1, 0, struct.pack('>Q', 0))
+        trex = b''.join(full_box(b'trex', 0, 0, struct.pack('>IIIII', track.track_id, 1, 0, 0, 0)) for track in tracks)
+        moov = box(b'moov', mvhd, *(self._trak(track) for track in tracks), box(b'mvex', mehd, trex))
+        # 时长字段在结束时回填：mvhd 的 duration 位于 version/flags、两个时间和 timescale 之后
+        moov_start = len(ftyp)
+        self.mvhd_duration_offset = moov_start + 8 + 8 + 4 + 12
+        self.mehd_offset = moov_start + len(moov) - len(mehd) - len(trex) + 12
+        return ftyp + moov
+
+    def _trak(self, track):
+        entry, width, height = track.sample_entry()
+        volume = 0x0100 if track.handler == b'soun' else 0
+        tkhd = full_box(b'tkhd', 0, 3, struct.pack('>IIIII', 0, 0, track.track_id, 0, 0), bytes(8),
+                        struct.pack('>hhhH', 0, 0, volume, 0), struct.pack('>9I', *UNITY_MATRIX),
+                        struct.pack('>II', width << 16, height << 16))
+        mdhd = full_box(b'mdhd', 0, 0, struct.pack('>IIII', 0, 0, track.timescale, 0), struct.pack('>HH', 0x55C4, 0))
+        name = b'VideoHandler\x00' if track.handler == b'vide' else b'SoundHandler\x00'
+        hdlr = full_box(b'hdlr', 0, 0, bytes(4), track.handler, bytes(12), name)
+        media_header = full_box(b'vmhd', 0, 1, bytes(8)) if track.handler == b'vide' else full_box(b'smhd', 0, 0, bytes(4))
+        dinf = box(b'dinf', full_box(b'dref', 0, 0, struct.pack('>I', 1), full_box(b'url ', 0, 1)))
+        stbl = box(b'stbl', full_box(b'stsd', 0, 0, struct.pack('>I', 1), entry),
+                   full_box(b'stts', 0, 0, bytes(4)), full_box(b'stsc', 0, 0, bytes(4)),
+                   full_box(b'stsz', 0, 0, bytes(8)), full_box(b'stco', 0, 0, bytes(4)))
+        return box(b'trak', tkhd, box(b'mdia', mdhd, hdlr, box(b'minf', media_header, dinf, stbl)))
+
+    def _fragment(self, moof_offset):
+        parts = [(track, track.take()) for track in self.tracks.values()]
+        parts = [(track, part) for track, part in parts if part is not None]
+        if not parts:
+            return None
+        self.sequence += 1
+
+        def moof(data_offsets):
+            trafs = []
+            for (track, (start, entries, _)), data_offset in zip(parts, data_offsets):
+                tfhd = full_box(b'tfhd', 0, 0x020000, struct.pack('>I', track.track_id))
+                tfdt = full_box(b'tfdt', 1, 0, struct.pack('>Q', start))
+                rows = b''.join(struct.pack('>IIIi', *entry) for entry in entries)
+                trun = full_box(b'trun', 1, 0x000F01, struct.pack('>Ii', len(entries), data_offset), rows)
+                trafs.append(box(b'traf', tfhd, tfdt, trun))
+            return box(b'moof', full_box(b'mfhd', 0, 0, struct.pack('>I', self.sequence)), *trafs)
+
+        size = len(moof([0] * len(parts)))
+        offsets = []
+        position = size + 8
+        for _, (_, _, data) in parts:
+            offsets.append(position)
+            position += len(data)
+        for track, (start, _, _) in parts:
+            self.index.append((track, start, moof_offset))
+        mdat = box(b'mdat', *(data for _, (_, _, data) in parts))
+        return moof(offsets) + mdat
+
+    def _mfra(self):
+        tfras = []
+        for track in self.tracks.values():
+            entries = [struct.pack('>QQBBB', start, offset, 1, 1, 1)
+                       for entry_track, start, offset in self.index if entry_track is track]
+            tfras.append(full_box(b'tfra', 1, 0, struct.pack('>III', track.track_id, 0, len(entries)), *entries))
+        body = b''.join(tfras)
+        size = 8 + len(body) + 16
+        return box(b'mfra', body, full_box(b'mfro', 0, 0, struct.pack('>I', size)))
@@ -0,0 +1,223 @@
+"""本地搜索索引
+
+记录搜索结果和详情页信息中见过的所有视频，按字符 n-gram 建立倒排索引：中文标题按单字和相邻两字
+匹配，较长的标题打错个别字、少输入几个字也能找到；安装了 pypinyin 时同时索引标题的全拼和首字母，
+输入 kuangbiao 或 kb 可以找到《狂飙》。主演、导演等详情页信息也参与匹配，权重低于标题。
+
+MovieDownloader.search_cached 先从索引返回结果，同时在后台向站点重新搜索并更新索引；
+索引中没有结果时才等待远程搜索。传入 path 时索引保存到 SQLite，下次运行和其他用户可以直接使用。
+"""
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+
+from . import metrics
+from .video import Video
+
+SEARCH_LOOKUPS = metrics.REGISTRY.counter(
+    'jianpian_search_lookups_total', '搜索请求按结果来源统计（index 为本地索引，remote 为等待远程搜索）', ['source'])
+
+REFRESH_INTERVAL = 600  # 同一关键词两次后台刷新的最短间隔（秒）
+MIN_SCORE = 0.5  # 结果至少要达到的匹配比例（按字段权重计，见 query_grams）
+META_WEIGHT = 0.7  # 详情页信息（主演、导演等）匹配的权重，标题和拼音为 1
+META_FIELDS = ('actors', 'director', 'type', 'area', 'year')
+
+
+def normalize(text):
+    """统一全角半角和大小写，去掉空白和标点"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ''.join(ch for ch in text if ch.isalnum())
+
+
+def ngrams(text):
+    """单字和相邻两字"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def query_grams(text):
+    """查询使用的 [(n-gram 集合, 占总分的比例)]
+
+    相邻两字衡量顺序，汉字等非 ASCII 单字容忍错别字，各占一半；拼音和英文字母的单字区分度太低，
+    只按相邻两字匹配。只有一个字时直接按单字匹配。
+    """
+    pairs = {text[i:i + 2] for i in range(len(text) - 1)} or set(text)
+    chars = {ch for ch in text if not ch.isascii()}
+    if not chars:
+        return [(pairs, 1.0)]
+    return [(pairs, 0.5), (chars, 0.5)]
+
+
+_lazy_pinyin = None
+
+
+def pinyin_keys(title):
+    """标题的全拼和首字母，没有安装 pypinyin 时返回空列表"""
+    global _lazy_pinyin
+    if _lazy_pinyin is None:
+        try:
+            from pypinyin import lazy_pinyin as _lazy_pinyin
+        except ImportError:
+            _lazy_pinyin = False
+    if not _lazy_pinyin:
+        return []
+    syllables = [s for s in (normalize(s) for s in _lazy_pinyin(title)) if s]
+    if not syllables:
+        return []
+    return [''.join(syllables), ''.join(s[0] for s in syllables)]
+
+
+class SearchIndex:
+    """视频标题和详情页信息的倒排索引"""
+    def __init__(self, path=None, refresh_interval=REFRESH_INTERVAL):
+        self.path = path  # SQLite 文件，None 表示只保存在内存中
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.videos = {}  # 详情页地址 -> (标题, 海报地址, 详情页信息)
+        self.postings = {}  # n-gram -> {详情页地址: 权重}
+        self.titles = {}  # 详情页地址 -> 规范化的标题
+        self.refreshed = {}  # 关键词 -> 上次远程搜索的时间（time.time()）
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self.lock, self.db:
+                self.db.execute('PRAGMA journal_mode=WAL')
+                self.db.execute('CREATE TABLE IF NOT EXISTS videos (detail_url TEXT PRIMARY KEY, '
+                                'title TEXT NOT NULL, poster TEXT, info TEXT, updated_at REAL NOT NULL)')
+                self.db.execute('CREATE TABLE IF NOT EXISTS searches (keyword TEXT PRIMARY KEY, '
+                                'refreshed_at REAL NOT NULL)')
+                self._load()
+
+    def _load(self):
+        for url, title, poster, info in self.db.execute('SELECT detail_url, title, poster, info FROM videos'):
+            self._index(url, title, poster, json.loads(info) if info else {})
+        self.refreshed.update(self.db.execute('SELECT keyword, refreshed_at FROM searches'))
+
+    def _index(self, url, title, poster, info):
+        """建立或重建一个视频的索引（调用方持有 self.lock）"""
+        if url in self.videos:
+            self._unindex(url)
+        self.videos[url] = (title, poster, info)
+        self.titles[url] = normalize(title)
+        weights = {}
+        for key in [self.titles[url]] + pinyin_keys(title):
+            for gram in ngrams(key):
+                weights[gram] = 1.0
+        for field in META_FIELDS:
+            for gram in ngrams(normalize(str(info.get(field, '')))):
+                weights.setdefault(gram, META_WEIGHT)
+        for gram, weight in weights.items():
+            self.postings.setdefault(gram, {})[url] = weight
+
+    def _unindex(self, url):
+        title, _, info = self.videos[url]
+        keys = [self.titles[url]] + pinyin_keys(title) + [normalize(str(info.get(f, ''))) for f in META_FIELDS]
+        for key in keys:
+            for gram in ngrams(key):
+                posting = self.postings.get(gram)
+                if posting is not None:
+                    posting.pop(url, None)
+                    if not posting:
+                        del self.postings[gram]
+
+    def add_videos(self, videos):
+        """加入搜索结果中的视频，已有的详情页信息保留"""
+        rows = []
+        with self.lock:
+            for video in videos:
+                if not video.detail_url or not video.title:
+                    continue
+                old = self.videos.get(video.detail_url)
+                info = old[2] if old else {}
+                poster = video.poster or (old[1] if old else None)
+                if old and old[0] == video.title and old[1] == poster:
+                    continue
+                self._index(video.detail_url, video.title, poster, info)
+                rows.append((video.detail_url, video.title, poster, json.dumps(info, ensure_ascii=False)))
+            self._save(rows)
+
+    def add_info(self, detail_url, info):
+        """加入详情页信息（get_movie_info 的结果），没有标题且索引中没有该视频时忽略"""
+        with self.lock:
+            old = self.videos.get(detail_url)
+            title = info.get('title') or (old[0] if old else None)
+            if not title:
+                return
+            info = {field: info[field] for field in META_FIELDS if info.get(field)}
+            poster = old[1] if old else None
+            if old and old[0] == title and old[2] == info:
+                return
+            self._index(detail_url, title, poster, info)
+            self._save([(detail_url, title, poster, json.dumps(info, ensure_ascii=False))])
+
+    def _save(self, rows):
+        if self.db is None or not rows:
+            return
+        now = time.time()
+        try:
+            with self.db:
+                self.db.executemany('INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?)',
+                                    [row + (now,) for row in rows])
+        except sqlite3.Error:
+            # 数据库被其他进程锁住时只更新内存中的索引
+            pass
+
+    def search(self, keyword, limit=100):
+        """按相关度返回匹配的 Video 列表：完全相同的标题、包含关键词的标题、按 n-gram 匹配比例"""
+        query = normalize(keyword)
+        if not query:
+            return []
+        with self.lock:
+            scores = {}
+            for grams, share in query_grams(query):
+                for gram in grams:
+                    for url, weight in self.postings.get(gram, {}).items():
+                        scores[url] = scores.get(url, 0.0) + weight * share / len(grams)
+            ranked = []
+            for url, score in scores.items():
+                if score < MIN_SCORE:
+                    continue
+                title = self.titles[url]
+                if title == query:
+                    score += 2
+                elif query in title:
+                    score += 1
+                ranked.append((-score, len(title), url))
+            ranked.sort()
+            videos = []
+            for _, _, url in ranked[:limit]:
+                title, poster, _ = self.videos[url]
+                video = Video(title, url)
+                video.poster = poster
+                videos.append(video)
+        return videos
+
+    def needs_refresh(self, keyword):
+        """该关键词距离上次远程搜索是否已超过 refresh_interval"""
+        with self.lock:
+            return time.time() - self.refreshed.get(keyword, 0) >= self.refresh_interval
+
+    def mark_refreshed(self, keyword):
+        """记录该关键词刚完成一次远程搜索"""
+        now = time.time()
+        with self.lock:
+            self.refreshed[keyword] = now
+            if self.db is not None:
+                try:
+                    with self.db:
+                        self.db.execute('INSERT OR REPLACE INTO searches VALUES (?, ?)', (keyword, now))
+                except sqlite3.Error:
+                    pass
+
+    def stats(self):
+        with self.lock:
+            return {'videos': len(self.videos), 'grams': len(self.postings), 'keywords': len(self.refreshed)}
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
@@ -0,0 +1,233 @@
+"""内容寻址的分片缓存
+
+分片按 SHA-256 存放在 objects/ 目录下，SQLite 索引记录分片地址到内容摘要的映射、第一次下载时
+响应的验证信息（ETag、Last-Modified）以及每个对象的最近使用时间。总大小超过上限时按最近最少使用淘汰。
+
+站点可能在同一个地址上换成新的内容（例如重新编码后复用 0001.ts），所以缓存不能只按地址命中：
+请求分片时带上保存的验证信息（见 request_headers），服务器返回 304，或者返回的 ETag、Last-Modified
+与保存的相同（都没有时 Content-Length 与缓存的大小相同）才使用缓存，此时不读取响应正文，
+命中的分片用硬链接（或 reflink，再不行则复制）放入临时目录。不同剧集共用的片头、片尾和广告分片
+地址相同，同样可以命中。
+
+索引使用 SQLite 并通过原子重命名写入对象，多个进程或用户可以共享同一个缓存目录。
+"""
+import os
+import errno
+import shutil
+import sqlite3
+import hashlib
+import threading
+import time
+
+from . import metrics
+
+# Linux 上的 FICLONE ioctl，用于在支持的文件系统（btrfs、xfs）上做写时复制
+FICLONE = 0x40049409
+
+CACHE_HITS = metrics.REGISTRY.counter(
+    'jianpian_segment_cache_hits_total', '分片缓存命中次数')
+CACHE_MISSES = metrics.REGISTRY.counter(
+    'jianpian_segment_cache_misses_total', '分片缓存未命中次数')
+CACHE_BYTES_SAVED = metrics.REGISTRY.counter(
+    'jianpian_segment_cache_bytes_saved_total', '因缓存命中而免于下载的字节数')
+
+
+def parse_size(text):
+    """解析 500M、10G 这样的大小"""
+    text = str(text).strip().upper()
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    if text and text[-1] == 'B':
+        text = text[:-1]
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def _reflink(src, dst):
+    """尝试写时复制，不支持时抛出 OSError"""
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def link_or_copy(src, dst):
+    """依次尝试硬链接、reflink 和复制，把 src 放到 dst"""
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    try:
+        _reflink(src, dst)
+        return
+    except (OSError, ImportError):
+        if os.path.exists(dst):
+            os.remove(dst)
+    shutil.copyfile(src, dst)
+
+
+class SegmentCache:
+    """按内容寻址、按最近使用时间淘汰的分片缓存"""
+    def __init__(self, cache_dir, max_bytes=10 * 1024 ** 3):
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.objects_dir = os.path.join(self.cache_dir, 'objects')
+        self.max_bytes = max_bytes  # 缓存总大小上限
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(self.cache_dir, 'index.sqlite3'),
+                                  timeout=30, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('DROP TABLE IF EXISTS segments')  # 之前按播放列表区分的索引
+            self.db.execute('CREATE TABLE IF NOT EXISTS urls ('
+                            'url TEXT PRIMARY KEY, digest TEXT NOT NULL, etag TEXT, last_modified TEXT)')
+            columns = {row[1] for row in self.db.execute('PRAGMA table_info(urls)')}
+            for column in ('etag', 'last_modified'):
+                if column not in columns:
+                    # 旧版本的索引没有验证信息，这些条目只按 Content-Length 确认
+                    self.db.execute(f'ALTER TABLE urls ADD COLUMN {column} TEXT')
+            self.db.execute('CREATE TABLE IF NOT EXISTS objects ('
+                            'digest TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS objects_last_used ON objects(last_used)')
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _lookup(self, url):
+        """(摘要, 大小, etag, last_modified)，没有缓存时返回 None"""
+        with self.lock:
+            return self.db.execute(
+                'SELECT o.digest, o.size, u.etag, u.last_modified FROM urls u JOIN objects o ON o.digest = u.digest '
+                'WHERE u.url = ?', (url,)).fetchone()
+
+    def request_headers(self, url, headers):
+        """请求分片使用的请求头：缓存中有该地址时加上 If-None-Match / If-Modified-Since"""
+        entry = self._lookup(url)
+        if entry is None or not (entry[2] or entry[3]):
+            return headers
+        headers = dict(headers)
+        if entry[2]:
+            headers['If-None-Match'] = entry[2]
+        if entry[3]:
+            headers['If-Modified-Since'] = entry[3]
+        return headers
+
+    @staticmethod
+    def _unchanged(entry, response):
+        """response 表明服务器上的分片与缓存的相同"""
+        _, size, etag, last_modified = entry
+        if response.status_code == 304:
+            return True
+        if response.status_code != 200:
+            return False
+        headers = response.headers
+        if etag and headers.get('ETag'):
+            return headers['ETag'] == etag
+        if last_modified and headers.get('Last-Modified'):
+            return headers['Last-Modified'] == last_modified
+        length = headers.get('Content-Length')
+        encoding = headers.get('Content-Encoding', 'identity').lower()
+        return encoding == 'identity' and bool(length) and length.isdigit() and int(length) == size
+
+    def fetch(self, url, dest_path, response):
+        """服务器确认缓存仍然有效时把分片放到 dest_path，返回大小，否则返回 None
+
+        response 是用 request_headers 请求分片得到的响应（stream=True，还没有读取正文）。
+        """
+        entry = self._lookup(url)
+        if entry is None or not self._unchanged(entry, response):
+            CACHE_MISSES.inc()
+            return None
+
+        digest, size = entry[0], entry[1]
+        object_path = self._object_path(digest)
+        try:
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            if os.path.getsize(object_path) != size:
+                raise OSError(errno.EIO, "缓存对象大小与索引不符")
+            link_or_copy(object_path, dest_path)
+        except OSError:
+            # 对象已被其他进程淘汰或损坏，删除失效的索引
+            with self.lock, self.db:
+                self.db.execute('DELETE FROM urls WHERE digest = ?', (digest,))
+                self.db.execute('DELETE FROM objects WHERE digest = ?', (digest,))
+            CACHE_MISSES.inc()
+            return None
+
+        with self.lock, self.db:
+            self.db.execute('UPDATE objects SET last_used = ? WHERE digest = ?', (time.time(), digest))
+        CACHE_HITS.inc()
+        CACHE_BYTES_SAVED.inc(amount=size)
+        return size
+
+    def store(self, url, src_path, response=None):
+        """把下载完成的分片加入缓存并记录 response 中的验证信息，返回内容摘要"""
+        sha256 = hashlib.sha256()
+        size = 0
+        with open(src_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(block)
+                size += len(block)
+        digest = sha256.hexdigest()
+
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            temp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                link_or_copy(src_path, temp_path)
+                # 对象只读，防止通过硬链接被意外改写
+                os.chmod(temp_path, 0o444)
+                os.replace(temp_path, object_path)
+            except OSError as e:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                if e.errno != errno.EEXIST:
+                    raise
+
+        headers = response.headers if response is not None else {}
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO objects (digest, size, last_used) VALUES (?, ?, ?)',
+                            (digest, size, time.time()))
+            self.db.execute('INSERT OR REPLACE INTO urls (url, digest, etag, last_modified) VALUES (?, ?, ?, ?)',
+                            (url, digest, headers.get('ETag'), headers.get('Last-Modified')))
+        self.evict()
+        return digest
+
+    def total_size(self):
+        with self.lock:
+            return self.db.execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+
+    def evict(self):
+        """总大小超过上限时按最近使用时间淘汰对象"""
+        total = self.total_size()
+        if total <= self.max_bytes:
+            return 0
+        removed = 0
+        with self.lock:
+            rows = self.db.execute('SELECT digest, size FROM objects ORDER BY last_used').fetchall()
+        for digest, size in rows:
+            if total <= self.max_bytes:
+                break
+            with self.lock, self.db:
+                self.db.execute('DELETE FROM urls WHERE digest = ?', (digest,))
+                self.db.execute('DELETE FROM objects WHERE digest = ?', (digest,))
+            try:
+                os.remove(self._object_path(digest))
+            except OSError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self):
+        """缓存统计"""
+        with self.lock:
+            objects, size = self.db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects').fetchone()
+            urls = self.db.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+        return {'objects': objects, 'urls': urls, 'bytes': size, 'max_bytes': self.max_bytes}
+
+    def close(self):
+        with self.lock:
+            self.db.close()
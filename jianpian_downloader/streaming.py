@@ -0,0 +1,127 @@
+"""按播放顺序写入输出文件
+
+SegmentWriter 按分片序号依次把下载好的分片写入输出文件（直接拼接 TS，设置了 remux 时转封装为
+分片 MP4），同时记录清单需要的偏移、大小和 SHA-256。
+
+写入过程中输出先写到 <输出文件>.part，全部分片写完后才改名为输出文件，中断时不会留下看起来已完成的文件。
+普通模式下所有分片下载完成后一次写入；边下边播模式下每完成一个分片就把从下一个待写入分片开始
+连续完成的部分追加到 .part 文件并刷新，播放器可以在下载开始几秒后打开这个正在增长的文件。
+分片在临时目录中保留到整集完成，中断后重新开始时按已下载的分片重写 .part 文件。
+"""
+import os
+import threading
+
+from . import integrity, remux
+
+
+class MergeAborted(Exception):
+    """合并被中止（例如集群节点失去了合并租约），输出文件没有改名"""
+
+
+def partial_path(path):
+    """写入过程中的输出文件"""
+    return f"{path}.part"
+
+
+class SegmentWriter:
+    """按分片顺序写入输出文件"""
+    def __init__(self, path, temp_dir, segment_urls, use_remux=False, buffer=None, console=None, disk_writer=None):
+        self.path = path
+        self.partial_path = partial_path(path)  # 写入中的文件，finish 时改名为 path
+        self.temp_dir = temp_dir  # 下载分片的临时目录，分片文件名为 <序号>.ts
+        self.segment_urls = segment_urls
+        self.buffer = buffer  # 复制和解复用使用的缓冲区，None 时按块读取
+        self.console = console
+        self.disk_writer = disk_writer  # diskio.DiskWriter，决定输出是否使用 O_DIRECT 以及是否 fsync
+        self.lock = threading.Lock()
+        self.entries = []  # 已写入的分片记录，缺失的分片记为 missing
+        self.done = set()  # 已下载完成的分片序号
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if use_remux or disk_writer is None:
+            # 转封装需要回填文件头，不能使用只能顺序写入的 O_DIRECT 文件
+            self.outfile = open(self.partial_path, 'wb')
+        else:
+            self.outfile = disk_writer.open_output(self.partial_path, console)
+        self.remuxer = remux.TSRemuxer(self.outfile) if use_remux else None
+
+    @property
+    def written(self):
+        """已写入的分片数"""
+        return len(self.entries)
+
+    def mark_done(self, index):
+        """分片 index 已下载完成，写入从下一个待写入分片开始连续完成的分片，返回已写入的分片数"""
+        with self.lock:
+            self.done.add(index)
+            start = len(self.entries)
+            while len(self.entries) in self.done:
+                self._append(len(self.entries))
+            if len(self.entries) > start:
+                self.outfile.flush()
+            return len(self.entries)
+
+    def finish(self, should_stop=None):
+        """写入剩余的分片，关闭文件并改名为输出文件，返回 (分片记录, 文件大小, 容器格式)
+
+        should_stop() 为 True 时停止写入并抛出 MergeAborted，已写入的内容留在 .part 文件中。
+        """
+        def check():
+            if should_stop is not None and should_stop():
+                self.outfile.close()
+                raise MergeAborted("合并被中止")
+
+        with self.lock:
+            while len(self.entries) < len(self.segment_urls):
+                check()
+                self._append(len(self.entries))
+            if self.remuxer is not None:
+                self.remuxer.finish()
+            total_size = self.outfile.tell()
+            self.outfile.close()
+            if self.disk_writer is not None:
+                self.disk_writer.sync_path(self.partial_path)
+            check()
+            os.replace(self.partial_path, self.path)
+            return self.entries, total_size, 'ts' if self.remuxer is None else 'mp4'
+
+    def close(self):
+        """放弃写入（被停止或出错时），已写入的内容保留在 .part 文件中"""
+        with self.lock:
+            if not self.outfile.closed:
+                self.outfile.close()
+
+    def _segment_path(self, index):
+        return os.path.join(self.temp_dir, f"{index:05d}.ts")
+
+    def _append(self, index):
+        url = self.segment_urls[index]
+        ts_path = self._segment_path(index)
+        if not os.path.exists(ts_path):
+            self.entries.append({'url': url, 'offset': self.outfile.tell(), 'size': 0, 'sha256': None,
+                                 'missing': True})
+            return
+        with open(ts_path, 'rb') as infile:
+            if self.remuxer is not None:
+                try:
+                    offset, size, digest = self.remuxer.add_segment(infile, self.buffer)
+                    self.entries.append({'url': url, 'offset': offset, 'size': size, 'sha256': digest})
+                    return
+                except remux.RemuxError as e:
+                    self._fall_back_to_ts(e)
+                    infile.seek(0)
+            offset = self.outfile.tell()
+            # 分块复制并计算哈希，内存占用与分片大小无关
+            size, digest = integrity.copy_hashed(infile, self.outfile, buffer=self.buffer)
+        self.entries.append({'url': url, 'offset': offset, 'size': size, 'sha256': digest})
+
+    def _fall_back_to_ts(self, error):
+        """分片无法转封装时从头改为直接拼接 TS"""
+        if self.console is not None:
+            self.console.print(f"[yellow]无法转封装为 MP4（{str(error)}），改为直接合并 TS[/yellow]")
+        self.remuxer = None
+        self.outfile.seek(0)
+        self.outfile.truncate()
+        count = len(self.entries)
+        self.entries = []
+        for index in range(count):
+            self._append(index)
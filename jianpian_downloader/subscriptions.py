@@ -0,0 +1,212 @@
+"""剧集订阅
+
+SubscriptionStore 把关注的剧集（详情页地址）保存到 JSON 文件；SubscriptionWatcher 按间隔
+轮询这些详情页（带随机抖动，避免所有订阅同时请求），发现新剧集时只把新剧集加入 DownloadManager。
+
+每个订阅记录详情页的 ETag / Last-Modified，轮询时发送条件请求，页面没有变化（304）时
+只有几百字节的响应头，也不需要解析。页面有变化时先截取 stui-content__playlist 剧集列表
+这一段计算指纹，与上次相同（只有推荐、广告等其他部分变化）时同样不解析；指纹不同时才解析
+剧集列表，并按播放地址找出新剧集。
+"""
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+import concurrent.futures
+from datetime import datetime
+
+from . import metrics
+from .http_cache import ACCEPT_ENCODING, CONDITIONAL_REQUESTS, HTTP_BYTES_SAVED, wire_size
+from .video import Video, extract_episodes
+
+SUBSCRIPTION_CHECKS = metrics.REGISTRY.counter(
+    'jianpian_subscription_checks_total', '订阅轮询次数', ['result'])
+SUBSCRIPTION_NEW_EPISODES = metrics.REGISTRY.counter(
+    'jianpian_subscription_new_episodes_total', '订阅发现并加入下载的新剧集数')
+
+PLAYLIST_PATTERN = re.compile(
+    r'<ul[^>]*class="[^"]*\bstui-content__playlist\b[^"]*"[^>]*>.*?</ul>', re.S)
+
+
+def playlist_fragment(html):
+    """截取剧集列表的 HTML 片段，找不到时返回整个页面"""
+    match = PLAYLIST_PATTERN.search(html)
+    return match.group(0) if match else html
+
+
+def fingerprint(fragment):
+    return hashlib.sha256(fragment.encode('utf-8')).hexdigest()
+
+
+class SubscriptionStore:
+    """订阅列表持久化存储"""
+    def __init__(self, store_path="subscriptions.json"):
+        self.store_path = store_path
+        self.lock = threading.Lock()
+        self.subscriptions = self._load()  # 详情页地址 -> 订阅记录
+
+    def _load(self):
+        if not os.path.exists(self.store_path):
+            return {}
+        with open(self.store_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"订阅文件格式错误: {self.store_path}")
+        return data
+
+    def save(self):
+        """原子地写入订阅文件"""
+        with self.lock:
+            data = json.dumps(self.subscriptions, ensure_ascii=False, indent=2)
+        temp_path = f"{self.store_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(temp_path, self.store_path)
+
+    def add(self, video, output, backfill=False):
+        """订阅视频，backfill 为 False 时已有的剧集视为已下载，只下载之后更新的剧集
+
+        已订阅时更新标题和保存目录，返回是否为新订阅。
+        """
+        with self.lock:
+            existing = self.subscriptions.get(video.detail_url)
+            if existing is not None:
+                existing.update(title=video.title, output=output)
+                return False
+            self.subscriptions[video.detail_url] = {
+                'title': video.title,
+                'output': output,
+                'known': [] if backfill else [episode['url'] for episode in video.episodes],
+                'fingerprint': None,
+                'etag': None,
+                'last_modified': None,
+                'size': 0,
+                'added_at': datetime.now().isoformat(),
+                'last_checked': None,
+                'next_check': 0,
+                'error': None,
+            }
+            return True
+
+    def remove(self, detail_url):
+        with self.lock:
+            return self.subscriptions.pop(detail_url, None) is not None
+
+    def items(self):
+        with self.lock:
+            return list(self.subscriptions.items())
+
+
+class SubscriptionWatcher:
+    """定期检查订阅的详情页，把新剧集加入下载队列"""
+    def __init__(self, downloader, download_manager, store, interval=3600, jitter=0.1, workers=8,
+                 on_new=None):
+        self.downloader = downloader
+        self.download_manager = download_manager
+        self.store = store
+        self.interval = interval  # 轮询间隔（秒）
+        self.jitter = jitter  # 间隔的随机浮动比例
+        self.workers = workers  # 同时检查的订阅数
+        self.on_new = on_new  # on_new(video, 新剧集索引列表)
+        self.random = random.Random()
+
+    def _next_check(self, now):
+        return now + self.interval * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def check(self, detail_url, subscription):
+        """检查一个订阅，返回加入下载的新剧集数"""
+        headers = dict(self.downloader.headers)
+        headers['Accept-Encoding'] = ACCEPT_ENCODING
+        if subscription['etag']:
+            headers['If-None-Match'] = subscription['etag']
+        if subscription['last_modified']:
+            headers['If-Modified-Since'] = subscription['last_modified']
+        conditional = 'If-None-Match' in headers or 'If-Modified-Since' in headers
+
+        response = self.downloader.session.get(detail_url, headers=headers, timeout=30)
+        if response.status_code == 304 and conditional:
+            CONDITIONAL_REQUESTS.inc('not_modified')
+            HTTP_BYTES_SAVED.inc('not_modified', amount=subscription['size'])
+            SUBSCRIPTION_CHECKS.inc('not_modified')
+            return 0
+        response.raise_for_status()
+        if conditional:
+            CONDITIONAL_REQUESTS.inc('modified')
+        subscription['etag'] = response.headers.get('ETag')
+        subscription['last_modified'] = response.headers.get('Last-Modified')
+        text = response.text
+        size = wire_size(response)
+        subscription['size'] = size if size is not None else len(response.content)
+
+        fragment = playlist_fragment(text)
+        digest = fingerprint(fragment)
+        if digest == subscription['fingerprint']:
+            SUBSCRIPTION_CHECKS.inc('unchanged')
+            return 0
+
+        episodes = extract_episodes(fragment, self.downloader.base_url)
+        if not episodes:
+            raise ValueError("未找到剧集列表")
+        subscription['fingerprint'] = digest
+        known = set(subscription['known'])
+        new_indexes = [i for i, episode in enumerate(episodes) if episode['url'] not in known]
+        if not new_indexes:
+            SUBSCRIPTION_CHECKS.inc('unchanged')
+            return 0
+
+        video = Video(subscription['title'], detail_url)
+        video.episodes = episodes
+        save_dir = os.path.abspath(os.path.expanduser(subscription['output']))
+        added = set(self.download_manager.add_downloads(video, new_indexes, save_dir, self.downloader))
+        accepted = [i for i in new_indexes if self.download_manager.task_id(video, i) in added]
+        # 没有加入的剧集与其他任务的 ID 冲突，其中已经下载完成的同样视为已知
+        known_indexes = accepted + [i for i in new_indexes if i not in accepted
+                                    and self.download_manager.is_episode_completed(video, i)]
+        subscription['known'].extend(episodes[index]['url'] for index in known_indexes)
+        if len(known_indexes) < len(new_indexes):
+            # 其余剧集下次检查时重试，不能因为 304 或指纹相同而跳过
+            subscription['fingerprint'] = subscription['etag'] = subscription['last_modified'] = None
+        if not accepted:
+            SUBSCRIPTION_CHECKS.inc('unchanged')
+            return 0
+        SUBSCRIPTION_CHECKS.inc('new')
+        SUBSCRIPTION_NEW_EPISODES.inc(amount=len(accepted))
+        if self.on_new is not None:
+            self.on_new(video, accepted)
+        return len(accepted)
+
+    def poll_due(self):
+        """检查所有到期的订阅，返回 {详情页地址: 新剧集数}"""
+        now = time.time()
+        due = [(url, sub) for url, sub in self.store.items() if sub['next_check'] <= now]
+        if not due:
+            return {}
+
+        def run(item):
+            url, subscription = item
+            try:
+                count = self.check(url, subscription)
+                subscription['error'] = None
+            except Exception as e:
+                SUBSCRIPTION_CHECKS.inc('error')
+                subscription['error'] = str(e)
+                count = 0
+            subscription['last_checked'] = datetime.now().isoformat()
+            subscription['next_check'] = self._next_check(time.time())
+            return url, count
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(due)))) as executor:
+            results = dict(executor.map(run, due))
+        self.store.save()
+        return results
+
+    def run(self, stop_event):
+        """持续轮询，直到 stop_event 被设置"""
+        while not stop_event.is_set():
+            self.poll_due()
+            pending = [sub['next_check'] for _, sub in self.store.items()]
+            wait = min(pending) - time.time() if pending else self.interval
+            stop_event.wait(min(max(wait, 1), 60))
@@ -0,0 +1,206 @@
+"""下载各阶段的追踪与采样分析
+
+Tracer 记录带耗时的 span，可导出为 Chrome trace JSON（在 chrome://tracing 或
+Perfetto 中打开）。默认关闭，关闭时 span() 返回空操作对象，几乎没有开销。
+
+SamplingProfiler 在后台线程中定期采样被标记线程的调用栈，只在 profile_region()
+包住的代码块（例如分片读取循环）内采样，结果以 folded stacks 格式输出，可直接交给
+flamegraph.pl 或 speedscope 生成火焰图。
+"""
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+
+class _NoopSpan:
+    """追踪关闭时使用的空 span"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def set(self, **args):
+        """补充 span 参数，例如下载完成后的字节数"""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer._record(self.name, self.category, self.start, end, self.args)
+        return False
+
+
+class Tracer:
+    """记录各阶段耗时的追踪器"""
+    def __init__(self, max_events=1000000):
+        self.enabled = False
+        self.max_events = max_events  # 最多保留的事件数，防止长时间运行占满内存
+        self.lock = threading.Lock()
+        self.events = []
+        self.thread_names = {}
+        self.origin = time.perf_counter()
+        self.dropped = 0
+
+    def enable(self):
+        self.origin = time.perf_counter()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self.lock:
+            self.events = []
+            self.thread_names = {}
+            self.dropped = 0
+
+    def span(self, name, category='download', **args):
+        """返回一个记录代码块耗时的上下文管理器"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, category, args)
+
+    def _record(self, name, category, start, end, args):
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round((start - self.origin) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+            'pid': os.getpid(),
+            'tid': thread.ident,
+        }
+        if args:
+            event['args'] = {k: v if isinstance(v, (int, float, bool)) else str(v) for k, v in args.items()}
+        with self.lock:
+            if len(self.events) >= self.max_events:
+                self.dropped += 1
+                return
+            self.events.append(event)
+            self.thread_names.setdefault(thread.ident, thread.name)
+
+    def export_chrome_trace(self, path):
+        """导出为 Chrome trace JSON 文件"""
+        with self.lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+            dropped = self.dropped
+        pid = os.getpid()
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in thread_names.items()
+        ]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'traceEvents': metadata + events,
+                'displayTimeUnit': 'ms',
+                'otherData': {'dropped_events': dropped},
+            }, f, ensure_ascii=False)
+
+
+class SamplingProfiler:
+    """按固定间隔采样被标记线程的调用栈"""
+    def __init__(self, interval=0.005):
+        self.interval = interval  # 采样间隔（秒）
+        self.lock = threading.Lock()
+        self.active = {}  # 线程 ID -> 区域名称
+        self.samples = Counter()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    @contextmanager
+    def region(self, name):
+        """标记当前线程在该代码块内需要采样"""
+        ident = threading.get_ident()
+        with self.lock:
+            self.active[ident] = name
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.active.pop(ident, None)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            with self.lock:
+                active = dict(self.active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, region in active.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(region)
+                with self.lock:
+                    self.samples[';'.join(reversed(stack))] += 1
+
+    def write_folded(self, path):
+        """以 folded stacks 格式写出采样结果"""
+        with self.lock:
+            samples = self.samples.most_common()
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in samples:
+                f.write(f"{stack} {count}\n")
+
+
+TRACER = Tracer()
+PROFILER = None  # 调用 enable_profiler() 后才会创建
+
+
+def enable_profiler(interval=0.005):
+    """开启采样分析并返回分析器"""
+    global PROFILER
+    if PROFILER is None:
+        PROFILER = SamplingProfiler(interval)
+        PROFILER.start()
+    return PROFILER
+
+
+def profile_region(name):
+    """采样分析开启时标记代码块，未开启时为空操作"""
+    if PROFILER is None:
+        return _NOOP_SPAN
+    return PROFILER.region(name)
@@ -0,0 +1,134 @@
+"""视频与剧集"""
+import os
+import re
+from urllib.parse import urljoin
+
+from .tracing import TRACER
+
+
+class Video:
+    """视频对象"""
+    def __init__(self, title, detail_url):
+        self.title = title  # 视频标题
+        self.detail_url = detail_url  # 详情页URL
+        self.episodes = []  # 剧集列表
+        self.current_episode = None  # 当前选中的剧集
+        self.poster = None  # 海报URL
+        
+    def get_episodes(self, downloader):
+        """获取剧集列表"""
+        with TRACER.span('get_episodes', category='metadata', url=self.detail_url):
+            return self._get_episodes(downloader)
+            
+    def _get_episodes(self, downloader):
+        try:
+            if not self.detail_url:
+                return False
+            
+            text = downloader.fetch_text(self.detail_url)
+            episodes = extract_episodes(text, downloader.base_url)
+            if episodes:
+                self.episodes = episodes
+                return True
+            
+            return False
+            
+        except Exception:
+            return False
+        
+    def select_episode(self, index):
+        """选择剧集"""
+        if 0 <= index < len(self.episodes):
+            self.current_episode = self.episodes[index]
+            return True
+        return False
+        
+    def get_episode_path(self, save_dir, episode_index):
+        """获取剧集的保存路径"""
+        if 0 <= episode_index < len(self.episodes):
+            # 如果没有指定保存路径，使用默认路径
+            if save_dir is None:
+                save_dir = "downloads"
+                
+            # 创建保存路径（如果不存在）
+            save_dir = os.path.expanduser(save_dir)  # 展开用户路径（如果有~）
+            save_dir = os.path.abspath(save_dir)     # 转换为绝对路径
+                
+            # 构建完整的保存路径
+            video_dir = os.path.join(save_dir, re.sub(r'[<>:"/\\|?*]', '', self.title))
+            return os.path.join(video_dir, f"{self.episodes[episode_index]['title']}.mp4")
+        return None
+        
+    def download(self, downloader, save_dir=None, stop_event=None):
+        """下载当前选中的剧集"""
+        if not self.current_episode:
+            downloader.console.print("[yellow]请先选择要下载的剧集[/yellow]")
+            return False
+            
+        # 如果没有指定保存路径，使用默认路径
+        if save_dir is None:
+            save_dir = "downloads"
+            
+        # 创建保存路径（如果不存在）
+        save_dir = os.path.expanduser(save_dir)  # 展开用户路径（如果有~）
+        save_dir = os.path.abspath(save_dir)     # 转换为绝对路径
+            
+        # 构建完整的保存路径
+        video_dir = os.path.join(save_dir, re.sub(r'[<>:"/\\|?*]', '', self.title))
+        save_path = os.path.join(video_dir, f"{self.current_episode['title']}.mp4")
+            
+        return downloader.download_movie(self.current_episode['url'], save_path, stop_event=stop_event)
+
+
+def extract_episodes(html, base_url):
+    """从详情页（或其中的剧集列表片段）解析剧集列表，没有剧集列表时返回空列表"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    episode_list = soup.find('ul', class_='stui-content__playlist')
+    if not episode_list:
+        return []
+    
+    episodes = []
+    for item in episode_list.find_all('li'):
+        link = item.find('a')
+        if link:
+            episodes.append({
+                'title': link.text.strip(),
+                'url': urljoin(base_url, link['href'])
+            })
+    return episodes
+
+
+def parse_episode_ranges(input_str, max_episodes):
+    """解析剧集范围
+    支持格式:
+    - 单个数字: "1"
+    - 逗号分隔: "1,2,3"
+    - 范围: "1-3"
+    - 合: "1-3,5,7-9"
+    """
+    result = set()
+    try:
+        # 按逗号分割，同时支持中文逗号
+        parts = input_str.replace('，', ',').split(',')
+        for part in parts:
+            part = part.strip()
+            if '-' in part:
+                # 处理范围
+                start, end = map(int, part.split('-'))
+                if start > end:
+                    start, end = end, start
+                if start < 1 or end > max_episodes:
+                    raise ValueError(f"剧集范围 {start}-{end} 超出有效范围 1-{max_episodes}")
+                result.update(range(start-1, end))
+            else:
+                # 处理单个数字
+                num = int(part)
+                if num < 1 or num > max_episodes:
+                    raise ValueError(f"剧集 {num} 超出有效范围 1-{max_episodes}")
+                result.add(num-1)
+        return sorted(list(result))
+    except ValueError as e:
+        if str(e).startswith("剧集"):
+            raise
+        raise ValueError("输入格式无效，请使用数字、逗号和连字符，例如: 1-3,5,7-9")
@@ -0,0 +1,129 @@
+"""多进程下载后端
+
+线程后端中，所有剧集的分片读取、哈希、合并都和界面渲染共用一个 GIL，多核机器上只能用满一个核。
+ProcessBackend 把每集的 download_movie 放到独立的工作进程中执行：工作进程按下载器的配置
+重新创建 MovieDownloader（连接池、分片缓存各自独立），进度和速度通过管道发回主进程，
+主进程只负责更新任务状态和渲染界面；暂停、取消通过跨进程的 Event 通知工作进程。
+"""
+import multiprocessing
+import threading
+
+# 使用 spawn 启动工作进程，避免在多线程进程中 fork 带来的锁状态问题
+_CONTEXT = multiprocessing.get_context('spawn')
+
+
+def downloader_config(downloader):
+    """提取在工作进程中重建下载器所需的参数"""
+    cache = downloader.segment_cache
+    return {
+        'max_workers': downloader.max_workers,
+        'base_url': downloader.base_url,
+        'headers': dict(downloader.headers),
+        'segment_cache': (cache.cache_dir, cache.max_bytes) if cache is not None else None,
+        'http_cache': downloader.http_cache.path,
+        'dns': (downloader.dns_cache.ttl, downloader.dns_cache.prefer),
+        'prewarm_connections': downloader.prewarm_connections,
+        'http2': downloader.http2,
+        'host_health': downloader.host_health.path,
+        'disk': (downloader.disk_writer.fsync_every, downloader.disk_writer.fsync_interval,
+                 downloader.disk_writer.direct, downloader.disk_writer.coalesce_size),
+        'remux': downloader.remux,
+        'stream_mode': downloader.stream_mode,
+        'live_options': downloader.live_options,
+    }
+
+
+def _worker_main(config, play_url, save_path, stop_event, conn):
+    """工作进程入口：下载一集并通过管道回报进度和结果"""
+    from rich.console import Console
+    from .downloader import MovieDownloader
+
+    segment_cache = None
+    if config['segment_cache']:
+        from .segment_cache import SegmentCache
+        segment_cache = SegmentCache(*config['segment_cache'])
+
+    http_cache = None
+    if config['http_cache']:
+        from .http_cache import ValidatorCache
+        http_cache = ValidatorCache(config['http_cache'])
+
+    from .dns_cache import DNSCache
+    from .diskio import DiskWriter
+    from .host_health import HostHealth
+    ttl, prefer = config['dns']
+    fsync_every, fsync_interval, direct, coalesce_size = config['disk']
+
+    downloader = MovieDownloader(max_workers=config['max_workers'], console=Console(stderr=True),
+                                 base_url=config['base_url'], segment_cache=segment_cache,
+                                 http_cache=http_cache, dns_cache=DNSCache(ttl=ttl, prefer=prefer),
+                                 http2=config['http2'], host_health=HostHealth(config['host_health']),
+                                 disk_writer=DiskWriter(fsync_every, fsync_interval, direct, coalesce_size))
+    downloader.prewarm_connections = config['prewarm_connections']
+    downloader.remux = config['remux']
+    downloader.stream_mode = config['stream_mode']
+    downloader.headers.update(config['headers'])
+    downloader.live_options = config['live_options']
+    downloader.progress_callback = lambda progress, speed: conn.send(('progress', progress, speed))
+
+    success = False
+    try:
+        success = downloader.download_movie(play_url, save_path, stop_event=stop_event)
+    finally:
+        try:
+            conn.send(('result', bool(success)))
+        except (OSError, ValueError):
+            pass
+        conn.close()
+        if segment_cache is not None:
+            segment_cache.close()
+        downloader.http_cache.close()
+        downloader.host_health.close()
+
+
+class ProcessBackend:
+    """在独立进程中下载剧集，主进程按管道中的进度快照更新任务状态"""
+    def __init__(self, poll_interval=0.5):
+        self.poll_interval = poll_interval  # 检查停止请求和读取进度的间隔（秒）
+
+    def download(self, downloader, play_url, save_path, stop_event, report_progress):
+        """在工作进程中下载一集，阻塞到完成，返回是否成功"""
+        process_stop = _CONTEXT.Event()
+        parent_conn, child_conn = _CONTEXT.Pipe(duplex=False)
+        process = _CONTEXT.Process(
+            target=_worker_main,
+            args=(downloader_config(downloader), play_url, save_path, process_stop, child_conn),
+            name=f"download-{threading.current_thread().name}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+
+        success = False
+        try:
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    process_stop.set()
+                if downloader.stop_flag:
+                    process_stop.set()
+                try:
+                    if not parent_conn.poll(self.poll_interval):
+                        if not process.is_alive():
+                            break
+                        continue
+                    message = parent_conn.recv()
+                except (EOFError, OSError):
+                    # 工作进程异常退出，管道已关闭
+                    break
+                if message[0] == 'progress':
+                    report_progress(message[1], message[2])
+                elif message[0] == 'result':
+                    success = message[1]
+                    break
+        finally:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            parent_conn.close()
+        return success
@@ -31,11 +31,14 @@ setup(
         "beautifulsoup4>=4.12.0",
         "m3u8>=3.6.0",
         "rich>=13.7.0",
-        "tqdm>=4.66.0",
     ],
+    extras_require={
+        "http2": ["httpx[http2]>=0.24"],
+        "pinyin": ["pypinyin>=0.49"],
+    },
     entry_points={
         "console_scripts": [
-            "jianpian-dl=jianpian_downloader.movie_downloader:main",
+            "jianpian-dl=jianpian_downloader:main",
         ],
     },
 )
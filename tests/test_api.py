@@ -0,0 +1,144 @@
+import os
+import time
+import asyncio
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from jianpian_downloader.api import AsyncClient, Client
+from jianpian_downloader.video import Video
+
+SEGMENT = b'\x47' + b'\x00' * 187
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    """两集、每集两个分片的站点"""
+    def do_GET(self):
+        host = self.headers['Host']
+        if self.path == '/detail/1.html':
+            body = ('<ul class="stui-content__playlist">'
+                    '<li><a href="/play/1-1.html">第1集</a></li><li><a href="/play/1-2.html">第2集</a></li></ul>')
+        elif self.path.startswith('/play/1-'):
+            ep = self.path[len('/play/1-'):-len('.html')]
+            body = f'<script>var player_aaaa={{"url":"http:\\/\\/{host}\\/hls\\/{ep}.m3u8"}}</script>'
+        elif self.path.endswith('.m3u8'):
+            body = ('#EXTM3U\n#EXT-X-TARGETDURATION:1\n#EXTINF:1.0,\n0.ts\n#EXTINF:1.0,\n1.ts\n'
+                    '#EXT-X-ENDLIST\n')
+        elif self.path.endswith('.ts'):
+            time.sleep(self.server.delay)
+            self._send(SEGMENT)
+            return
+        else:
+            self.send_error(404)
+            return
+        self._send(body.encode('utf-8'))
+
+    def _send(self, body):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _SiteHandler)
+        self.server.daemon_threads = True
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def _options(self):
+        return dict(output=self.dir.name, workers=2, base_url=self.base_url, poll_interval=0.05)
+
+    def _video(self):
+        return Video('剧', f'{self.base_url}/detail/1.html')
+
+
+class ClientTest(_ClientTestCase):
+    def test_enqueue_and_wait(self):
+        with Client(**self._options()) as client:
+            video = client.resolve(self._video())
+            task_ids = client.enqueue(video, '1-2')
+            self.assertEqual(task_ids, ['剧_0', '剧_1'])
+            results = client.wait(task_ids, timeout=30)
+            self.assertEqual({info['status'] for info in results.values()}, {'completed'})
+            with open(os.path.join(self.dir.name, '剧', '第2集.mp4'), 'rb') as f:
+                self.assertEqual(f.read(), SEGMENT * 2)
+            # 已在队列中的剧集返回原有的任务 ID，可以继续等待
+            self.assertEqual(client.enqueue(video, [1]), ['剧_1'])
+            self.assertEqual(list(client.wait(['剧_1'], timeout=5)), ['剧_1'])
+
+    def test_enqueue_skips_conflicting_task(self):
+        with Client(**self._options()) as client:
+            video = client.resolve(self._video())
+            client.enqueue(video, [0])
+            client.wait(timeout=30)
+            with client.manager.lock:
+                client.manager.downloads['剧_0']['status'] = 'failed'
+            # 插入新剧集后，新剧集的任务 ID 与第 1 集失败的任务相同
+            video.episodes.insert(0, {'title': '番外', 'url': f'{self.base_url}/play/1-9.html'})
+            self.assertEqual(client.enqueue(video, [0]), [])
+
+    def test_events_until_finished(self):
+        with Client(**self._options()) as client:
+            task_ids = client.enqueue(client.resolve(self._video()), 'all')
+            finished = [event['task_id'] for event in client.events(task_ids, timeout=30)
+                        if event['event'] == 'finished']
+            self.assertEqual(sorted(finished), task_ids)
+            self.assertEqual(client.subscribers, [])
+
+
+class AsyncClientTest(_ClientTestCase):
+    def test_events_stop_when_caller_breaks(self):
+        self.server.delay = 0.5
+
+        async def main():
+            async with AsyncClient(**self._options()) as client:
+                video = await client.resolve(self._video())
+                task_ids = await client.enqueue(video, 'all')
+                async for event in client.events(task_ids):
+                    break
+                # 提前退出的异步生成器由事件循环关闭
+                for _ in range(100):
+                    if not client.client.subscribers:
+                        break
+                    await asyncio.sleep(0.02)
+                self.assertEqual(client.client.subscribers, [])
+                results = await client.wait(task_ids, timeout=30)
+                self.assertEqual({info['status'] for info in results.values()}, {'completed'})
+
+        asyncio.run(asyncio.wait_for(main(), 60))
+
+    def test_cancelled_events_are_cleaned_up(self):
+        self.server.delay = 0.5
+
+        async def consume(client, task_ids):
+            async for event in client.events(task_ids):
+                pass
+
+        async def main():
+            async with AsyncClient(**self._options()) as client:
+                task_ids = await client.enqueue(await client.resolve(self._video()), 'all')
+                consumer = asyncio.ensure_future(consume(client, task_ids))
+                await asyncio.sleep(0.2)
+                consumer.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await consumer
+                self.assertEqual(client.client.subscribers, [])
+
+        asyncio.run(asyncio.wait_for(main(), 60))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rich.console import Console
+
+from jianpian_downloader.cluster import ClusterNode, Coordinator, SQLiteCoordinator
+from jianpian_downloader.diskio import DiskWriter
+from jianpian_downloader.downloader import MovieDownloader
+
+SEGMENT = b'\x47' + b'\x00' * 187
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp2t')
+        self.send_header('Content-Length', str(len(SEGMENT)))
+        self.end_headers()
+        self.wfile.write(SEGMENT)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _RecordingCoordinator(SQLiteCoordinator):
+    """记录标记分片完成时所在的线程"""
+    def __init__(self, path):
+        super().__init__(path)
+        self.completed_on = []
+
+    def complete_segment(self, episode_id, index, node_id):
+        self.completed_on.append(threading.current_thread().name)
+        super().complete_segment(episode_id, index, node_id)
+
+
+class _LostLeaseCoordinator(SQLiteCoordinator):
+    """合并租约在续租时已被其他节点接手"""
+    def renew_merge(self, episode_id, node_id, lease):
+        return False
+
+
+class SQLiteCoordinatorTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.coordinator = SQLiteCoordinator(os.path.join(self.dir.name, 'cluster.sqlite3'))
+        self.coordinator.submit('ep1', 'http://example.com/play/1-1.html', os.path.join(self.dir.name, 'ep1.mp4'))
+        self.coordinator.register_segments('ep1', 'http://example.com/index.m3u8',
+                                           ['http://example.com/0.ts', 'http://example.com/1.ts'])
+
+    def tearDown(self):
+        self.coordinator.close()
+        self.dir.cleanup()
+
+    def _download_all(self, node_id):
+        for index, _ in self.coordinator.claim_segments('ep1', node_id, 10, lease=60):
+            self.coordinator.complete_segment('ep1', index, node_id)
+
+    def test_coordinator_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Coordinator()
+
+    def test_only_one_node_merges(self):
+        self._download_all('a')
+        self.assertTrue(self.coordinator.claim_merge('ep1', 'a', lease=60))
+        self.assertFalse(self.coordinator.claim_merge('ep1', 'b', lease=60))
+        self.assertIsNone(self.coordinator.next_episode())
+
+    def test_expired_merge_is_reclaimed(self):
+        self._download_all('a')
+        self.assertTrue(self.coordinator.claim_merge('ep1', 'a', lease=0.05))
+        # 节点 a 在合并中退出，租约到期前其他节点不能接手
+        self.assertFalse(self.coordinator.claim_merge('ep1', 'b', lease=60))
+        time.sleep(0.1)
+        self.assertTrue(self.coordinator.has_unfinished())
+        self.assertEqual(self.coordinator.next_episode()['id'], 'ep1')
+        self.assertTrue(self.coordinator.claim_merge('ep1', 'b', lease=60))
+        self.assertFalse(self.coordinator.renew_merge('ep1', 'a', lease=60))
+        self.assertTrue(self.coordinator.renew_merge('ep1', 'b', lease=60))
+        self.coordinator.finish_episode('ep1', True)
+        self.assertFalse(self.coordinator.has_unfinished())
+
+
+class ClusterNodeTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.dir = tempfile.TemporaryDirectory()
+        self.save_path = os.path.join(self.dir.name, 'ep1.mp4')
+        # fsync 只在 flush 时进行，分片写完后要等很久才会自动 fsync
+        self.downloader = MovieDownloader(max_workers=2, console=Console(quiet=True), base_url=self.base_url,
+                                          disk_writer=DiskWriter(fsync_every=1000, fsync_interval=1000))
+
+    def tearDown(self):
+        self.downloader.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def _coordinator(self, cls, count):
+        coordinator = cls(os.path.join(self.dir.name, 'cluster.sqlite3'))
+        coordinator.submit('ep1', f'{self.base_url}/play.html', self.save_path)
+        coordinator.register_segments('ep1', f'{self.base_url}/index.m3u8',
+                                      [f'{self.base_url}/{i}.ts' for i in range(count)])
+        self.addCleanup(coordinator.close)
+        return coordinator
+
+    def test_segments_complete_after_fsync(self):
+        coordinator = self._coordinator(_RecordingCoordinator, 4)
+        node = ClusterNode(self.downloader, coordinator, node_id='a')
+        node.work_episode(coordinator.next_episode(), threading.Event())
+        self.assertEqual(coordinator.completed_on, ['disk-sync'] * 4)
+        self.assertEqual(coordinator.episodes()[0]['status'], 'completed')
+        with open(self.save_path, 'rb') as f:
+            self.assertEqual(f.read(), SEGMENT * 4)
+
+    def test_merge_aborts_when_lease_is_lost(self):
+        coordinator = self._coordinator(_LostLeaseCoordinator, 200)
+        temp_dir = f'{self.save_path}.downloading'
+        os.makedirs(temp_dir)
+        for index, _ in coordinator.claim_segments('ep1', 'a', 200, lease=60):
+            with open(os.path.join(temp_dir, f'{index:05d}.ts'), 'wb') as f:
+                f.write(SEGMENT * 100)
+            coordinator.complete_segment('ep1', index, 'a')
+        node = ClusterNode(self.downloader, coordinator, node_id='a', lease=0.003)
+        episode = coordinator.next_episode()
+        self.assertTrue(coordinator.claim_merge('ep1', 'a', node.lease))
+        node._merge(episode)
+        # 没有改名为输出文件，也没有标记结果，分片留给接手的节点
+        self.assertFalse(os.path.exists(self.save_path))
+        self.assertEqual(coordinator.episodes()[0]['status'], 'merging')
+        self.assertTrue(os.path.isdir(f'{self.save_path}.downloading'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import socket
+import threading
+import unittest
+import http.client
+
+from rich.console import Console
+
+from jianpian_downloader.daemon import DaemonHTTPServer, DownloadService
+from jianpian_downloader.downloader import MovieDownloader
+from jianpian_downloader.manager import DownloadManager
+
+
+class DaemonRequestTest(unittest.TestCase):
+    def setUp(self):
+        console = Console(quiet=True)
+        self.downloader = MovieDownloader(max_workers=2, console=console, base_url='http://127.0.0.1:9')
+        service = DownloadService(self.downloader, DownloadManager(store_path=None, console=console))
+        self.server = DaemonHTTPServer(('127.0.0.1', 0), service)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.port = self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.downloader.session.close()
+
+    def _request(self, method, path, body=None, headers=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        try:
+            # skip_host 以便测试伪造的 Host
+            connection.putrequest(method, path, skip_host=True, skip_accept_encoding=True)
+            headers = dict({'Host': f'127.0.0.1:{self.port}'}, **(headers or {}))
+            data = json.dumps(body).encode('utf-8') if body is not None else b''
+            headers['Content-Length'] = str(len(data))
+            for name, value in headers.items():
+                connection.putheader(name, value)
+            connection.endheaders(data)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            connection.close()
+
+    def test_local_requests(self):
+        self.assertEqual(self._request('GET', '/health'), (200, {'status': 'ok'}))
+        status, data = self._request('POST', '/tasks/batch', {'action': 'retry'},
+                                     {'Content-Type': 'application/json; charset=utf-8',
+                                      'Origin': f'http://localhost:{self.port}'})
+        self.assertEqual((status, data['task_ids']), (200, []))
+
+    def test_rebound_host_is_rejected(self):
+        status, _ = self._request('GET', '/tasks', headers={'Host': f'attacker.example:{self.port}'})
+        self.assertEqual(status, 403)
+
+    def test_cross_site_post_is_rejected(self):
+        status, _ = self._request('POST', '/tasks/batch', {'action': 'retry'},
+                                  {'Content-Type': 'application/json', 'Origin': 'http://attacker.example'})
+        self.assertEqual(status, 403)
+        # 浏览器不经预检可以发送的表单类型
+        status, _ = self._request('POST', '/tasks/batch', {'action': 'retry'}, {'Content-Type': 'text/plain'})
+        self.assertEqual(status, 415)
+
+
+class DaemonServerTest(unittest.TestCase):
+    def test_ipv6_does_not_change_class(self):
+        try:
+            server = DaemonHTTPServer(('::1', 0), None)
+        except OSError:
+            self.skipTest('没有 IPv6')
+        server.server_close()
+        self.assertEqual(server.address_family, socket.AF_INET6)
+        self.assertEqual(DaemonHTTPServer.address_family, socket.AF_INET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import socket
+import threading
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from jianpian_downloader.dns_cache import DNSCache, DNSCachingAdapter, happy_eyeballs_connect, interleave
+
+V4 = (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 80))
+V6 = (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('::1', 80, 0, 0))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _closed_port():
+    """一个没有监听的本机端口"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class InterleaveTest(unittest.TestCase):
+    def test_alternates_families(self):
+        self.assertEqual(interleave([V6, V6, V4, V4]), [V6, V4, V6, V4])
+        self.assertEqual(interleave([V6, V4, V4], prefer='ipv4'), [V4, V6, V4])
+        self.assertEqual(interleave([]), [])
+
+
+class DNSCacheTest(unittest.TestCase):
+    def test_resolves_once_per_ttl(self):
+        cache = DNSCache(ttl=300)
+        with mock.patch('socket.getaddrinfo', return_value=[V4]) as getaddrinfo:
+            threads = [threading.Thread(target=cache.resolve, args=('cdn.example', 443)) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(cache.resolve('cdn.example', 443), [V4])
+        self.assertEqual(getaddrinfo.call_count, 1)
+
+    def test_stale_result_on_failure(self):
+        cache = DNSCache(ttl=0, stale_ttl=60)
+        with mock.patch('socket.getaddrinfo', return_value=[V4]):
+            cache.resolve('cdn.example', 443)
+        with mock.patch('socket.getaddrinfo', side_effect=socket.gaierror('失败')):
+            self.assertEqual(cache.resolve('cdn.example', 443), [V4])
+            with self.assertRaises(socket.gaierror):
+                cache.resolve('other.example', 443)
+
+
+class HappyEyeballsTest(unittest.TestCase):
+    def setUp(self):
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(8)
+        self.port = self.listener.getsockname()[1]
+
+    def tearDown(self):
+        self.listener.close()
+
+    def _address(self, port):
+        return (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', port))
+
+    def test_falls_back_to_next_address(self):
+        sock = happy_eyeballs_connect([self._address(_closed_port()), self._address(self.port)], timeout=5)
+        try:
+            self.assertEqual(sock.getpeername(), ('127.0.0.1', self.port))
+            self.assertEqual(sock.gettimeout(), 5)
+        finally:
+            sock.close()
+
+    def test_all_addresses_fail(self):
+        with self.assertRaises(OSError):
+            happy_eyeballs_connect([self._address(_closed_port())], timeout=5)
+
+
+class DNSCachingAdapterTest(unittest.TestCase):
+    def test_requests_use_cache(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+        cache = DNSCache(prefer='ipv4')
+        session = requests.Session()
+        session.mount('http://', DNSCachingAdapter(cache))
+        try:
+            self.assertEqual(session.get(f'http://localhost:{port}/', timeout=5).text, 'ok')
+            self.assertIn(('localhost', port), cache.entries)
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import io
+import gzip
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rich.console import Console
+
+from jianpian_downloader.downloader import MAX_CHUNK_SIZE, MIN_CHUNK_SIZE, MovieDownloader
+from jianpian_downloader.lowmem import BufferPool
+
+BODY = bytes(range(256)) * (4 * 1024 * 1024 // 256)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = BODY
+        self.send_response(200)
+        if self.path == '/gzip.ts':
+            body = gzip.compress(BODY)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _RecordingFile(io.BytesIO):
+    """记录每次写入的大小"""
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(len(data))
+        return super().write(data)
+
+
+class StreamSegmentTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.downloader = MovieDownloader(max_workers=2, console=Console(quiet=True), base_url=self.base_url)
+
+    def tearDown(self):
+        self.downloader.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _stream(self, path, should_stop=lambda: False):
+        response = self.downloader.session.get(f'{self.base_url}{path}', stream=True, timeout=10)
+        outfile = _RecordingFile()
+        reported = []
+        size = self.downloader._stream_segment(response, outfile, should_stop, reported.append)
+        response.close()
+        return size, outfile, reported
+
+    def test_readinto_grows_chunks(self):
+        size, outfile, reported = self._stream('/plain.ts')
+        self.assertEqual(size, len(BODY))
+        self.assertEqual(outfile.getvalue(), BODY)
+        # 从 64KB 开始，读满时逐步放大到 1MB
+        self.assertEqual(outfile.writes[0], MIN_CHUNK_SIZE)
+        self.assertEqual(max(outfile.writes), MAX_CHUNK_SIZE)
+        # 速度统计按批累计，总量不变
+        self.assertEqual(sum(reported), len(BODY))
+        self.assertLess(len(reported), len(outfile.writes))
+
+    def test_pooled_buffer_limits_chunks(self):
+        self.downloader.buffer_pool = BufferPool(1, size=256 * 1024)
+        size, outfile, _ = self._stream('/plain.ts')
+        self.assertEqual(size, len(BODY))
+        self.assertEqual(outfile.getvalue(), BODY)
+        self.assertEqual(max(outfile.writes), 256 * 1024)
+
+    def test_compressed_response_is_decoded(self):
+        size, outfile, _ = self._stream('/gzip.ts')
+        self.assertEqual(size, len(BODY))
+        self.assertEqual(outfile.getvalue(), BODY)
+
+    def test_stop(self):
+        size, outfile, _ = self._stream('/plain.ts', should_stop=lambda: True)
+        self.assertIsNone(size)
+        self.assertEqual(outfile.writes, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
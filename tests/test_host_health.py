@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+from m3u8 import M3U8
+from rich.console import Console
+
+from jianpian_downloader.downloader import MovieDownloader
+from jianpian_downloader.host_health import DEGRADE_FAILURES, MIN_WINDOW, HostHealth
+
+MASTER = (
+    '#EXTM3U\n'
+    '#EXT-X-STREAM-INF:BANDWIDTH=2000000,RESOLUTION=1280x720\nhttp://cdn-a.example/720p/index.m3u8\n'
+    '#EXT-X-STREAM-INF:BANDWIDTH=2000000,RESOLUTION=1280x720\nhttp://cdn-b.example/720p/index.m3u8\n'
+    '#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360\nhttp://cdn-c.example/360p/index.m3u8\n'
+)
+
+
+class HostHealthTest(unittest.TestCase):
+    def setUp(self):
+        self.health = HostHealth()
+
+    def _success(self, host, latency, seconds, times=5):
+        for _ in range(times):
+            self.health.record_success(host, latency, 1024 * 1024, seconds)
+
+    def test_rank(self):
+        self._success('fast', 0.02, 0.2)
+        self._success('slow', 0.5, 4.0)
+        self._success('broken', 0.02, 0.2)
+        for _ in range(DEGRADE_FAILURES):
+            self.health.record_failure('broken', 'timeout')
+        # 有记录的健康主机按得分排列，其次是没有记录的主机，降级中的主机排在最后
+        self.assertEqual(self.health.rank(['broken', 'unknown', 'slow', 'fast']),
+                         ['fast', 'slow', 'unknown', 'broken'])
+
+    def test_degrade_and_recover(self):
+        for _ in range(DEGRADE_FAILURES - 1):
+            self.assertFalse(self.health.record_failure('cdn', 'http_503'))
+        self.assertTrue(self.health.record_failure('cdn', 'http_503'))
+        self.assertTrue(self.health.is_degraded('cdn'))
+        self.assertEqual(self.health.score('cdn'), 0.0)
+        self.assertEqual(self.health.concurrency('cdn', 32), 32 // 8)
+        # 降级期间请求成功说明主机已恢复
+        self._success('cdn', 0.02, 0.2, times=1)
+        self.assertFalse(self.health.is_degraded('cdn'))
+        self.assertGreater(self.health.score('cdn'), 0)
+
+    def test_concurrency_follows_error_rate(self):
+        self.assertEqual(self.health.concurrency('new', 32), 32)
+        self._success('flaky', 0.02, 0.2, times=20)
+        for i in range(30):
+            if i % 2:
+                self.health.record_failure('flaky', 'connection')
+            else:
+                self._success('flaky', 0.02, 0.2, times=1)
+        window = self.health.concurrency('flaky', 32)
+        self.assertLess(window, 32)
+        self.assertGreaterEqual(window, MIN_WINDOW)
+
+    def test_persisted(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'hosts.sqlite3')
+            health = HostHealth(path)
+            health.record_success('cdn', 0.05, 1024 * 1024, 0.5)
+            health.close()
+            health = HostHealth(path)
+            try:
+                self.assertEqual(health.stats()['cdn']['samples'], 1)
+                self.assertGreater(health.score('cdn'), 0)
+            finally:
+                health.close()
+
+
+class PickVariantTest(unittest.TestCase):
+    def test_picks_healthiest_redundant_host(self):
+        downloader = MovieDownloader(max_workers=2, console=Console(quiet=True))
+        try:
+            downloader.host_health.record_success('cdn-a.example', 0.8, 1024 * 1024, 5.0)
+            downloader.host_health.record_success('cdn-b.example', 0.02, 1024 * 1024, 0.2)
+            playlists = M3U8(MASTER).playlists
+            self.assertEqual(downloader._pick_variant(playlists, 'http://site.example/play.m3u8'),
+                             'http://cdn-b.example/720p/index.m3u8')
+        finally:
+            downloader.session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import threading
+import unittest
+import importlib.util
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+from rich.console import Console
+
+from jianpian_downloader.downloader import MovieDownloader
+from jianpian_downloader.http2 import HTTP2Adapter
+
+BODY = b'\x47' * 188 * 100
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _find_spec_without_h2(name, *args, **kwargs):
+    return None if name == 'h2' else importlib.util.find_spec(name, *args, **kwargs)
+
+
+class HTTP2FallbackTest(unittest.TestCase):
+    def test_missing_h2_keeps_http1(self):
+        with mock.patch('importlib.util.find_spec', side_effect=_find_spec_without_h2):
+            with self.assertRaises(ImportError):
+                HTTP2Adapter(HTTPAdapter())
+            downloader = MovieDownloader(max_workers=2, console=Console(quiet=True), http2=True)
+        try:
+            self.assertFalse(downloader.http2)
+            self.assertNotIsInstance(downloader.session.get_adapter('https://cdn.example/0.ts'), HTTP2Adapter)
+        finally:
+            downloader.session.close()
+
+    def test_http1_host_uses_fallback_pool(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        server.daemon_threads = True
+        server.requests = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}/0.ts'
+        fallback = HTTPAdapter()
+        adapter = HTTP2Adapter(fallback)
+        session = requests.Session()
+        # 明文 http 无法通过 ALPN 协商 HTTP/2，服务器只会以 HTTP/1.1 响应
+        session.mount('http://', adapter)
+        try:
+            response = session.get(url, stream=True, timeout=5)
+            buffer = bytearray(len(BODY))
+            view = memoryview(buffer)
+            received = 0
+            while True:
+                size = response.raw.readinto(view[received:])
+                if not size:
+                    break
+                received += size
+            self.assertEqual(bytes(buffer[:received]), BODY)
+            self.assertEqual(response.raw.tell(), len(BODY))
+            response.close()
+            self.assertIs(adapter.http1_adapter(url), fallback)
+
+            response = session.get(url, timeout=5)
+            self.assertIs(response.connection, fallback)
+            self.assertEqual(response.content, BODY)
+            self.assertEqual(server.requests, 2)
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import gzip
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from jianpian_downloader.http_cache import ValidatorCache
+
+LAST_MODIFIED = 'Mon, 01 Jan 2024 00:00:00 GMT'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if self.path == '/etag':
+            etag = f'"{server.version}"'
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, b'', {'ETag': etag})
+                return
+            headers = {'ETag': etag} if server.validators else {}
+            body = f'<html>第 {server.version} 版</html>'.encode('utf-8') * 50
+            self._send(200, gzip.compress(body), dict(headers, **{'Content-Encoding': 'gzip'}))
+        elif self.path == '/last-modified':
+            if self.headers.get('If-Modified-Since') == LAST_MODIFIED:
+                self._send(304, b'', {})
+                return
+            self._send(200, b'#EXTM3U\n', {'Last-Modified': LAST_MODIFIED})
+        else:
+            self._send(404, b'', {})
+
+    def _send(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ValidatorCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.requests = []
+        self.server.version = 1
+        self.server.validators = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.session = requests.Session()
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def _fetch(self, cache, path):
+        return cache.fetch(self.session, f'{self.base_url}{path}', {'User-Agent': 'test'})
+
+    def test_etag(self):
+        cache = ValidatorCache()
+        first = self._fetch(cache, '/etag')
+        self.assertIn('第 1 版', first)
+        self.assertNotIn('If-None-Match', self.server.requests[0])
+        self.assertIn('gzip', self.server.requests[0]['Accept-Encoding'])
+
+        self.assertEqual(self._fetch(cache, '/etag'), first)
+        self.assertEqual(self.server.requests[1]['If-None-Match'], '"1"')
+
+        self.server.version = 2
+        self.assertIn('第 2 版', self._fetch(cache, '/etag'))
+        self.assertEqual(cache.stats(), {'entries': 1, 'not_modified': 1, 'modified': 1})
+
+    def test_last_modified(self):
+        cache = ValidatorCache()
+        self.assertEqual(self._fetch(cache, '/last-modified'), '#EXTM3U\n')
+        self.assertEqual(self._fetch(cache, '/last-modified'), '#EXTM3U\n')
+        self.assertEqual(self.server.requests[1]['If-Modified-Since'], LAST_MODIFIED)
+        self.assertEqual(cache.stats()['not_modified'], 1)
+
+    def test_persisted_across_instances(self):
+        path = os.path.join(self.dir.name, 'http-cache.sqlite3')
+        first = self._fetch(ValidatorCache(path), '/etag')
+        # 重新启动后从 SQLite 读取验证信息和正文
+        cache = ValidatorCache(path)
+        self.assertEqual(self._fetch(cache, '/etag'), first)
+        self.assertEqual(cache.stats()['not_modified'], 1)
+
+    def test_entry_dropped_without_validators(self):
+        cache = ValidatorCache()
+        self._fetch(cache, '/etag')
+        self.server.version = 2
+        self.server.validators = False
+        self._fetch(cache, '/etag')
+        self.assertIsNone(cache.get(f'{self.base_url}/etag'))
+        self._fetch(cache, '/etag')
+        self.assertNotIn('If-None-Match', self.server.requests[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import hashlib
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rich.console import Console
+
+from jianpian_downloader import integrity
+from jianpian_downloader.downloader import MovieDownloader
+
+
+class VerifyOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'ep.mp4')
+        self.data = b'a' * 188 + b'b' * 188
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _write_manifest(self):
+        entries = [{'url': f'http://example.com/{i}.ts', 'offset': i * 188, 'size': 188,
+                    'sha256': hashlib.sha256(self.data[i * 188:(i + 1) * 188]).hexdigest()} for i in range(2)]
+        integrity.write_manifest(self.path, integrity.new_manifest('http://example.com/index.m3u8', entries))
+
+    def test_without_manifest_is_incomplete(self):
+        self.assertEqual(integrity.verify_output(self.path, full=False), (False, []))
+
+    def test_adopt_finished_output(self):
+        # 清单功能加入之前下载完成的文件：补写清单后视为完好，不会重新下载覆盖
+        self.assertTrue(integrity.adopt_output(self.path))
+        self.assertTrue(integrity.load_manifest(self.path)['adopted'])
+        self.assertEqual(integrity.verify_output(self.path), (True, []))
+        self.assertFalse(integrity.adopt_output(self.path))
+        with open(self.path, 'r+b') as f:
+            f.truncate(200)
+        self.assertEqual(integrity.verify_output(self.path, full=False), (False, [(0, 'truncated')]))
+
+    def test_interrupted_output_is_not_adopted(self):
+        os.makedirs(f'{self.path}.downloading')
+        self.assertFalse(integrity.adopt_output(self.path))
+        self.assertIsNone(integrity.load_manifest(self.path))
+
+    def test_complete(self):
+        self._write_manifest()
+        self.assertEqual(integrity.verify_output(self.path), (True, []))
+
+    def test_truncated(self):
+        self._write_manifest()
+        with open(self.path, 'r+b') as f:
+            f.truncate(200)
+        ok, broken = integrity.verify_output(self.path, full=False)
+        self.assertFalse(ok)
+        self.assertEqual(broken, [(1, 'truncated')])
+
+    def test_mismatch(self):
+        self._write_manifest()
+        with open(self.path, 'r+b') as f:
+            f.write(b'x')
+        self.assertTrue(integrity.verify_output(self.path, full=False)[0])
+        self.assertEqual(integrity.verify_output(self.path)[1], [(0, 'mismatch')])
+
+
+class _SegmentHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.segments.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        # short_by 模拟连接中途断开：声明的长度大于实际发送的正文
+        self.send_header('Content-Length', str(len(body) + self.server.short_by))
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RepairOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _SegmentHandler)
+        self.server.segments = {}
+        self.server.short_by = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'ep.mp4')
+        self.segments = [b'a' * 188, b'b' * 188]
+        with open(self.path, 'wb') as f:
+            f.write(b''.join(self.segments))
+        entries = [{'url': f'{self.base_url}/{i}.ts', 'offset': i * 188, 'size': 188,
+                    'sha256': hashlib.sha256(data).hexdigest()} for i, data in enumerate(self.segments)]
+        integrity.write_manifest(self.path, integrity.new_manifest(f'{self.base_url}/index.m3u8', entries))
+        # 第二个分片损坏
+        with open(self.path, 'r+b') as f:
+            f.seek(200)
+            f.write(b'x')
+        self.downloader = MovieDownloader(max_workers=2, console=Console(quiet=True), base_url=self.base_url)
+
+    def tearDown(self):
+        self.downloader.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def _repair(self):
+        return integrity.repair_output(self.downloader, self.path, [1])
+
+    def test_repair(self):
+        self.server.segments['/1.ts'] = self.segments[1]
+        self.assertTrue(self._repair())
+        self.assertEqual(integrity.verify_output(self.path), (True, []))
+
+    def test_truncated_refetch_is_rejected(self):
+        self.server.segments['/1.ts'] = self.segments[1][:100]
+        self.server.short_by = 88
+        self.assertFalse(self._repair())
+        self.assertEqual(integrity.verify_output(self.path)[1], [(1, 'mismatch')])
+
+    def test_changed_segment_does_not_replace_hash(self):
+        # 站点上的分片已经改变：大小相同但内容不同，不能当作正确的内容写入清单
+        self.server.segments['/1.ts'] = b'c' * 188
+        manifest = integrity.load_manifest(self.path)
+        self.assertFalse(self._repair())
+        self.assertEqual(integrity.load_manifest(self.path)['segments'], manifest['segments'])
+        self.assertEqual(integrity.verify_output(self.path)[1], [(1, 'mismatch')])
+
+
+if __name__ == '__main__':
+    unittest.main()
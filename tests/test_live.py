@@ -0,0 +1,177 @@
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rich.console import Console
+
+from jianpian_downloader import integrity
+from jianpian_downloader.downloader import MovieDownloader
+from jianpian_downloader.live import LiveOptions, LiveRecorder
+
+SEGMENT = b'\x47' + b'\x00' * 187
+
+PLAYLIST = (
+    '#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:1\n#EXT-X-MEDIA-SEQUENCE:0\n'
+    '#EXTINF:1.0,\n0.ts\n#EXTINF:1.0,\n1.ts\n#EXT-X-ENDLIST\n'
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/live.m3u8':
+            body, content_type = PLAYLIST.encode('utf-8'), 'application/vnd.apple.mpegurl'
+        elif self.path in ('/0.ts', '/1.ts'):
+            body, content_type = SEGMENT, 'video/mp2t'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _segment(name):
+    return (b'\x47' + name.encode('ascii')).ljust(188, b'\x00')
+
+
+def _window(sequence, names, end=False):
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:1', f'#EXT-X-MEDIA-SEQUENCE:{sequence}']
+    for name in names:
+        lines += ['#EXTINF:1.0,', f'{name}.ts']
+    if end:
+        lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+class _SlidingHandler(BaseHTTPRequestHandler):
+    """每次请求播放列表返回下一个窗口，最后一个窗口带结束标记"""
+    def do_GET(self):
+        if self.path == '/live.m3u8':
+            windows = self.server.windows
+            body = (windows.pop(0) if len(windows) > 1 else windows[0]).encode('utf-8')
+        elif self.path.endswith('.ts'):
+            body = _segment(self.path[1:-3])
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _NoWaitRecorder(LiveRecorder):
+    def _wait(self, seconds, deadline):
+        pass
+
+
+class SlidingWindowTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _SlidingHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.downloader = MovieDownloader(max_workers=2, console=Console(quiet=True), base_url=self.base_url)
+        self.dir = tempfile.TemporaryDirectory()
+        self.save_path = os.path.join(self.dir.name, 'stream.mp4')
+
+    def tearDown(self):
+        self.downloader.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def test_window_slides_with_gap_and_rollback(self):
+        self.server.windows = [
+            _window(0, ['a0', 'a1', 'a2']),
+            _window(1, ['a1', 'a2', 'a3']),  # 只有 a3 是新分片
+            _window(6, ['a6', 'a7']),  # 4、5 已经滑出窗口
+            _window(0, ['b0', 'b1']),  # 推流重启，序列号回退
+            _window(1, ['b1', 'b2'], end=True),
+        ]
+        recorder = _NoWaitRecorder(self.downloader, f'{self.base_url}/live.m3u8', self.save_path,
+                                   LiveOptions(duration=30), lambda: False, lambda progress, speed: None)
+        self.assertTrue(recorder.record())
+        names = ['a0', 'a1', 'a2', 'a3', 'a6', 'a7', 'b0', 'b1', 'b2']
+        with open(self.save_path, 'rb') as f:
+            self.assertEqual(f.read(), b''.join(_segment(name) for name in names))
+        self.assertEqual(recorder.missed_segments, 2)
+        manifest = integrity.load_manifest(self.save_path)
+        self.assertTrue(manifest['live'])
+        self.assertEqual([entry['url'].rsplit('/', 1)[1] for entry in manifest['segments']],
+                         [f'{name}.ts' for name in names])
+        self.assertEqual(integrity.verify_output(self.save_path), (True, []))
+
+    def test_stopped_recording_stays_partial(self):
+        self.server.windows = [_window(0, ['a0', 'a1'])]
+        polls = []
+
+        def should_stop():
+            polls.append(None)
+            return len(polls) > 6
+
+        recorder = _NoWaitRecorder(self.downloader, f'{self.base_url}/live.m3u8', self.save_path,
+                                   LiveOptions(duration=30), should_stop, lambda progress, speed: None)
+        self.assertFalse(recorder.record())
+        # 中断的录像不能被当作已完成的旧文件接收
+        self.assertFalse(os.path.exists(self.save_path))
+        self.assertFalse(integrity.adopt_output(self.save_path))
+        self.assertTrue(os.path.getsize(f'{self.save_path}.part') > 0)
+
+        self.server.windows = [_window(1, ['a1', 'a2'], end=True)]
+        recorder = _NoWaitRecorder(self.downloader, f'{self.base_url}/live.m3u8', self.save_path,
+                                   LiveOptions(duration=30), lambda: False, lambda progress, speed: None)
+        self.assertTrue(recorder.record())
+        self.assertFalse(os.path.exists(f'{self.save_path}.part'))
+        self.assertEqual(integrity.verify_output(self.save_path), (True, []))
+        self.assertTrue(os.path.getsize(self.save_path) >= 2 * 188)
+
+
+class LiveRecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_records_into_new_directory(self):
+        downloader = MovieDownloader(max_workers=2, console=Console(quiet=True), base_url=self.base_url)
+        with tempfile.TemporaryDirectory() as root:
+            save_path = os.path.join(root, '直播', 'stream.mp4')
+            recorder = LiveRecorder(downloader, f'{self.base_url}/live.m3u8', save_path, LiveOptions(duration=10),
+                                    lambda: False, lambda progress, speed: None)
+            self.assertTrue(recorder.record())
+            with open(save_path, 'rb') as f:
+                self.assertEqual(f.read(), SEGMENT * 2)
+        downloader.session.close()
+
+    def test_finished_recording_is_not_appended_again(self):
+        downloader = MovieDownloader(max_workers=2, console=Console(quiet=True), base_url=self.base_url)
+        downloader.live_options = LiveOptions(duration=10)
+        with tempfile.TemporaryDirectory() as root:
+            save_path = os.path.join(root, 'stream.mp4')
+            recorder = LiveRecorder(downloader, f'{self.base_url}/live.m3u8', save_path, LiveOptions(duration=10),
+                                    lambda: False, lambda progress, speed: None)
+            self.assertTrue(recorder.record())
+            # 再次加入同一任务时按清单校验为已完成，不会追加第二段录像
+            self.assertTrue(downloader.download_movie(f'{self.base_url}/live.m3u8', save_path))
+            with open(save_path, 'rb') as f:
+                self.assertEqual(f.read(), SEGMENT * 2)
+            self.assertTrue(integrity.load_manifest(save_path)['live'])
+        downloader.session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import tempfile
+import threading
+import unittest
+
+from rich.console import Console
+
+from jianpian_downloader.lowmem import MemoryBudget
+from jianpian_downloader.manager import DownloadManager
+from jianpian_downloader.video import Video
+
+
+class _BlockingDownloader:
+    """下载直到 release 被设置"""
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+
+    def set_download_manager(self, manager):
+        pass
+
+    def download_movie(self, play_url, save_path, stop_event=None):
+        self.started.release()
+        self.release.wait(10)
+        return False
+
+
+class LowMemoryDispatchTest(unittest.TestCase):
+    def _run(self, budget, expected):
+        downloader = _BlockingDownloader()
+        video = Video('剧', 'http://example.com/detail/1.html')
+        video.episodes = [{'title': f'第{i}集', 'url': f'http://example.com/play/1-{i}.html'} for i in range(6)]
+        manager = DownloadManager(store_path=None, console=Console(quiet=True), memory_budget=budget)
+        with tempfile.TemporaryDirectory() as root:
+            try:
+                manager.add_downloads(video, range(6), root, downloader)
+                for _ in range(expected):
+                    self.assertTrue(downloader.started.acquire(timeout=5))
+                self.assertFalse(downloader.started.acquire(timeout=0.3))
+                with manager.lock:
+                    self.assertEqual(manager.running, expected)
+            finally:
+                manager.cancel_tasks(list(manager.downloads))
+                downloader.release.set()
+
+    def test_task_limit_from_buffer_pool(self):
+        budget = MemoryBudget(1 << 40)
+        budget.task_limit = 3
+        self._run(budget, 3)
+
+    def test_without_task_limit_runs_all(self):
+        # 预算没有应用到下载器时只按常驻内存控制，不再退化为一次一个任务
+        self._run(MemoryBudget(1 << 40), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rich.console import Console
+
+from jianpian_downloader import integrity
+from jianpian_downloader.downloader import MovieDownloader
+from jianpian_downloader.manager import DownloadManager, TaskStore
+from jianpian_downloader.video import Video
+
+SEGMENT = b'\x47' + b'\x00' * 187
+
+
+class TaskStoreTest(unittest.TestCase):
+    def test_load_keeps_tasks_with_unverified_output(self):
+        with tempfile.TemporaryDirectory() as root:
+            save_path = os.path.join(root, '剧', '第1集.mp4')
+            os.makedirs(os.path.dirname(save_path))
+            # 中断后留下的非空输出和临时目录，没有清单
+            with open(save_path, 'wb') as f:
+                f.write(b'\x47' * 188)
+            os.makedirs(f'{save_path}.downloading')
+            store_path = os.path.join(root, 'tasks.json')
+            with open(store_path, 'w', encoding='utf-8') as f:
+                json.dump({'剧_0': {
+                    'video_title': '剧', 'video_url': 'http://example.com/detail/1.html',
+                    'episode_title': '第1集', 'episode_url': 'http://example.com/play/1-1.html',
+                    'save_dir': root, 'save_path': save_path, 'status': 'downloading', 'progress': 50,
+                }}, f)
+            tasks = TaskStore(store_path, console=Console(quiet=True)).load_tasks()
+            self.assertIn('剧_0', tasks)
+
+    def test_load_adopts_finished_output_without_manifest(self):
+        with tempfile.TemporaryDirectory() as root:
+            save_path = os.path.join(root, '剧', '第1集.mp4')
+            os.makedirs(os.path.dirname(save_path))
+            # 清单功能加入之前下载完成的文件
+            with open(save_path, 'wb') as f:
+                f.write(b'\x47' * 188)
+            store_path = os.path.join(root, 'tasks.json')
+            with open(store_path, 'w', encoding='utf-8') as f:
+                json.dump({'剧_0': {
+                    'video_title': '剧', 'video_url': 'http://example.com/detail/1.html',
+                    'episode_title': '第1集', 'episode_url': 'http://example.com/play/1-1.html',
+                    'save_dir': root, 'save_path': save_path, 'status': 'completed', 'progress': 100,
+                }}, f)
+            tasks = TaskStore(store_path, console=Console(quiet=True)).load_tasks()
+            self.assertNotIn('剧_0', tasks)
+            self.assertTrue(integrity.load_manifest(save_path)['adopted'])
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    """播放页直接指向 m3u8，每集两个分片，记录播放页的请求顺序"""
+    def do_GET(self):
+        if self.path.startswith('/play/'):
+            ep = self.path[len('/play/'):-len('.html')]
+            self.server.started.append(ep)
+            host = self.headers['Host']
+            body = f'<script>var player_aaaa={{"url":"http:\\/\\/{host}\\/hls\\/{ep}.m3u8"}}</script>'.encode()
+        elif self.path.endswith('.m3u8'):
+            body = b'#EXTM3U\n#EXT-X-TARGETDURATION:1\n#EXTINF:1.0,\n0.ts\n#EXTINF:1.0,\n1.ts\n#EXT-X-ENDLIST\n'
+        elif self.path.endswith('.ts'):
+            time.sleep(self.server.delay)
+            body = SEGMENT
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DownloadManagerBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _SiteHandler)
+        self.server.daemon_threads = True
+        self.server.started = []
+        self.server.delay = 0.3
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.dir = tempfile.TemporaryDirectory()
+        console = Console(quiet=True)
+        self.downloader = MovieDownloader(max_workers=2, console=console, base_url=base_url)
+        # 同时只下载一集，其余任务在等待队列中
+        self.manager = DownloadManager(store_path=None, max_active_tasks=1, console=console)
+        self.downloader.set_download_manager(self.manager)
+        self.video = Video('剧', f'{base_url}/detail/1.html')
+        self.video.episodes = [{'title': f'第{i}集', 'url': f'{base_url}/play/{i}.html'} for i in range(1, 5)]
+
+    def tearDown(self):
+        self.downloader.stop_flag = True
+        self.manager.stop()
+        self.downloader.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def _wait(self, task_ids):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            statuses = self.manager.get_status()
+            if all(statuses[t]['status'] in ('completed', 'failed', 'cancelled') for t in task_ids):
+                return {t: statuses[t]['status'] for t in task_ids}
+            time.sleep(0.05)
+        self.fail('等待任务超时')
+
+    def test_add_prioritize_and_cancel(self):
+        # 第 4 集已下载完成，直接记为完成
+        os.makedirs(os.path.join(self.dir.name, '剧'))
+        with open(os.path.join(self.dir.name, '剧', '第4集.mp4'), 'wb') as f:
+            f.write(SEGMENT)
+        added = self.manager.add_downloads(self.video, [0, 1, 2, 3, 1, 9], self.dir.name, self.downloader)
+        self.assertEqual(added, ['剧_0', '剧_1', '剧_2', '剧_3'])
+        self.assertEqual(self.manager.add_downloads(self.video, [0, 1], self.dir.name, self.downloader), [])
+        self.assertEqual(self.manager.get_status()['剧_3']['status'], 'completed')
+
+        self.assertEqual(self.manager.prioritize(['剧_2', '剧_0']), ['剧_2'])
+        with self.manager.lock:
+            self.assertEqual([entry[0] for entry in self.manager.ready], ['剧_2', '剧_1'])
+        self.assertEqual(self.manager.cancel_tasks(['剧_1', '剧_3']), ['剧_1'])
+
+        statuses = self._wait(['剧_0', '剧_1', '剧_2'])
+        self.assertEqual(statuses, {'剧_0': 'completed', '剧_1': 'cancelled', '剧_2': 'completed'})
+        # 被取消的剧集没有开始下载，提前的剧集先于队列中原来的顺序开始
+        self.assertEqual(self.server.started, ['1', '3'])
+        self.assertFalse(os.path.exists(os.path.join(self.dir.name, '剧', '第2集.mp4')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+import urllib.request
+
+from jianpian_downloader import metrics
+
+
+class MetricsServerTest(unittest.TestCase):
+    def test_serves_metrics(self):
+        registry = metrics.MetricsRegistry()
+        registry.counter('jianpian_test_total', '测试计数').inc(amount=3)
+        server = metrics.start_metrics_server(0, registry=registry)
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+                body = response.read().decode('utf-8')
+            self.assertEqual(response.status, 200)
+            self.assertIn('jianpian_test_total 3', body)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_unknown_path_is_404(self):
+        server = metrics.start_metrics_server(0, registry=metrics.MetricsRegistry())
+        try:
+            port = server.server_address[1]
+            with self.assertRaises(urllib.error.HTTPError) as cm:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/other', timeout=5)
+            self.assertEqual(cm.exception.code, 404)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import io
+import struct
+import unittest
+
+from jianpian_downloader.remux import AAC_SAMPLE_RATES, TSRemuxer
+
+VIDEO_PID = 0x100
+AUDIO_PID = 0x101
+PMT_PID = 0x1000
+
+
+def crc32_mpeg(data):
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x04C11DB7 if crc & 0x80000000 else crc << 1
+            crc &= 0xFFFFFFFF
+    return crc
+
+
+def section(table_id, table_id_ext, body):
+    """带 CRC 的 PSI 段"""
+    length = 5 + len(body) + 4
+    data = bytes([table_id, 0xB0 | length >> 8, length & 0xFF]) + struct.pack('>H', table_id_ext) + b'\xC1\x00\x00' + body
+    return data + struct.pack('>I', crc32_mpeg(data))
+
+
+def ue(value):
+    bits = bin(value + 1)[2:]
+    return '0' * (len(bits) - 1) + bits
+
+
+def baseline_sps(width, height):
+    """Baseline profile 的 SPS，宽高为 16 的倍数"""
+    bits = (ue(0) + ue(0) + ue(0) + ue(0) + ue(1) + '0' + ue(width // 16 - 1) + ue(height // 16 - 1)
+            + '1' + '1' + '0' + '0' + '1')
+    bits += '0' * (-len(bits) % 8)
+    return bytes([0x67, 66, 0xC0, 30]) + int(bits, 2).to_bytes(len(bits) // 8, 'big')
+
+
+def timestamp(prefix, value):
+    return bytes([prefix << 4 | (value >> 29) & 0x0E | 1]) + struct.pack(
+        '>HH', (value >> 14) & 0xFFFE | 1, (value << 1) & 0xFFFE | 1)
+
+
+def pes(stream_id, payload, pts, dts=None):
+    if dts is None:
+        header = b'\x80\x80\x05' + timestamp(2, pts)
+    else:
+        header = b'\x80\xC0\x0A' + timestamp(3, pts) + timestamp(1, dts)
+    length = len(header) + len(payload)
+    return b'\x00\x00\x01' + bytes([stream_id]) + struct.pack('>H', length if length < 0x10000 else 0) + header + payload
+
+
+def adts(rate_index, payload, channels=2):
+    size = 7 + len(payload)
+    return bytes([0xFF, 0xF1, 1 << 6 | rate_index << 2 | channels >> 2, (channels & 3) << 6 | size >> 11,
+                  (size >> 3) & 0xFF, (size & 7) << 5 | 0x1F, 0xFC]) + payload
+
+
+class _Packetizer:
+    def __init__(self):
+        self.counters = {}
+
+    def packets(self, pid, payload, psi=False):
+        if psi:
+            payload = b'\x00' + payload  # pointer_field
+        out = []
+        first = True
+        while payload:
+            chunk, payload = payload[:184], payload[184:]
+            cc = self.counters.get(pid, 0)
+            self.counters[pid] = (cc + 1) & 0x0F
+            header = bytes([0x47, (0x40 if first else 0) | pid >> 8, pid & 0xFF])
+            if len(chunk) == 184 or psi:
+                packet = header + bytes([0x10 | cc]) + chunk + b'\xFF' * (184 - len(chunk))
+            else:
+                # 不足一个包时用调整字段填充
+                stuffing = 183 - len(chunk)
+                adaptation = bytes([stuffing]) + (b'\x00' + b'\xFF' * (stuffing - 1) if stuffing else b'')
+                packet = header + bytes([0x30 | cc]) + adaptation + chunk
+            out.append(packet)
+            first = False
+        return b''.join(out)
+
+
+def make_segment(packetizer, start, rate_index, frames=3):
+    """一个包含 PAT、PMT、H.264 和 AAC 的 TS 分片"""
+    pat = section(0x00, 1, struct.pack('>HH', 1, 0xE000 | PMT_PID))
+    streams = struct.pack('>BHH', 0x1B, 0xE000 | VIDEO_PID, 0xF000) + struct.pack('>BHH', 0x0F, 0xE000 | AUDIO_PID, 0xF000)
+    pmt = section(0x02, 1, struct.pack('>HH', 0xE000 | VIDEO_PID, 0xF000) + streams)
+    data = packetizer.packets(0, pat, psi=True) + packetizer.packets(PMT_PID, pmt, psi=True)
+    sps = baseline_sps(320, 240)
+    pps = b'\x68\xCE\x3C\x80'
+    for i in range(frames):
+        dts = start + i * 3000
+        if i == 0:
+            units = [b'\x09\xF0', sps, pps, b'\x65' + bytes(range(1, 200))]
+        else:
+            units = [b'\x09\xF0', b'\x41' + bytes(range(1, 50))]
+        access_unit = b''.join(b'\x00\x00\x00\x01' + unit for unit in units)
+        data += packetizer.packets(VIDEO_PID, pes(0xE0, access_unit, dts + 3000, dts))
+    rate = AAC_SAMPLE_RATES[rate_index]
+    audio_frames = frames * 3000 * rate // 90000 // 1024
+    audio = b''.join(adts(rate_index, bytes([0x21, i]) * 8) for i in range(audio_frames))
+    data += packetizer.packets(AUDIO_PID, pes(0xC0, audio, start))
+    return data
+
+
+def boxes(data, offset=0, end=None):
+    """[(类型, 起始偏移, 数据)]"""
+    end = len(data) if end is None else end
+    found = []
+    while offset < end:
+        size, kind = struct.unpack('>I4s', data[offset:offset + 8])
+        found.append((kind, offset, data[offset + 8:offset + size]))
+        offset += size
+    return found
+
+
+def find(data, *path):
+    """按路径查找子 box 的内容"""
+    for kind in path:
+        data = next(payload for name, _, payload in boxes(data) if name == kind)
+    return data
+
+
+class TSRemuxerTest(unittest.TestCase):
+    def remux(self, rate_index, segments=2):
+        packetizer = _Packetizer()
+        out = io.BytesIO()
+        remuxer = TSRemuxer(out)
+        results = []
+        for i in range(segments):
+            results.append(remuxer.add_segment(io.BytesIO(make_segment(packetizer, 900000 + i * 9000, rate_index))))
+        remuxer.finish()
+        return out.getvalue(), results
+
+    def audio_trak(self, moov):
+        for kind, _, payload in boxes(moov):
+            if kind == b'trak' and find(payload, b'mdia', b'hdlr')[8:12] == b'soun':
+                return payload
+        self.fail("没有音频轨道")
+
+    def test_fragmented_mp4_layout(self):
+        data, results = self.remux(4)  # 44.1kHz
+        kinds = [kind for kind, _, _ in boxes(data)]
+        self.assertEqual(kinds, [b'ftyp', b'moov', b'moof', b'mdat', b'moof', b'mdat', b'mfra'])
+        moofs = [offset for kind, offset, _ in boxes(data) if kind == b'moof']
+        self.assertEqual([offset for offset, _, _ in results], moofs)
+        moov = find(data, b'moov')
+        tkhd = find(moov, b'trak', b'tkhd')
+        self.assertEqual(struct.unpack('>II', tkhd[-8:]), (320 << 16, 240 << 16))
+        # mvhd 的时长在结束时回填（毫秒）
+        self.assertGreater(struct.unpack('>I', find(moov, b'mvhd')[16:20])[0], 0)
+
+    def test_mp4a_samplerate(self):
+        data, _ = self.remux(4)
+        stsd = find(self.audio_trak(find(data, b'moov')), b'mdia', b'minf', b'stbl', b'stsd')
+        mp4a = stsd[8:]
+        self.assertEqual(mp4a[4:8], b'mp4a')
+        self.assertEqual(struct.unpack('>I', mp4a[32:36])[0], 44100 << 16)
+
+    def test_high_samplerate_does_not_overflow(self):
+        for rate_index in (0, 1):  # 96kHz、88.2kHz
+            data, _ = self.remux(rate_index)
+            trak = self.audio_trak(find(data, b'moov'))
+            mp4a = find(trak, b'mdia', b'minf', b'stbl', b'stsd')[8:]
+            # 16.16 定点数放不下时写 0，实际采样率见 mdhd
+            self.assertEqual(struct.unpack('>I', mp4a[32:36])[0], 0)
+            self.assertEqual(struct.unpack('>I', find(trak, b'mdia', b'mdhd')[12:16])[0], AAC_SAMPLE_RATES[rate_index])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rich.console import Console
+
+from jianpian_downloader.downloader import MovieDownloader
+from jianpian_downloader.segment_cache import CACHE_HITS, SegmentCache
+
+INTRO = b'\x47' + b'\x01' * 187
+EPISODES = {1: b'\x47' + b'\x02' * 187, 2: b'\x47' + b'\x03' * 187}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        if self.path.endswith('.m3u8'):
+            ep = int(self.path[3])
+            # 两集共用同一个片头分片
+            body = ('#EXTM3U\n#EXT-X-TARGETDURATION:1\n#EXTINF:1.0,\n/intro.ts\n'
+                    f'#EXTINF:1.0,\n/ep{ep}/0.ts\n#EXT-X-ENDLIST\n').encode('utf-8')
+            self._send(200, body)
+        elif self.path == '/intro.ts':
+            etag = server.intro_etag
+            if self.headers.get('If-None-Match') == etag:
+                server.not_modified += 1
+                self._send(304, b'', {'ETag': etag})
+            else:
+                self._send(200, server.intro, {'ETag': etag})
+        elif self.path.startswith('/ep'):
+            self._send(200, EPISODES[int(self.path[3])])
+        else:
+            self._send(404, b'')
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SegmentCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.intro = INTRO
+        self.server.intro_etag = '"v1"'
+        self.server.not_modified = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = SegmentCache(os.path.join(self.dir.name, 'cache'))
+        self.downloader = MovieDownloader(max_workers=2, console=Console(quiet=True), base_url=self.base_url,
+                                          segment_cache=self.cache)
+
+    def tearDown(self):
+        self.downloader.session.close()
+        self.cache.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def _download(self, ep):
+        save_path = os.path.join(self.dir.name, f'ep{ep}.mp4')
+        self.assertTrue(self.downloader.download_movie(f'{self.base_url}/ep{ep}.m3u8', save_path))
+        with open(save_path, 'rb') as f:
+            return f.read()
+
+    def _fetch_intro(self):
+        ts_path = os.path.join(self.dir.name, 'intro.ts')
+        size = self.downloader._fetch_segment_file(self.base_url + '/intro.ts', ts_path, lambda: False, lambda n: None)
+        self.assertEqual(size, 188)
+        with open(ts_path, 'rb') as f:
+            return f.read()
+
+    def _hits(self):
+        return CACHE_HITS.series.get((), 0)
+
+    def test_shared_segment_hits_across_playlists(self):
+        self.assertEqual(self._download(1), INTRO + EPISODES[1])
+        hits = self._hits()
+        # 第二集的播放列表不同，共用的片头仍然命中缓存，服务器只返回 304
+        self.assertEqual(self._download(2), INTRO + EPISODES[2])
+        self.assertEqual(self._hits(), hits + 1)
+        self.assertEqual(self.server.not_modified, 1)
+
+    def test_changed_segment_is_downloaded_again(self):
+        self._download(1)
+        # 站点在同一个地址上换成了新的内容
+        self.server.intro = b'\x47' + b'\x09' * 187
+        self.server.intro_etag = '"v2"'
+        hits = self._hits()
+        self.assertEqual(self._fetch_intro(), self.server.intro)
+        self.assertEqual(self._hits(), hits)
+
+    def test_object_size_mismatch_misses(self):
+        self._download(1)
+        digest = self.cache._lookup(self.base_url + '/intro.ts')[0]
+        object_path = self.cache._object_path(digest)
+        os.chmod(object_path, 0o644)
+        with open(object_path, 'ab') as f:
+            f.write(b'\x00')
+        # 缓存对象损坏时重新完整下载
+        self.assertEqual(self._fetch_intro(), INTRO)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+from jianpian_downloader.streaming import SegmentWriter, partial_path
+
+
+class SegmentWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.temp_dir = os.path.join(self.dir.name, 'ep.mp4.downloading')
+        os.makedirs(self.temp_dir)
+        self.path = os.path.join(self.dir.name, 'ep.mp4')
+        self.urls = [f'http://example.com/{i}.ts' for i in range(3)]
+        for i in range(3):
+            with open(os.path.join(self.temp_dir, f'{i:05d}.ts'), 'wb') as f:
+                f.write(bytes([i]) * 188)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_partial_output_until_finish(self):
+        writer = SegmentWriter(self.path, self.temp_dir, self.urls)
+        self.assertEqual(writer.mark_done(0), 1)
+        # 中断时只留下 .part 文件，输出文件不存在
+        writer.close()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(os.path.getsize(partial_path(self.path)), 188)
+
+    def test_finish_renames(self):
+        writer = SegmentWriter(self.path, self.temp_dir, self.urls)
+        writer.mark_done(1)
+        self.assertEqual(writer.written, 0)
+        entries, total_size, container = writer.finish()
+        self.assertEqual(container, 'ts')
+        self.assertEqual(total_size, 3 * 188)
+        self.assertEqual([entry['offset'] for entry in entries], [0, 188, 376])
+        self.assertTrue(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(partial_path(self.path)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rich.console import Console
+
+from jianpian_downloader.downloader import MovieDownloader
+from jianpian_downloader.manager import DownloadManager
+from jianpian_downloader.subscriptions import SubscriptionStore, SubscriptionWatcher
+from jianpian_downloader.video import Video
+
+
+class _DetailHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        items = ''.join(f'<li><a href="{url}">{title}</a></li>' for title, url in self.server.episodes)
+        body = f'<ul class="stui-content__playlist">{items}</ul>'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', f'"{len(self.server.episodes)}"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SubscriptionWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _DetailHandler)
+        self.server.episodes = [('第1集', '/play/1-1.html'), ('第2集', '/play/1-2.html')]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.detail_url = f'{base_url}/detail/1.html'
+        self.dir = tempfile.TemporaryDirectory()
+        console = Console(quiet=True)
+        self.downloader = MovieDownloader(max_workers=2, console=console, base_url=base_url)
+        self.manager = DownloadManager(store_path=None, console=console)
+        self.store = SubscriptionStore(os.path.join(self.dir.name, 'subscriptions.json'))
+        self.store.add(Video('剧', self.detail_url), self.dir.name, backfill=True)
+        self.watcher = SubscriptionWatcher(self.downloader, self.manager, self.store)
+
+    def tearDown(self):
+        self.downloader.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def _finish(self, *titles):
+        """剧集的输出已下载完成，加入后直接记为完成，不会发起下载"""
+        os.makedirs(os.path.join(self.dir.name, '剧'), exist_ok=True)
+        for title in titles:
+            with open(os.path.join(self.dir.name, '剧', f'{title}.mp4'), 'wb') as f:
+                f.write(b'\x47' * 188)
+
+    def _check(self):
+        return self.watcher.check(self.detail_url, self.store.subscriptions[self.detail_url])
+
+    def _known(self):
+        return [url.rsplit('/', 1)[1] for url in self.store.subscriptions[self.detail_url]['known']]
+
+    def test_inserted_episode_replaces_finished_task(self):
+        self._finish('第1集', '第2集', '番外')
+        self.assertEqual(self._check(), 2)
+        # 在两集之间插入番外，它的任务 ID 与第 2 集已完成的任务相同
+        self.server.episodes.insert(1, ('番外', '/play/1-9.html'))
+        self.assertEqual(self._check(), 1)
+        self.assertEqual(self._known(), ['1-1.html', '1-2.html', '1-9.html'])
+        status = self.manager.get_status()['剧_1']
+        self.assertEqual((status['episode'], status['status']), ('番外', 'completed'))
+
+    def test_conflicting_episode_is_retried(self):
+        self._finish('第1集', '第2集')
+        self.assertEqual(self._check(), 2)
+        with self.manager.lock:
+            self.manager.downloads['剧_1']['status'] = 'failed'
+        self.server.episodes.insert(1, ('番外', '/play/1-9.html'))
+        # 第 2 集失败的任务还在，番外没有加入，不能记为已知
+        self.assertEqual(self._check(), 0)
+        self.assertEqual(self._known(), ['1-1.html', '1-2.html'])
+        self.assertIsNone(self.store.subscriptions[self.detail_url]['etag'])
+
+        self.manager.cancel_tasks(['剧_1'])
+        self._finish('番外')
+        self.assertEqual(self._check(), 1)
+        self.assertEqual(self._known(), ['1-1.html', '1-2.html', '1-9.html'])
+
+
+if __name__ == '__main__':
+    unittest.main()